@@ -0,0 +1,202 @@
+# app/core/http_cache.py
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# brotli es opcional: sin él solo se ofrece gzip
+try:
+    import brotli  # type: ignore
+except Exception:
+    try:
+        import brotlicffi as brotli  # type: ignore
+    except Exception:
+        brotli = None  # type: ignore
+
+# -----------------------------
+# Caché HTTP y compresión de respuestas
+# -----------------------------
+# Middleware ASGI (sin BaseHTTPMiddleware) sobre respuestas completas:
+#   - ETag fuerte (blake2b del cuerpo sin comprimir) en los 200 de GET/HEAD cuyo
+#     Cache-Control permite guardarlos; If-None-Match coincidente -> 304 sin cuerpo.
+#     Solo GET/HEAD (RFC 9110 §13.1.2): en POST un 304 no lo reutiliza ningún
+#     cliente y lo correcto sería 412 cuando la acción ya se ha ejecutado, así que
+#     las respuestas a POST no llevan ETag y se ignora su If-None-Match.
+#   - br/gzip según Accept-Encoding a partir de HTTP_COMPRESS_MIN_BYTES. La ETag de
+#     la variante comprimida lleva sufijo ("-gzip"/"-br") y se compara sin él.
+#   - Cuerpos comprimidos recientes en un LRU por (ETag, codificación): el schema o
+#     un borrador cacheado no se recomprimen en cada petición.
+# Las respuestas en streaming (more_body) pasan tal cual.
+#
+# Cada endpoint declara su política con Cache-Control (constantes de abajo); lo que
+# no la declara no lleva ETag.
+
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+_ENCODED_CACHE_MAX = int(os.getenv("HTTP_ENCODED_CACHE", "256"))
+
+# Políticas Cache-Control
+CACHE_STATIC = f"public, max-age={int(os.getenv('HTTP_STATIC_MAX_AGE', '3600'))}"  # nginx puede guardarla
+CACHE_REVALIDATE = "private, no-cache"   # el cliente guarda y revalida con If-None-Match
+CACHE_NONE = "no-store"                  # generación no determinista
+
+_REVALIDABLE_METHODS = frozenset({"GET", "HEAD"})
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+_ENCODED: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_ENCODED_LOCK = threading.Lock()
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _cacheable(cache_control: Optional[str]) -> bool:
+    cc = (cache_control or "").lower()
+    return bool(cc) and "no-store" not in cc
+
+
+def _strip_suffix(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for enc in ("gzip", "br"):
+        if tag.endswith(f'-{enc}"'):
+            return tag[: -len(enc) - 2] + '"'
+    return tag
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110), ignorando el sufijo de codificación."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_strip_suffix(t) == etag for t in header.split(","))
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br > gzip según Accept-Encoding (q=0 excluye)."""
+    offered: Dict[str, float] = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.strip()] = q
+    star = offered.get("*", 0.0)
+    for enc in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if offered.get(enc, star) > 0:
+            return enc
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _encoded(body: bytes, encoding: str, etag: Optional[str]) -> bytes:
+    if etag is None:
+        return compress(body, encoding)
+    key = (etag, encoding)
+    with _ENCODED_LOCK:
+        hit = _ENCODED.get(key)
+        if hit is not None:
+            _ENCODED.move_to_end(key)
+            return hit
+    out = compress(body, encoding)
+    with _ENCODED_LOCK:
+        _ENCODED[key] = out
+        while len(_ENCODED) > _ENCODED_CACHE_MAX:
+            _ENCODED.popitem(last=False)
+    return out
+
+
+def _add_vary(headers: MutableHeaders, value: str) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["vary"] = value
+    elif value.lower() not in vary.lower():
+        headers["vary"] = f"{vary}, {value}"
+
+
+Message = Dict[str, Any]
+
+
+class HTTPCacheMiddleware:
+    def __init__(self, app: Callable[..., Awaitable[None]], minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        req = Headers(scope=scope)
+        accept = req.get("accept-encoding", "")
+        inm = req.get("if-none-match")
+        revalidable = scope.get("method", "GET") in _REVALIDABLE_METHODS
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def wrapped(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if message.get("more_body"):
+                # streaming: sin ETag ni compresión, se reenvía tal cual
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            await self._finish(start, message.get("body", b""), accept, inm, revalidable, send)
+
+        await self.app(scope, receive, wrapped)
+
+    async def _finish(self, start: Message, body: bytes, accept: str, inm: Optional[str], revalidable: bool,
+                      send: Callable) -> None:
+        headers = MutableHeaders(raw=list(start["headers"]))
+        status = start["status"]
+        enc = None
+        if (len(body) >= self.minimum_size and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(_COMPRESSIBLE)):
+            _add_vary(headers, "Accept-Encoding")
+            enc = choose_encoding(accept)
+
+        etag = None
+        if revalidable and status == 200 and _cacheable(headers.get("cache-control")) and "etag" not in headers:
+            etag = etag_for(body)
+            # el 304 lleva la misma ETag (variante incluida) que llevaría el 200
+            headers["etag"] = f'{etag[:-1]}-{enc}"' if enc else etag
+            if if_none_match(inm, etag):
+                for h in ("content-length", "content-type"):
+                    if h in headers:
+                        del headers[h]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if enc is not None:
+            body = _encoded(body, enc, etag)
+            headers["content-encoding"] = enc
+            headers["content-length"] = str(len(body))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,84 @@
+# app/core/serialization.py
+import datetime
+import json
+import math
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+# orjson es opcional: si no está instalado caemos a json de la stdlib
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None  # type: ignore
+
+# -----------------------------
+# Serialización JSON en una sola pasada
+# -----------------------------
+
+def _default(x: Any) -> Any:
+    """Hook para tipos que el encoder no conoce (Neo4j DateTime/Date, sets, ...)."""
+    # Tipos temporales de Neo4j (neo4j.time.*) sin importar el driver
+    if type(x).__module__.startswith("neo4j.time"):
+        try:
+            return x.to_native().isoformat()
+        except Exception:
+            return str(x)
+    if isinstance(x, (datetime.datetime, datetime.date, datetime.time)):
+        return x.isoformat()
+    if isinstance(x, (set, frozenset)):
+        return list(x)
+    return str(x)
+
+
+def _finite(x: Any) -> Any:
+    """NaN/Inf -> None. Solo se usa en el fallback stdlib cuando hay floats no finitos."""
+    if isinstance(x, float):
+        return None if (math.isnan(x) or math.isinf(x)) else x
+    if isinstance(x, dict):
+        return {k: _finite(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple, set, frozenset)):
+        return [_finite(v) for v in x]
+    return x
+
+
+def _dumps_std(content: Any, pretty: bool) -> bytes:
+    kw = {"ensure_ascii": False, "default": _default, "allow_nan": False}
+    if pretty:
+        kw["indent"] = 2
+    else:
+        kw["separators"] = (",", ":")
+    try:
+        return json.dumps(content, **kw).encode("utf-8")
+    except ValueError:
+        # Algún NaN/Inf: saneamos y serializamos de nuevo (caso raro)
+        return json.dumps(_finite(content), **kw).encode("utf-8")
+
+
+def dumps(content: Any, pretty: bool = False) -> bytes:
+    """
+    Serializa a JSON (bytes UTF-8) en una pasada: NaN/Inf -> null, fechas en ISO,
+    sets -> listas y cualquier otro tipo desconocido -> str().
+    """
+    if orjson is not None:
+        opts = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            opts |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(content, default=_default, option=opts)
+        except (TypeError, orjson.JSONEncodeError):
+            # p.ej. enteros > 64 bits: la stdlib sí los soporta
+            pass
+    return _dumps_std(content, pretty)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que serializa con dumps() (sin jsonable_encoder ni saneo previo)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class PrettyJSONResponse(FastJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content, pretty=True)
@@ -0,0 +1,57 @@
+# app/gunicorn.conf.py
+"""
+Modo producción: gunicorn (pre-fork) + workers uvicorn.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- WEB_CONCURRENCY: número de workers (por defecto, núcleos disponibles).
+- preload_app: `main` se importa una vez en el master y los workers lo heredan
+  por fork (copy-on-write). El import es barato y no abre conexiones: el driver
+  de Neo4j y el LLM se crean en el lifespan de cada worker.
+- Recarga en caliente: `kill -HUP <pid master>` levanta workers nuevos y apaga
+  los viejos con gracia (graceful_timeout). Con preload_app el código no se
+  recarga con HUP; para desplegar código nuevo reiniciar el contenedor.
+- Cachés compartidas entre workers: ver services/shared_store.py (SHARED_DIR).
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+
+def _cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+workers = int(os.getenv("WEB_CONCURRENCY") or _cpus())
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# El LLM puede tardar: el timeout del worker debe cubrir una generación completa
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "330"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Reciclado opcional de workers (fugas de memoria en librerías de terceros)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def on_starting(server):
+    # Limpia entradas caducadas del almacén compartido antes de levantar workers
+    from services.shared_store import SHARED_DIR, purge_expired
+
+    n = purge_expired()
+    server.log.info("shared store en %s (%d entradas caducadas borradas)", SHARED_DIR, n)
+
+
+def post_fork(server, worker):
+    # Nada de estado de red heredado del master: cada worker crea su driver en el lifespan
+    from services import neo4j_client
+
+    neo4j_client._DRIVER = None
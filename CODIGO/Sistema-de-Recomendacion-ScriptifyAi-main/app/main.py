@@ -1,77 +1,46 @@
 import os
-import math
-import json
-import re
-import datetime
-from typing import Any, Dict, List
-
-from fastapi import FastAPI, Request, Query, Header, HTTPException
-from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from fastapi import Body, FastAPI, Request, Query, Header, HTTPException
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
-from pydantic import BaseModel
+
+from core.http_cache import CACHE_NONE, CACHE_STATIC, HTTPCacheMiddleware
+from core.serialization import FastJSONResponse, PrettyJSONResponse
 
 from services.graph_examples import get_context_for_llm
 from services.llm_ollama import llm_recommend
+from models.schemas import MetricsError
 from services.recommender import Metrics, decide_focus, reason_for_focus, infer_rates
-from services.embeddings_neo4j import seed_embeddings as v_seed, vector_search as v_search
-
-# ---- Neo4j DateTime compat
-try:
-    from neo4j.time import DateTime as NeoDateTime, Date as NeoDate
-except Exception:
-    NeoDateTime = None  # type: ignore
-    NeoDate = None      # type: ignore
+from services.embeddings_neo4j import vector_search as v_search
+from services import feedback, jobs, llm_pool
+from services.warmup import DRAFT_TEMPERATURE, RESPONSE_CACHE, draft_key
+from services.neo4j_client import get_driver, close_driver
+from services.llamaindex_client import get_llm
 
 API_KEY = os.getenv("API_KEY", "supersecreto")
-
-class Recommendation(BaseModel):
-    recommendation: str
-    reason: str
-    ideas: List[str]
-    diagnostics: Dict[str, Any]
-    examples: List[Dict[str, Any]] = []
-    ideas_by_focus: Dict[str, List[str]] = {}
-    hashtags_by_focus: Dict[str, List[str]] = {}
-
-app = FastAPI()
-
-# -----------------------------
-# Utilidades de saneo de JSON
-# -----------------------------
-
-def _to_iso(val: Any) -> str:
-    if NeoDateTime is not None and isinstance(val, NeoDateTime):
-        try: return val.to_native().isoformat()
-        except Exception: return str(val)
-    if NeoDate is not None and isinstance(val, NeoDate):
-        try: return val.to_native().isoformat()
-        except Exception: return str(val)
-    if isinstance(val, (datetime.datetime, datetime.date)):
-        try: return val.isoformat()
-        except Exception: return str(val)
-    return str(val)
-
-def _clean_json(x: Any):
-    if isinstance(x, float):
-        if math.isnan(x) or math.isinf(x): return None
-        return x
-    if NeoDateTime is not None and isinstance(x, NeoDateTime):
-        return _to_iso(x)
-    if NeoDate is not None and isinstance(x, NeoDate):
-        return _to_iso(x)
-    if isinstance(x, (datetime.datetime, datetime.date)):
-        return _to_iso(x)
-    if isinstance(x, dict):
-        return {k: _clean_json(v) for k, v in x.items()}
-    if isinstance(x, list):
-        return [_clean_json(v) for v in x]
-    if isinstance(x, (set, tuple)):
-        return [_clean_json(v) for v in x]
-    try:
-        json.dumps(x)
-        return x
-    except Exception:
-        return str(x)
+RECOMMEND_BATCH_MAX = int(os.getenv("RECOMMEND_BATCH_MAX", "1000"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Los clientes pesados (driver Neo4j, LLM de llama-index) se construyen aquí y
+    # no al importar los módulos: el import de main queda barato (tests, autoscaling).
+    get_driver()
+    get_llm()
+    jobs.recover()
+    feedback.start()
+    if os.getenv("WARMUP_ON_START", "0") == "1":
+        # Un único warm-up aunque arranquen varios workers a la vez
+        jobs.submit_unique("warmup", {"responses": os.getenv("WARMUP_RESPONSES", "0") == "1"})
+    yield
+    jobs.shutdown()
+    feedback.shutdown()
+    close_driver()
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+# ETag/304 y br/gzip según el Cache-Control de cada endpoint (core/http_cache.py)
+app.add_middleware(HTTPCacheMiddleware)
 
 # -----------------------------
 # Endpoints
@@ -93,69 +62,139 @@ def health_ollama():
     except Exception as e:
         return {"status": "down", "error": str(e)}
 
+# Estático: se sirve con Cache-Control público (lo puede guardar nginx) y ETag
+_SCHEMA = {
+    "fields": {
+        "platform": "str|optional (youtube|shorts|tiktok|instagram|reels|...)",
+        "niche": "str|required",
+        "region": "str opcional (p.ej. ES, MX)",
+        "format": "str|optional",
+        "followers": "int opcional",
+        "impressions": "int opcional",
+        "reach": "int opcional",
+        "clicks": "int opcional",
+        "conversions": "int opcional",
+        "likes": "int opcional",
+        "shares": "int opcional",
+        "saves": "int opcional",
+        "comments": "int opcional",
+        "ctr": "float (0-1 o 0-100) opcional",
+        "retention": "float (0-1 o 0-100) opcional",
+        "avg_watch_pct": "float opcional",
+        "completion_rate": "float opcional",
+        "followers_change": "int opcional",
+        "freq": "float (posts/semana) opcional",
+        "specialties": "list[str] opcional",
+        "use_graph": "bool opcional",
+        "top_k": "int opcional (default 5)"
+    },
+    "note": "Si solo pasas conteos, el sistema infiere señales (poca gente entra / se van pronto / cuesta siguiente paso) sin jerga."
+}
+
 @app.get("/recommend/schema")
 def recommend_schema():
-    return {
-        "fields": {
-            "platform": "str|optional (youtube|shorts|tiktok|instagram|reels|...)",
-            "niche": "str|required",
-            "region": "str opcional (p.ej. ES, MX)",
-            "format": "str|optional",
-            "followers": "int opcional",
-            "impressions": "int opcional",
-            "reach": "int opcional",
-            "clicks": "int opcional",
-            "conversions": "int opcional",
-            "likes": "int opcional",
-            "shares": "int opcional",
-            "saves": "int opcional",
-            "comments": "int opcional",
-            "ctr": "float (0-1 o 0-100) opcional",
-            "retention": "float (0-1 o 0-100) opcional",
-            "avg_watch_pct": "float opcional",
-            "completion_rate": "float opcional",
-            "followers_change": "int opcional",
-            "freq": "float (posts/semana) opcional",
-            "specialties": "list[str] opcional",
-            "use_graph": "bool opcional",
-            "top_k": "int opcional (default 5)"
-        },
-        "note": "Si solo pasas conteos, el sistema infiere señales (poca gente entra / se van pronto / cuesta siguiente paso) sin jerga."
-    }
+    return FastJSONResponse(_SCHEMA, headers={"Cache-Control": CACHE_STATIC})
 
 @app.post("/debug/seed-embeddings")
-def debug_seed_embeddings(x_api_key: str = Header(None)):
+def debug_seed_embeddings(batch_size: int = Query(2000), x_api_key: str = Header(None)):
+    # Se encola como job: la respuesta vuelve al instante con el id para consultar /jobs/{id}
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    job = jobs.submit("seed_embeddings", {"batch_size": batch_size})
+    return FastJSONResponse(job, status_code=202)
+
+# -----------------------------
+# Jobs en segundo plano
+# -----------------------------
+
+@app.post("/jobs")
+def submit_job(body: Dict[str, Any] = Body(...), x_api_key: str = Header(None)):
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        job = jobs.submit(str(body.get("kind") or ""), body.get("params") or {})
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
+    return FastJSONResponse(job, status_code=202)
+
+@app.get("/jobs")
+def list_jobs(status: str = Query(None), limit: int = Query(50), x_api_key: str = Header(None)):
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return FastJSONResponse({"kinds": jobs.kinds(), "jobs": jobs.list_jobs(status=status, limit=limit)})
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, x_api_key: str = Header(None)):
     if x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    return v_seed()
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job no encontrado")
+    return FastJSONResponse(job)
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, x_api_key: str = Header(None)):
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job no encontrado")
+    return FastJSONResponse(job)
 
 @app.get("/debug/vector-search")
 def debug_vector_search(q: str = Query(...), k: int = Query(5), x_api_key: str = Header(None)):
     if x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    return v_search(q, k)
+    return FastJSONResponse(v_search(q, k))
 
-@app.post("/recommend")
-def recommend(m: Metrics, x_api_key: str = Header(None)):
+@app.get("/debug/llm-stats")
+def debug_llm_stats(x_api_key: str = Header(None)):
+    # Llamadas/latencia por modelo y backend, cancelaciones del hedge y plazo actual
     if x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    return FastJSONResponse(llm_pool.stats())
 
-    m = infer_rates(m)
-    decision = decide_focus(m)
+def _base_recommendation(m: Metrics) -> Dict[str, Any]:
+    """Recomendación por reglas (sin LLM); las tasas se infieren una vez sobre `m`."""
+    decision = decide_focus(infer_rates(m))
     focus = decision["focus"]
+    return {
+        "recommendation": f"Sugerencia base para foco={focus}",
+        "reason": reason_for_focus(focus, m),
+        "ideas": [],
+        "diagnostics": {"focus": focus, "scores": decision["scores"], "inputs": m.dict()},
+        "examples": [],
+        "ideas_by_focus": {},
+        "hashtags_by_focus": {},
+    }
 
-    recommendation = f"Sugerencia base para foco={focus}"
-    reason = reason_for_focus(focus, m)
-    ideas: List[str] = []
-
-    payload = Recommendation(
-        recommendation=recommendation,
-        reason=reason,
-        ideas=ideas,
-        diagnostics={"focus": focus, "scores": decision["scores"], "inputs": m.dict()},
-        examples=[]
-    )
-    return _clean_json(payload.dict())
+@app.post("/recommend")
+async def recommend(request: Request, x_api_key: str = Header(None)):
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    # Un solo decode + validación desde los bytes del body (models/schemas.py)
+    try:
+        m = Metrics.from_json(await request.body())
+    except MetricsError as e:
+        return FastJSONResponse({"detail": e.errors}, status_code=422)
+
+    # POST: sin ETag/304 (core/http_cache.py); solo se comprime
+    return FastJSONResponse(_base_recommendation(m), headers={"Cache-Control": CACHE_NONE})
+
+@app.post("/recommend/batch")
+async def recommend_batch(request: Request, x_api_key: str = Header(None)):
+    """
+    Lote de métricas (lista JSON o {"items": [...]}) -> {"results": [...]} en el mismo
+    orden; un elemento inválido devuelve {"error": [...]} sin tumbar el resto.
+    """
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        items = Metrics.many_from_json(await request.body(), limit=RECOMMEND_BATCH_MAX)
+    except MetricsError as e:
+        return FastJSONResponse({"detail": e.errors}, status_code=422)
+    results = [{"error": it.errors} if isinstance(it, MetricsError) else _base_recommendation(it) for it in items]
+    return FastJSONResponse({"results": results}, headers={"Cache-Control": CACHE_NONE})
 
 @app.post("/recommend/llm")
 async def recommend_llm(
@@ -168,67 +207,26 @@ async def recommend_llm(
     if x_api_key != expected:
         return JSONResponse({"error": "unauthorized"}, status_code=401)
 
-    try:
-        payload_in = await request.json()
-    except Exception:
-        payload_in = {}
-
-    platform = (payload_in or {}).get("platform")
-    niche = (payload_in or {}).get("niche") or ""
-    region = (payload_in or {}).get("region")
-    top_k = int((payload_in or {}).get("top_k") or 10)
-
-    inputs = {
-        "platform": platform,
-        "niche": niche,
-        "format": (payload_in or {}).get("format"),
-        "ctr": (payload_in or {}).get("ctr"),
-        "retention": (payload_in or {}).get("retention"),
-        "avg_watch_pct": (payload_in or {}).get("avg_watch_pct"),
-        "completion_rate": (payload_in or {}).get("completion_rate"),
-        "impressions": (payload_in or {}).get("impressions"),
-        "reach": (payload_in or {}).get("reach"),
-        "clicks": (payload_in or {}).get("clicks"),
-        "conversions": (payload_in or {}).get("conversions"),
-        "followers": (payload_in or {}).get("followers"),
-        "likes": (payload_in or {}).get("likes"),
-        "shares": (payload_in or {}).get("shares"),
-        "saves": (payload_in or {}).get("saves"),
-        "comments": (payload_in or {}).get("comments"),
-        "followers_change": (payload_in or {}).get("followers_change"),
-        "freq": (payload_in or {}).get("freq"),
-        "specialties": (payload_in or {}).get("specialties") or [],
-        "use_graph": True,
-        "top_k": top_k,
-        "region": region,
-    }
+    # Decode + validación en un paso; como antes, un body raro no es un 4xx: los
+    # campos inválidos quedan vacíos (lenient) y top_k vale 10 por defecto
+    m = Metrics.from_json(await request.body(), lenient=True, defaults={"top_k": 10})
+    platform, niche, region, top_k = m.platform, m.niche, m.region, m.top_k or 10
+
+    inputs = m.dict()   # valores tal cual llegaron (antes de normalizar tasas)
+    inputs["specialties"] = m.specialties or []
+    inputs["use_graph"] = True
 
     # --- NUEVO: calcular foco y pasarlo como hint al LLM
     try:
-        m_for_focus = Metrics(
-            platform=inputs.get("platform"),
-            niche=inputs.get("niche"),
-            impressions=inputs.get("impressions"),
-            reach=inputs.get("reach"),
-            likes=inputs.get("likes"),
-            shares=inputs.get("shares"),
-            saves=inputs.get("saves"),
-            comments=inputs.get("comments"),
-            ctr=inputs.get("ctr"),
-            retention=inputs.get("retention"),
-            avg_watch_pct=inputs.get("avg_watch_pct"),
-            completion_rate=inputs.get("completion_rate"),
-            followers=inputs.get("followers"),
-            freq=inputs.get("freq"),
-        )
-        m_for_focus = infer_rates(m_for_focus)
-        decision = decide_focus(m_for_focus)
-        inputs["focus_hint"] = decision.get("focus", "attract")
+        inputs["focus_hint"] = decide_focus(m).get("focus", "discovery")
     except Exception:
-        inputs["focus_hint"] = "attract"
+        inputs["focus_hint"] = "discovery"
 
     # 1) Contexto desde Neo4j (examples completos + trends)
-    ctx = get_context_for_llm(
+    #    Todo lo bloqueante (driver, LLM) va al threadpool: el event loop sigue
+    #    atendiendo otras peticiones mientras se genera.
+    ctx = await run_in_threadpool(
+        get_context_for_llm,
         niche=niche,
         region=region,
         k=max(top_k, 10),
@@ -239,36 +237,52 @@ async def recommend_llm(
     trends = ctx.get("trends") or []
 
     # 2) LLM (con RAG). Le pasamos los examples completos.
-    draft = llm_recommend(
-        focus="",
-        niche=niche,
-        metrics={"inputs": inputs},
-        examples=examples_full,
-        neighbors=[],
-        temperature=temperature
-    )
+    #    Sin especialidades y con la temperatura por defecto, se sirve el borrador base
+    #    precalentado del foco si existe (RESPONSE_CACHE_TTL > 0; ver services/warmup.py).
+    #    Solo el warm-up lo escribe: un borrador generado con las métricas de un
+    #    usuario no se reparte a los demás del mismo (nicho, región, foco).
+    key = None
+    if not inputs["specialties"] and temperature == DRAFT_TEMPERATURE:
+        key = draft_key(niche, region, platform, inputs["focus_hint"], top_k)
+    draft = RESPONSE_CACHE.get(key) if key else None
+    cached = draft is not None
+    if draft is None:
+        draft = await run_in_threadpool(
+            llm_recommend,
+            focus="",
+            niche=niche,
+            metrics={"inputs": inputs},
+            examples=examples_full,
+            neighbors=[],
+            temperature=temperature,
+            trends=trends,
+        )
 
     payload = {
         "recommendation": draft.get("recommendation"),
         "reason": draft.get("reason"),
         "ideas": draft.get("ideas") or [],
+        "idea_scores": draft.get("idea_scores") or [],
         "diagnostics": {
             "focus": "personalized",
             "inputs": inputs,
             "llm": True,
+            "cached": cached,
             "note": "Agente experto: interpreta señales y devuelve consejo humano (sin jerga). Ejemplos YouTube como referencia para cualquier plataforma.",
             "trends": trends,
+            "prompt": draft.get("prompt_stats") or {},
         },
         "examples": examples_full[:max(top_k, 10)],
         "hashtags_for_ideas": draft.get("hashtags_for_ideas") or [],
         "hashtags_for_examples": draft.get("hashtags_for_examples") or [],
     }
 
-    safe = _clean_json(payload)
-
+    # Una sola serialización (NaN/Inf -> null, fechas Neo4j -> ISO) directa a bytes.
+    # POST: sin ETag/304 (core/http_cache.py); solo se comprime.
+    headers = {"Cache-Control": CACHE_NONE}
     if pretty:
-        return PlainTextResponse(json.dumps(safe, ensure_ascii=False, indent=2), media_type="application/json")
-    return JSONResponse(safe)
+        return PrettyJSONResponse(payload, headers=headers)
+    return FastJSONResponse(payload, headers=headers)
 
 # -----------------------------
 # Feedback endpoints (opcionales)
@@ -286,17 +300,16 @@ async def feedback_like(request: Request, x_api_key: str = Header(default="")):
     niche = (body or {}).get("niche") or ""
     idea_title = (body or {}).get("idea") or ""
     specialties = (body or {}).get("specialties") or []
+    region = (body or {}).get("region")
 
-    toks = _simple_tokenize(idea_title)
-    return _clean_json({"ok": True, "niche": niche, "specialties": specialties, "tokens": toks})
-
-# ---------- helpers para feedback ---------
+    # Solo encola: SQLite y el volcado al grafo van en hilos aparte (services/feedback.py)
+    res = feedback.record_like(niche, idea_title, region=region, specialties=specialties)
+    return FastJSONResponse({"ok": True, "niche": niche, "specialties": specialties,
+                             "tokens": res["tokens"], "queued": res["queued"]})
 
-def _simple_norm(s: str) -> str:
-    s = (s or "").lower()
-    s = s.replace("á","a").replace("é","e").replace("í","i").replace("ó","o").replace("ú","u").replace("ñ","n")
-    return re.sub(r"[^a-z0-9]+", " ", s).strip()
-
-def _simple_tokenize(title: str) -> List[str]:
-    t = _simple_norm(title)
-    return [w for w in t.split() if len(w) >= 3]
+@app.get("/feedback/weights")
+def feedback_weights(niche: str = Query(...), region: str = Query(None), x_api_key: str = Header(default="")):
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {"niche": niche, "region": region, "weights": feedback.token_weights(niche, region),
+            "stats": feedback.stats()}
@@ -1,34 +1,223 @@
-from typing import Optional, List, Dict, Any
+import json
+from typing import Optional, List, Dict, Any, Callable, Tuple, Union
 from pydantic import BaseModel
 
-class Metrics(BaseModel):
-    platform: Optional[str] = None
-    niche: str
-    format: Optional[str] = None
-
-    # Conteos puros (usuario solo ingresa números)
-    followers: Optional[int] = None
-    impressions: Optional[int] = None
-    reach: Optional[int] = None
-    clicks: Optional[int] = None
-    conversions: Optional[int] = None
-    likes: Optional[int] = None
-    saves: Optional[int] = None
-    shares: Optional[int] = None
-    comments: Optional[int] = None
-
-    # Métricas opcionales (si las trae, las normalizamos 0–1)
-    ctr: Optional[float] = None
-    retention: Optional[float] = None
-    avg_watch_pct: Optional[float] = None
-    completion_rate: Optional[float] = None
-
-    followers_change: Optional[int] = None
-    freq: Optional[float] = None
-
-    # Parámetros del sistema
-    use_graph: bool = True
-    top_k: Optional[int] = 5
+# orjson es opcional: si no está instalado caemos a json de la stdlib
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None  # type: ignore
+
+# -----------------------------
+# Metrics: representación única y compacta
+# -----------------------------
+# Objeto con __slots__ (sin pydantic) que se decodifica y valida en un solo paso
+# desde los bytes del body (Metrics.from_json). Las tasas que infiere
+# services/recommender.infer_rates se calculan una vez sobre el propio objeto:
+# decide_focus / reason_for_focus lo reutilizan sin copias.
+#
+# Coerción "lax" como pydantic: "3" -> 3, 3.0 -> 3, 5 -> 5.0, "true" -> True;
+# las claves desconocidas se ignoran.
+
+
+class MetricsError(ValueError):
+    """Errores de validación en el formato de FastAPI (detail de un 422)."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} error(es) de validación")
+        self.errors = errors
+
+
+def _as_str(v: Any) -> str:
+    if isinstance(v, str):
+        return v
+    raise ValueError("Input should be a valid string")
+
+
+def _as_int(v: Any) -> int:
+    if isinstance(v, int):
+        return int(v)
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str):
+        try:
+            return int(v.strip())
+        except ValueError:
+            pass
+    raise ValueError("Input should be a valid integer")
+
+
+def _as_float(v: Any) -> float:
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        try:
+            return float(v.strip())
+        except ValueError:
+            pass
+    raise ValueError("Input should be a valid number")
+
+
+_TRUE = frozenset({"true", "1", "yes", "on", "t", "y"})
+_FALSE = frozenset({"false", "0", "no", "off", "f", "n"})
+
+
+def _as_bool(v: Any) -> bool:
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, int) and v in (0, 1):
+        return bool(v)
+    if isinstance(v, str):
+        t = v.strip().lower()
+        if t in _TRUE:
+            return True
+        if t in _FALSE:
+            return False
+    raise ValueError("Input should be a valid boolean")
+
+
+def _as_str_list(v: Any) -> List[str]:
+    if isinstance(v, (list, tuple)) and all(isinstance(x, str) for x in v):
+        return list(v)
+    raise ValueError("Input should be a valid list of strings")
+
+
+# (campo, coerción, valor por defecto)
+_FIELDS: Tuple[Tuple[str, Callable[[Any], Any], Any], ...] = (
+    # contexto
+    ("platform", _as_str, None),
+    ("niche", _as_str, None),            # requerido (salvo lenient)
+    ("format", _as_str, None),
+    ("region", _as_str, None),
+    ("specialties", _as_str_list, None),
+    # MÉTRICAS (pueden venir vacías o como conteos); tasas 0–1 o 0–100
+    ("ctr", _as_float, None),
+    ("retention", _as_float, None),
+    ("avg_watch_pct", _as_float, None),
+    ("completion_rate", _as_float, None),
+    ("impressions", _as_int, None),
+    ("reach", _as_int, None),
+    ("clicks", _as_int, None),
+    ("conversions", _as_int, None),
+    # conteos para inferir tasas cuando no pasen % directamente
+    ("followers", _as_int, None),
+    ("likes", _as_int, None),
+    ("shares", _as_int, None),
+    ("saves", _as_int, None),
+    ("comments", _as_int, None),
+    ("followers_change", _as_int, None),
+    ("freq", _as_float, None),           # posts/semana aprox
+    # controles
+    ("use_graph", _as_bool, True),
+    ("top_k", _as_int, 5),
+)
+FIELD_NAMES: Tuple[str, ...] = tuple(f for f, _, _ in _FIELDS)
+
+
+def _loads(raw: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class Metrics:
+    __slots__ = FIELD_NAMES + ("rates_inferred",)
+
+    def __init__(self, **kw: Any):
+        # mismo camino de validación que from_json (para código y benchmarks)
+        self._fill(kw, lenient=False, defaults=None)
+
+    def _fill(self, d: Dict[str, Any], lenient: bool, defaults: Optional[Dict[str, Any]]) -> None:
+        errors: List[Dict[str, Any]] = []
+        for name, coerce, default in _FIELDS:
+            v = d.get(name)
+            if v is None:
+                v = defaults.get(name, default) if defaults else default
+            else:
+                try:
+                    v = coerce(v)
+                except ValueError as e:
+                    if not lenient:
+                        errors.append({"type": "value_error", "loc": ["body", name], "msg": str(e), "input": v})
+                    v = defaults.get(name, default) if defaults else default
+            setattr(self, name, v)
+        if self.niche is None:
+            if not lenient and d.get("niche") is None:
+                errors.append({"type": "missing", "loc": ["body", "niche"], "msg": "Field required", "input": None})
+            self.niche = ""
+        if errors:
+            raise MetricsError(errors)
+        # tasas ya normalizadas/inferidas (services/recommender.infer_rates)
+        self.rates_inferred = False
+
+    @classmethod
+    def from_dict(cls, d: Any, lenient: bool = False, defaults: Optional[Dict[str, Any]] = None) -> "Metrics":
+        """
+        Valida un dict ya decodificado. lenient=True nunca falla: los campos
+        inválidos quedan en su valor por defecto (camino de /recommend/llm).
+        """
+        if not isinstance(d, dict):
+            if not lenient:
+                raise MetricsError([{"type": "dict_type", "loc": ["body"],
+                                     "msg": "Input should be a valid dictionary", "input": None}])
+            d = {}
+        m = cls.__new__(cls)
+        m._fill(d, lenient, defaults)
+        return m
+
+    @classmethod
+    def from_json(cls, raw: Union[bytes, str], lenient: bool = False,
+                  defaults: Optional[Dict[str, Any]] = None) -> "Metrics":
+        """Bytes del body -> Metrics validado (un solo decode, sin modelo intermedio)."""
+        try:
+            d = _loads(raw) if raw else {}
+        except ValueError:
+            if not lenient:
+                raise MetricsError([{"type": "json_invalid", "loc": ["body"], "msg": "JSON decode error",
+                                     "input": None}])
+            d = {}
+        return cls.from_dict(d, lenient=lenient, defaults=defaults)
+
+    @classmethod
+    def many_from_json(cls, raw: Union[bytes, str], limit: int) -> List[Union["Metrics", MetricsError]]:
+        """
+        Lote: lista JSON (o {"items": [...]}) -> un Metrics o un MetricsError por
+        elemento, para que un elemento inválido no tumbe el resto.
+        """
+        try:
+            data = _loads(raw) if raw else None
+        except ValueError:
+            raise MetricsError([{"type": "json_invalid", "loc": ["body"], "msg": "JSON decode error", "input": None}])
+        if isinstance(data, dict):
+            data = data.get("items")
+        if not isinstance(data, list):
+            raise MetricsError([{"type": "list_type", "loc": ["body"], "msg": "Input should be a valid list",
+                                 "input": None}])
+        if len(data) > limit:
+            raise MetricsError([{"type": "too_long", "loc": ["body"],
+                                 "msg": f"List should have at most {limit} items", "input": None}])
+        out: List[Union[Metrics, MetricsError]] = []
+        for i, d in enumerate(data):
+            try:
+                out.append(cls.from_dict(d))
+            except MetricsError as e:
+                for err in e.errors:
+                    err["loc"] = ["body", i] + err["loc"][1:]
+                out.append(e)
+        return out
+
+    def dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    def __repr__(self) -> str:
+        shown = ", ".join(f"{k}={v!r}" for k, v in self.dict().items() if v is not None)
+        return f"Metrics({shown})"
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Metrics) and self.dict() == other.dict()
+
+    __hash__ = None  # type: ignore  # mutable
+
 
 class Recommendation(BaseModel):
     recommendation: str
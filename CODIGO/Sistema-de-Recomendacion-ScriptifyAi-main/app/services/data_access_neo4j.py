@@ -1,12 +1,47 @@
-import os
 from typing import List, Dict, Any, Optional
-from neo4j import GraphDatabase
 
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+from services import snapshot
+from services.neo4j_client import get_driver
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+# ------------------------------------------------------------
+# Queries (a nivel de módulo para poder auditarlas: scripts/audit_query_plans.py)
+# ------------------------------------------------------------
+
+_TOP_EXAMPLES_QUERY = """
+MATCH (v:Video)-[:IN_NICHE]->(n:Niche {name: $niche})
+OPTIONAL MATCH (v)-[:PUBLISHED_IN]->(r:Region)
+WHERE $region IS NULL OR r.code = $region
+RETURN v.videoId AS videoId,
+       v.title AS title,
+       v.engagement_rate AS engagement_rate,
+       v.seconds AS seconds,
+       v.publishedAt AS publishedAt,
+       v.tags AS tags
+ORDER BY v.engagement_rate DESC NULLS LAST, v.views DESC NULLS LAST
+LIMIT $k
+"""
+
+_TOP_TRENDS_QUERY = """
+MATCH (n:Niche {name: $niche})-[:HAS_KEYWORD]->(t:TrendKeyword)
+WHERE $region IS NULL OR t.region = $region
+RETURN t.keyword AS keyword, t.score_norm AS score
+ORDER BY t.score_norm DESC NULLS LAST
+LIMIT $k
+"""
+
+# Top-K materializado por scripts/rank_trends.py (región None -> ranking global GL).
+# Misma clave que ese script y que graph_examples: nicho en minúsculas, región en mayúsculas
+_TOP_TRENDS_RANKED_QUERY = """
+MATCH (tr:TrendRanking {niche: toLower(trim($niche)), region: toUpper(trim($region))})
+RETURN tr.keywords[..$k] AS keywords
+"""
+
+_NICHE_LEXICON_QUERY = """
+MATCH (n:Niche {name: $niche})
+RETURN n.top_keywords AS top_keywords,
+       n.top_tags     AS top_tags,
+       n.vocab        AS vocab
+"""
 
 def _norm_region(region: Optional[str]) -> Optional[str]:
     if not region:
@@ -16,35 +51,26 @@ def _norm_region(region: Optional[str]) -> Optional[str]:
 def top_examples_by_niche(niche: str, region: Optional[str] = None, k: int = 8) -> List[Dict[str, Any]]:
     """Videos del nicho con mayor engagement_rate, opcionalmente filtrados por región."""
     region = _norm_region(region)
-    q = """
-    MATCH (v:Video)-[:IN_NICHE]->(n:Niche {name: $niche})
-    OPTIONAL MATCH (v)-[:PUBLISHED_IN]->(r:Region)
-    WHERE $region IS NULL OR r.code = $region
-    RETURN v.videoId AS videoId,
-           v.title AS title,
-           v.engagement_rate AS engagement_rate,
-           v.seconds AS seconds,
-           v.publishedAt AS publishedAt,
-           v.tags AS tags
-    ORDER BY v.engagement_rate DESC NULLS LAST, v.views DESC NULLS LAST
-    LIMIT $k
-    """
-    with driver.session() as s:
-        res = s.run(q, niche=niche, region=region, k=k)
+    # La query no filtra por región (OPTIONAL MATCH): el snapshot guarda el top por nicho
+    snap = snapshot.top_examples(niche, k)
+    if snap is not None:
+        return snap
+    with get_driver().session() as s:
+        res = s.run(_TOP_EXAMPLES_QUERY, niche=niche, region=region, k=k)
         return [r.data() for r in res]
 
 def top_trends_by_niche(niche: str, region: Optional[str] = None, k: int = 25) -> List[str]:
     """Top keywords calientes (Google Trends normalizadas) para el nicho (+ región opcional)."""
     region = _norm_region(region)
-    q = """
-    MATCH (n:Niche {name: $niche})-[:HAS_KEYWORD]->(t:TrendKeyword)
-    WHERE $region IS NULL OR t.region = $region
-    RETURN t.keyword AS keyword, t.score_norm AS score
-    ORDER BY t.score_norm DESC NULLS LAST
-    LIMIT $k
-    """
-    with driver.session() as s:
-        res = s.run(q, niche=niche, region=region, k=k)
+    snap = snapshot.top_trends(niche, region, k)
+    if snap is not None:
+        return snap
+    with get_driver().session() as s:
+        rec = s.run(_TOP_TRENDS_RANKED_QUERY, niche=niche or "", region=region or "GL", k=k).single()
+        if rec and rec["keywords"]:
+            return [kw.strip() for kw in rec["keywords"] if isinstance(kw, str) and kw.strip()]
+        # Sin ranking precalculado: orden en la propia query
+        res = s.run(_TOP_TRENDS_QUERY, niche=niche, region=region, k=k)
         out = []
         for r in res:
             kw = r.get("keyword")
@@ -55,14 +81,11 @@ def top_trends_by_niche(niche: str, region: Optional[str] = None, k: int = 25) -
 def niche_lexicon(niche: str, region: Optional[str] = None) -> Dict[str, Any]:
     """Devuelve top_keywords, top_tags, vocab del nodo Niche."""
     # región no siempre existe en el nodo; mantenemos firma homogénea por si a futuro lo particionas.
-    q = """
-    MATCH (n:Niche {name: $niche})
-    RETURN n.top_keywords AS top_keywords,
-           n.top_tags     AS top_tags,
-           n.vocab        AS vocab
-    """
-    with driver.session() as s:
-        rec = s.run(q, niche=niche).single()
+    snap = snapshot.lexicon(niche)
+    if snap is not None:
+        return snap
+    with get_driver().session() as s:
+        rec = s.run(_NICHE_LEXICON_QUERY, niche=niche).single()
         if not rec:
             return {"top_keywords": [], "top_tags": [], "vocab": []}
         def _as_list(x):
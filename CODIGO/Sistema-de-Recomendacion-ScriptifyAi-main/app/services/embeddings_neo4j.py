@@ -1,14 +1,10 @@
 # app/services/embeddings_neo4j.py
 import os
 import math
-import requests
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
-from neo4j import GraphDatabase
-
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASS = os.getenv("NEO4J_PASSWORD", "28080808")
+from services import snapshot
+from services.neo4j_client import get_driver
 
 EMBED_PROVIDER = os.getenv("EMBED_PROVIDER", "ollama").lower()
 EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
@@ -17,7 +13,59 @@ OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
 # Dim esperada por tu índice HNSW (768 para nomic-embed-text)
 EXPECTED_DIM = int(os.getenv("EMBED_DIM", "768"))
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
+# Cómo se guarda el embedding en el grafo (ver services/quantized_vectors.py):
+#   float -> v.embedding (lista de floats; la que usa el índice vectorial HNSW)
+#   int8  -> v.embedding_i8 (bytes, 1 B/dim) + v.embedding_scale; ~8x menos que la
+#            lista de floats, pero sin índice en Neo4j: la búsqueda va por el snapshot
+#   both  -> las dos
+EMBED_GRAPH_FORMAT = os.getenv("EMBED_GRAPH_FORMAT", "float").lower()
+
+
+# ------------------------------------------------------------
+# Queries (a nivel de módulo para poder auditarlas: scripts/audit_query_plans.py)
+# ------------------------------------------------------------
+
+# Candidatos sin embedding. `IS NULL` no puede resolverse con índice: es un recorrido
+# por etiqueta aceptado (job de administración, no camino de lectura por request).
+_COUNT_MISSING_QUERY = """
+MATCH (v:Video)
+WHERE v.embedding IS NULL AND v.embedding_i8 IS NULL
+RETURN count(v) AS total
+"""
+
+_PICK_MISSING_QUERY = """
+MATCH (v:Video)
+WHERE v.embedding IS NULL AND v.embedding_i8 IS NULL
+RETURN v.id AS id, v.title AS title
+LIMIT $batch
+"""
+
+_SET_EMBEDDING_QUERY = """
+MATCH (v:Video {id:$id})
+SET v.embedding = $emb
+"""
+
+_SET_EMBEDDING_I8_QUERY = """
+MATCH (v:Video {id:$id})
+SET v.embedding_i8 = $codes, v.embedding_scale = $scale
+"""
+
+_SET_EMBEDDING_BOTH_QUERY = """
+MATCH (v:Video {id:$id})
+SET v.embedding = $emb, v.embedding_i8 = $codes, v.embedding_scale = $scale
+"""
+
+_VECTOR_SEARCH_QUERY = """
+CALL db.index.vector.queryNodes('video_embedding_index', $limit, $vec)
+YIELD node, score
+RETURN node.videoId AS videoId,
+       node.title AS title,
+       node.engagement_rate AS engagement_rate,
+       node.seconds AS seconds,
+       node.publishedAt AS publishedAt,
+       score
+LIMIT $k
+"""
 
 
 def _len_or_zero(x):
@@ -34,6 +82,8 @@ def _embed_ollama(text: str) -> List[float]:
       2) {"input": ["texto"]} -> data['embeddings'][0]
     Devuelve [] si no hay vector usable.
     """
+    import requests
+
     url = f"{OLLAMA_HOST}/api/embeddings"
     headers = {"Content-Type": "application/json"}
 
@@ -70,6 +120,33 @@ def _embed(text: str) -> List[float]:
     return vec
 
 
+def embed_many(texts: List[str], timeout: float = 30.0, fallback: bool = True) -> List[List[float]]:
+    """
+    Embeddings de varios textos en UNA llamada (/api/embed con lista en `input`).
+    Si el servidor no soporta el batch (Ollama antiguo) cae a una llamada por texto;
+    con fallback=False (camino de request) no hay ese bucle y se devuelve todo vacío.
+    Devuelve una lista alineada con `texts` ([] donde no hubo vector).
+    """
+    if not texts:
+        return []
+    if EMBED_PROVIDER != "ollama":
+        return [[] for _ in texts]
+    import requests
+
+    try:
+        r = requests.post(f"{OLLAMA_HOST}/api/embed", json={"model": EMBED_MODEL, "input": list(texts)},
+                          timeout=timeout)
+        r.raise_for_status()
+        embs = r.json().get("embeddings") or []
+        if isinstance(embs, list) and len(embs) == len(texts):
+            return [e if _len_or_zero(e) > 0 else [] for e in embs]
+    except Exception:
+        pass
+    if not fallback:
+        return [[] for _ in texts]
+    return [_embed(t) for t in texts]
+
+
 def _check_dim(vec: List[float]) -> Optional[str]:
     if not vec:
         return "embedding vacío"
@@ -82,40 +159,48 @@ def _check_dim(vec: List[float]) -> Optional[str]:
     return None
 
 
-def seed_embeddings(batch_size: int = 2000) -> Dict[str, Any]:
+def _store_embedding(session, vid: Any, vec: List[float]) -> None:
+    if EMBED_GRAPH_FORMAT == "float":
+        session.run(_SET_EMBEDDING_QUERY, id=vid, emb=vec)
+        return
+    from services.quantized_vectors import int8_to_bytes
+
+    # bytes -> byte[] en Neo4j (no una lista de enteros de 8 B cada uno)
+    codes, scale = int8_to_bytes(vec)
+    if EMBED_GRAPH_FORMAT == "int8":
+        session.run(_SET_EMBEDDING_I8_QUERY, id=vid, codes=codes, scale=scale)
+    else:
+        session.run(_SET_EMBEDDING_BOTH_QUERY, id=vid, emb=vec, codes=codes, scale=scale)
+
+
+def seed_embeddings(
+    batch_size: int = 2000,
+    progress: Optional[Callable[[int, int], None]] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
     """
     Busca videos sin embedding y les genera v.embedding con la dimensión esperada.
+    progress(done, total) se llama tras cada video procesado; si should_cancel()
+    devuelve True se corta entre videos y se devuelve lo hecho (cancelled=True).
     """
-    with driver.session() as session:
-        # count candidatos
-        q_cnt = """
-        MATCH (v:Video)
-        WHERE v.embedding IS NULL
-        RETURN count(v) AS total
-        """
-        total = session.run(q_cnt).single()["total"]
-
-        q_pick = """
-        MATCH (v:Video)
-        WHERE v.embedding IS NULL
-        RETURN v.id AS id, v.title AS title
-        LIMIT $batch
-        """
-
-        q_set = """
-        MATCH (v:Video {id:$id})
-        SET v.embedding = $emb
-        """
+    with get_driver().session() as session:
+        total = session.run(_COUNT_MISSING_QUERY).single()["total"]
 
         updated = 0
         tries = 0
+        cancelled = False
+        if progress:
+            progress(0, total)
 
-        while updated < total and tries < 10:
-            rows = list(session.run(q_pick, batch=batch_size))
+        while updated < total and tries < 10 and not cancelled:
+            rows = list(session.run(_PICK_MISSING_QUERY, batch=batch_size))
             if not rows:
                 break
 
             for row in rows:
+                if should_cancel and should_cancel():
+                    cancelled = True
+                    break
                 vid = row["id"]
                 title = row["title"] or ""
                 vec = _embed(title)
@@ -123,8 +208,10 @@ def seed_embeddings(batch_size: int = 2000) -> Dict[str, Any]:
                 if err:
                     # si embedding falla, salta y continúa
                     continue
-                session.run(q_set, id=vid, emb=vec)
+                _store_embedding(session, vid, vec)
                 updated += 1
+                if progress:
+                    progress(updated, total)
 
             tries += 1
 
@@ -132,9 +219,11 @@ def seed_embeddings(batch_size: int = 2000) -> Dict[str, Any]:
             "ok": True,
             "total_candidates": total,
             "updated": updated,
+            "cancelled": cancelled,
             "dim": EXPECTED_DIM,
             "model": EMBED_MODEL,
             "provider": EMBED_PROVIDER,
+            "graph_format": EMBED_GRAPH_FORMAT,
         }
 
 
@@ -152,20 +241,28 @@ def vector_search(q: str, k: int = 5) -> Dict[str, Any]:
             "error": f"Embeddings vacíos o inválidos desde {EMBED_PROVIDER}. ({err})",
         }
 
-    cypher = """
-    CALL db.index.vector.queryNodes('video_embedding_index', $limit, $vec)
-    YIELD node, score
-    RETURN node.videoId AS videoId,
-           node.title AS title,
-           node.engagement_rate AS engagement_rate,
-           node.seconds AS seconds,
-           node.publishedAt AS publishedAt,
-           score
-    LIMIT $k
-    """
-    with driver.session() as session:
+    recs = snapshot.vector_search(vec, k)
+    if recs is not None:
+        return {
+            "ok": True,
+            "query": q,
+            "k": k,
+            "embed_dim": EXPECTED_DIM,
+            "model": EMBED_MODEL,
+            "provider": EMBED_PROVIDER,
+            "source": "snapshot",
+            "results": recs,
+        }
+    if EMBED_GRAPH_FORMAT == "int8":
+        return {
+            "ok": False,
+            "where": "vector-search",
+            "error": "EMBED_GRAPH_FORMAT=int8 no tiene índice vectorial en Neo4j: define GRAPH_SNAPSHOT_PATH.",
+        }
+
+    with get_driver().session() as session:
         recs = []
-        for r in session.run(cypher, limit=max(50, k), vec=vec, k=k):
+        for r in session.run(_VECTOR_SEARCH_QUERY, limit=max(50, k), vec=vec, k=k):
             recs.append({
                 "videoId": r["videoId"],
                 "title": r["title"],
@@ -0,0 +1,308 @@
+# app/services/feedback.py
+import fcntl
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.text_norm import vocab_tokens
+
+# ----------------------------
+# Feedback (likes) persistente
+# ----------------------------
+# Tres etapas, ninguna en el camino de la request:
+#
+#   1) record_like() tokeniza y encola en memoria (cola acotada): O(1), sin I/O.
+#   2) Un hilo escritor por proceso vacía la cola en lotes: una transacción SQLite
+#      (WAL) por lote con el log append-only (`likes`) y el upsert de los agregados
+#      por (nicho, región, token) en `token_weights`.
+#   3) Write-behind al grafo: cada FEEDBACK_GRAPH_FLUSH_S se leen los likes nuevos
+#      (cursor en `meta`), se agregan y se escriben con UNWIND en nodos
+#      (:FeedbackToken {niche, region, token}). Un flock garantiza que solo un
+#      worker de la máquina empuja cada tramo.
+#
+# token_weights() sirve los agregados al constructor de contexto desde un dict
+# en memoria (refresco desde SQLite cada FEEDBACK_WEIGHTS_TTL segundos).
+
+_APP_DIR = Path(__file__).resolve().parents[1]
+FEEDBACK_DB = os.getenv("FEEDBACK_DB") or str(_APP_DIR / "var" / "feedback.sqlite")
+_QUEUE_MAX = int(os.getenv("FEEDBACK_QUEUE_MAX", "100000"))
+_BATCH = int(os.getenv("FEEDBACK_BATCH", "2000"))
+_BATCH_WAIT_S = float(os.getenv("FEEDBACK_BATCH_WAIT_S", "0.05"))
+_GRAPH_FLUSH_S = float(os.getenv("FEEDBACK_GRAPH_FLUSH_S", "5"))
+_GRAPH_BATCH = int(os.getenv("FEEDBACK_GRAPH_BATCH", "5000"))
+_WEIGHTS_TTL_S = float(os.getenv("FEEDBACK_WEIGHTS_TTL", "30"))
+_WEIGHTS_TOP = int(os.getenv("FEEDBACK_WEIGHTS_TOP", "50"))
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS likes (
+      id          INTEGER PRIMARY KEY AUTOINCREMENT,
+      ts          REAL NOT NULL,
+      niche       TEXT NOT NULL,
+      region      TEXT NOT NULL,
+      idea        TEXT NOT NULL,
+      specialties TEXT NOT NULL,
+      tokens      TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS token_weights (
+      niche   TEXT NOT NULL,
+      region  TEXT NOT NULL,
+      token   TEXT NOT NULL,
+      weight  REAL NOT NULL,
+      updated REAL NOT NULL,
+      PRIMARY KEY (niche, region, token)
+    ) WITHOUT ROWID
+    """,
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+]
+
+_UPSERT_WEIGHT = """
+INSERT INTO token_weights (niche, region, token, weight, updated) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (niche, region, token) DO UPDATE SET
+  weight = weight + excluded.weight, updated = excluded.updated
+"""
+
+_GRAPH_QUERY = """
+UNWIND $rows AS row
+MERGE (f:FeedbackToken {niche: row.niche, region: row.region, token: row.token})
+ON CREATE SET f.weight = 0
+SET f.weight = f.weight + row.weight, f.updated_at = $now
+"""
+
+_tls = threading.local()
+
+
+def _conn() -> sqlite3.Connection:
+    pid = os.getpid()
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and getattr(_tls, "pid", None) == pid:
+        return conn
+    Path(FEEDBACK_DB).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(FEEDBACK_DB, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: durable ante caída del proceso
+    for q in _SCHEMA:
+        conn.execute(q)
+    _tls.conn, _tls.pid = conn, pid
+    return conn
+
+
+def _key(niche: Optional[str], region: Optional[str]) -> Tuple[str, str]:
+    return (niche or "").strip().lower(), (region or "GL").strip().upper()
+
+
+def tokenize(idea: str) -> List[str]:
+    """Tokens de la idea (ascii, >= 3 caracteres, sin repetir)."""
+    return list(dict.fromkeys(vocab_tokens(idea or "")))
+
+# ----------------------------
+# 1) Ingesta (camino de la request)
+# ----------------------------
+
+_QUEUE: "queue.Queue[Tuple[Any, ...]]" = queue.Queue(maxsize=_QUEUE_MAX)
+_STATE: Dict[str, Any] = {"pid": None, "threads": [], "stop": None, "dropped": 0}
+_START_LOCK = threading.Lock()
+
+
+def record_like(niche: str, idea: str, region: Optional[str] = None,
+                specialties: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Encola un like y vuelve sin I/O. Si la cola está llena el like se descarta (y se cuenta)."""
+    start()
+    n, r = _key(niche, region)
+    toks = tokenize(idea)
+    try:
+        _QUEUE.put_nowait((time.time(), n, r, idea or "", list(specialties or []), toks))
+        queued = True
+    except queue.Full:
+        _STATE["dropped"] += 1
+        queued = False
+    return {"niche": n, "region": r, "tokens": toks, "queued": queued}
+
+# ----------------------------
+# 2) Escritor por lotes -> SQLite
+# ----------------------------
+
+def _write_batch(batch: List[Tuple[Any, ...]]) -> None:
+    now = time.time()
+    agg: Counter = Counter()
+    for _, n, r, _, _, toks in batch:
+        for t in toks:
+            agg[(n, r, t)] += 1.0
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO likes (ts, niche, region, idea, specialties, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+            [(ts, n, r, idea, json.dumps(sp, ensure_ascii=False), json.dumps(toks, ensure_ascii=False))
+             for ts, n, r, idea, sp, toks in batch],
+        )
+        conn.executemany(_UPSERT_WEIGHT, [(n, r, t, w, now) for (n, r, t), w in agg.items()])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    # Los agregados de este proceso se ven al instante; los de otros workers, al caducar el TTL
+    for n, r in {(n, r) for n, r, _ in agg}:
+        _WEIGHTS.pop((n, r), None)
+
+
+def _drain(max_items: int, wait_s: float) -> List[Tuple[Any, ...]]:
+    batch: List[Tuple[Any, ...]] = []
+    try:
+        batch.append(_QUEUE.get(timeout=wait_s))
+    except queue.Empty:
+        return batch
+    while len(batch) < max_items:
+        try:
+            batch.append(_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _writer_loop(stop: threading.Event) -> None:
+    while not (stop.is_set() and _QUEUE.empty()):
+        batch = _drain(_BATCH, _BATCH_WAIT_S)
+        if not batch:
+            continue
+        try:
+            _write_batch(batch)
+        except sqlite3.Error:
+            # SQLite ocupado/bloqueado: se reintenta el lote en la siguiente vuelta
+            time.sleep(0.1)
+            for item in batch:
+                try:
+                    _QUEUE.put_nowait(item)
+                except queue.Full:
+                    _STATE["dropped"] += 1
+
+# ----------------------------
+# 3) Write-behind -> Neo4j
+# ----------------------------
+
+def _get_cursor(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key='graph_cursor'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def flush_to_graph(session=None, max_rows: int = _GRAPH_BATCH) -> Dict[str, Any]:
+    """
+    Empuja al grafo los likes posteriores al cursor, agregados por (nicho, región, token),
+    en una escritura UNWIND por tramo. El cursor solo avanza si la escritura termina bien.
+    """
+    lock_path = FEEDBACK_DB + ".graph.lock"
+    Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return {"ok": True, "skipped": "otro proceso está volcando"}
+        conn = _conn()
+        cursor = _get_cursor(conn)
+        rows = conn.execute(
+            "SELECT id, niche, region, tokens FROM likes WHERE id > ? ORDER BY id LIMIT ?", (cursor, max_rows)
+        ).fetchall()
+        if not rows:
+            return {"ok": True, "likes": 0, "tokens": 0}
+        agg: Counter = Counter()
+        for _, n, r, toks in rows:
+            for t in json.loads(toks):
+                agg[(n, r, t)] += 1.0
+        payload = [{"niche": n, "region": r, "token": t, "weight": w} for (n, r, t), w in agg.items()]
+        if session is None:
+            from services.neo4j_client import get_driver
+
+            with get_driver().session() as s:
+                s.run(_GRAPH_QUERY, rows=payload, now=time.time()).consume()
+        else:
+            session.run(_GRAPH_QUERY, rows=payload, now=time.time()).consume()
+        conn.execute("INSERT INTO meta (key, value) VALUES ('graph_cursor', ?) "
+                     "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (str(rows[-1][0]),))
+        return {"ok": True, "likes": len(rows), "tokens": len(payload), "cursor": rows[-1][0]}
+
+
+def _graph_loop(stop: threading.Event) -> None:
+    while not stop.wait(_GRAPH_FLUSH_S):
+        try:
+            while flush_to_graph().get("likes", 0) >= _GRAPH_BATCH:
+                pass
+        except Exception:
+            # Neo4j caído: los likes siguen en SQLite y se reintentan en la próxima vuelta
+            pass
+
+# ----------------------------
+# Ciclo de vida (por proceso: los hilos no sobreviven a fork)
+# ----------------------------
+
+def start() -> None:
+    pid = os.getpid()
+    if _STATE["pid"] == pid:
+        return
+    with _START_LOCK:
+        if _STATE["pid"] == pid:
+            return
+        stop = threading.Event()
+        threads = [threading.Thread(target=_writer_loop, args=(stop,), name="feedback-writer", daemon=True)]
+        if _GRAPH_FLUSH_S > 0:
+            threads.append(threading.Thread(target=_graph_loop, args=(stop,), name="feedback-graph", daemon=True))
+        for t in threads:
+            t.start()
+        _STATE.update(pid=pid, threads=threads, stop=stop)
+
+
+def shutdown(timeout: float = 10.0, flush_graph: bool = True) -> None:
+    """Vacía la cola a SQLite y (opcional) hace un último volcado al grafo."""
+    if _STATE["pid"] != os.getpid():
+        return
+    _STATE["stop"].set()
+    for t in _STATE["threads"]:
+        t.join(timeout)
+    _STATE["pid"] = None
+    if flush_graph:
+        try:
+            flush_to_graph()
+        except Exception:
+            pass
+
+
+def stats() -> Dict[str, Any]:
+    conn = _conn()
+    total = conn.execute("SELECT coalesce(max(id), 0) FROM likes").fetchone()[0]
+    return {"queued": _QUEUE.qsize(), "dropped": _STATE["dropped"], "stored": total,
+            "graph_cursor": _get_cursor(conn)}
+
+# ----------------------------
+# Lectura de agregados (constructor de contexto)
+# ----------------------------
+
+_WEIGHTS: Dict[Tuple[str, str], Tuple[float, Dict[str, float]]] = {}
+
+
+def token_weights(niche: str, region: Optional[str] = None) -> Dict[str, float]:
+    """
+    {token: peso} de los likes del par (nicho, región), los _WEIGHTS_TOP más pesados.
+    Dict en memoria por par; se recarga (una query por PK) cuando caduca.
+    """
+    key = _key(niche, region)
+    hit = _WEIGHTS.get(key)
+    now = time.time()
+    if hit is not None and now - hit[0] < _WEIGHTS_TTL_S:
+        return hit[1]
+    try:
+        rows = _conn().execute(
+            "SELECT token, weight FROM token_weights WHERE niche=? AND region=? ORDER BY weight DESC LIMIT ?",
+            (*key, _WEIGHTS_TOP),
+        ).fetchall()
+    except sqlite3.Error:
+        rows = []
+    weights = {t: float(w) for t, w in rows}
+    _WEIGHTS[key] = (now, weights)
+    return weights
@@ -1,22 +1,31 @@
 # app/services/graph_examples.py
 import os
-import re
-from typing import Any, Dict, List, Optional
-from neo4j import GraphDatabase
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
 
-# ---- Neo4j driver (env .env o defaults)
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASS = os.getenv("NEO4J_PASSWORD", "password")
+from services.feedback import token_weights
+from services.near_dup import keep_indices
+from services import snapshot
+from services.neo4j_client import get_driver
+from services.shared_store import SharedCache
+from services.term_expansion import expand_terms
+from services.text_norm import (
+    normalize_many,
+    normalize_token as _normalize_token,
+    vocab_tokens as _tokenize_for_vocab,
+)
 
-_DRIVER = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
+# Cambia DATA_VERSION tras cada ETL para invalidar cachés (contexto, índices de nicho)
+_DATA_VERSION = os.getenv("DATA_VERSION", "")
 
 # ------------------------------------------------------------
 # Query “payload”: examples (con videoId/url/hashtags_for_examples) + trends (o fallback)
 # ------------------------------------------------------------
-_PAYLOAD_QUERY = r"""
-MATCH (n:Niche {name:$niche, region:$region})
-
+# Cuerpo común: parte de `n` y `region` (en mayúsculas) ya ligados y produce examples,
+# trends_ranked, trends_real y trends_fallback (los cortes [..top_k] / [..top_trends] se
+# aplican en el RETURN de cada variante)
+_PAYLOAD_BODY = r"""
 // ------------ EXAMPLES + HASHTAGS LIMPIOS ------------
 CALL {
   WITH n
@@ -52,12 +61,29 @@ CALL {
     title:       e.title,
     publishedAt: e.publishedAt,
     hashtags_for_examples: hashtags
-  })[..$top_k] AS examples
+  }) AS examples
 }
 
-// ------------ TRENDS (usa IN_TREND o cae a tags) ------------
+// ------------ TRENDS ------------
+// 1) top-K precalculado por scripts/rank_trends.py (lookup indexado, O(1)); la clave es
+//    la de ese script: nicho del CSV en minúsculas (= Niche.id del ETL) + región en mayúsculas
 CALL {
-  WITH n
+  WITH n, region
+  OPTIONAL MATCH (tr:TrendRanking {niche: coalesce(n.id, toLower(trim(n.name))), region: region})
+  WITH tr, coalesce(tr.keywords, []) AS kws
+  RETURN [i IN range(0, size(kws) - 1) | {
+    keyword:    kws[i],
+    score:      tr.scores[i],
+    score_norm: tr.score_norms[i],
+    timeframe:  tr.timeframes[i],
+    source:     tr.sources[i]
+  }] AS trends_ranked
+}
+// 2) sin ranking: IN_TREND y, si tampoco hay, tags de los ejemplos. El WHERE corta
+//    el subquery cuando ya hay ranking (collect() sobre 0 filas devuelve []).
+CALL {
+  WITH n, trends_ranked
+  WITH n, trends_ranked WHERE size(trends_ranked) = 0
   MATCH (n)-[r:IN_TREND]->(k:Keyword)
   RETURN collect({
     keyword:    toLower(k.name),
@@ -65,10 +91,11 @@ CALL {
     score_norm: coalesce(r.score_norm,0.0),
     timeframe:  r.timeframe,
     source:     r.source
-  })[..$top_trends] AS trends_real
+  }) AS trends_real
 }
 CALL {
-  WITH n
+  WITH n, trends_ranked, trends_real
+  WITH n, trends_ranked, trends_real WHERE size(trends_ranked) = 0 AND size(trends_real) = 0
   MATCH (n)<-[:BELONGS_TO]-(e:Example)
   OPTIONAL MATCH (e)-[:HAS_TAG]->(t:Tag)
   WITH toLower(t.name) AS keyword, count(DISTINCT e) AS score
@@ -80,13 +107,39 @@ CALL {
     score_norm: toFloat(score),
     timeframe:  'fallback-tags',
     source:     'derived'
-  })[..$top_trends] AS trends_fallback
+  }) AS trends_fallback
 }
+"""
+
+_PAYLOAD_QUERY = r"""
+MATCH (n:Niche {name:$niche, region:$region})
+WITH n, $region AS region
+""" + _PAYLOAD_BODY + r"""
 RETURN
-  examples,
-  CASE WHEN size(trends_real) > 0 THEN trends_real ELSE trends_fallback END AS trends
+  examples[..$top_k] AS examples,
+  (CASE WHEN size(trends_ranked) > 0 THEN trends_ranked
+        WHEN size(trends_real) > 0 THEN trends_real
+        ELSE trends_fallback END)[..$top_trends] AS trends
 """
 
+# Variante por lotes: una sola query y un solo stream para muchos (nicho, región, k)
+_PAYLOAD_BATCH_QUERY = r"""
+UNWIND $items AS it
+MATCH (n:Niche {name:it.niche, region:it.region})
+WITH it, n, it.region AS region
+""" + _PAYLOAD_BODY + r"""
+RETURN
+  it.niche  AS niche,
+  it.region AS region,
+  examples[..it.top_k] AS examples,
+  (CASE WHEN size(trends_ranked) > 0 THEN trends_ranked
+        WHEN size(trends_real) > 0 THEN trends_real
+        ELSE trends_fallback END)[..$top_trends] AS trends
+"""
+
+# Contexto por (nicho, región, k) compartido entre workers; CONTEXT_CACHE_TTL=0 lo desactiva
+_CONTEXT_CACHE = SharedCache("ctx", ttl=float(os.getenv("CONTEXT_CACHE_TTL", "300")))
+
 def get_context_for_llm(
     niche: str,
     region: Optional[str],
@@ -94,22 +147,96 @@ def get_context_for_llm(
     ann_limit: int = 0,
     query_text: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Lee Neo4j y devuelve examples (con videoId/url/hashtags_for_examples) y trends."""
+    """
+    Devuelve examples (con videoId/url/hashtags_for_examples) y trends, desde el
+    snapshot local si GRAPH_SNAPSHOT_PATH está publicado o desde Neo4j si no.
+    """
     params = {
         "niche": (niche or "").lower().strip(),
         "region": (region or "GL").upper().strip(),
         "top_k": int(k or 15),
         "top_trends": 12,
     }
-    with _DRIVER.session() as sess:
+    key = f"{_cache_version()}|{params['niche']}|{params['region']}|{params['top_k']}"
+    return _CONTEXT_CACHE.get_or_set(key, lambda: _fetch_context(params))
+
+def _cache_version() -> str:
+    # Un swap de snapshot equivale a datos nuevos: las claves viejas dejan de usarse
+    return f"{_DATA_VERSION}{snapshot.version()}"
+
+def clear_context_cache() -> None:
+    # Sube la generación de "ctx" en el almacén compartido: los LRU locales de todos los
+    # workers se descartan en su siguiente lectura, no solo el de este proceso
+    _CONTEXT_CACHE.clear()
+
+def _context_payload(examples: List[Dict[str, Any]], trends: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Re-subidas / títulos casi iguales: fuera antes de cachear (una vez por contexto)
+    examples = [examples[i] for i in keep_indices([e.get("title") or "" for e in examples])]
+    # examples_list: compatibilidad con llamadas que esperan solo títulos
+    examples_list = [{"title": e.get("title")} for e in examples if e.get("title")]
+    return {"examples": examples, "trends": trends, "examples_list": examples_list}
+
+def _fetch_context(params: Dict[str, Any]) -> Dict[str, Any]:
+    snap = snapshot.context(params["niche"], params["region"], params["top_k"])
+    if snap is not None:
+        return _context_payload(*snap)
+    with get_driver().session() as sess:
         rec = sess.run(_PAYLOAD_QUERY, **params).single()
         if not rec:
-            return {"examples": [], "trends": [], "examples_list": []}
-        examples = rec["examples"] or []
-        trends = rec["trends"] or []
-        # Compatibilidad con llamadas que esperan solo títulos
-        examples_list = [{"title": e.get("title")} for e in examples if e.get("title")]
-        return {"examples": examples, "trends": trends, "examples_list": examples_list}
+            return _context_payload([], [])
+        return _context_payload(rec["examples"] or [], rec["trends"] or [])
+
+def get_contexts_for_llm(
+    items: List[Tuple[str, Optional[str], int]],
+    chunk_size: int = 200,
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Contexto para muchos (nicho, región, k) a la vez: lo que ya está en la caché
+    compartida se sirve de ahí y el resto sale de UNA query UNWIND por bloque de
+    `chunk_size` (una sesión y un solo stream de resultados).
+    Devuelve {(nicho, REGIÓN): contexto}; los pares sin nodo Niche vienen vacíos.
+    Si un mismo par llega con varios k, gana el mayor.
+    """
+    wanted: Dict[Tuple[str, str], int] = {}
+    for niche, region, k in items:
+        pair = ((niche or "").lower().strip(), (region or "GL").upper().strip())
+        wanted[pair] = max(wanted.get(pair, 0), int(k or 15))
+
+    out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    missing: List[Dict[str, Any]] = []
+    version = _cache_version()
+    for (niche, region), k in wanted.items():
+        hit = _CONTEXT_CACHE.get(f"{version}|{niche}|{region}|{k}")
+        if hit is not None:
+            out[(niche, region)] = hit
+        else:
+            missing.append({"niche": niche, "region": region, "top_k": k})
+
+    if not missing:
+        return out
+    # Con snapshot, lo que no esté exportado (context() -> None) se pide a Neo4j
+    rest = missing
+    if snapshot.current() is not None:
+        rest = []
+        for it in missing:
+            snap = snapshot.context(it["niche"], it["region"], it["top_k"])
+            if snap is None:
+                rest.append(it)
+            else:
+                out[(it["niche"], it["region"])] = _context_payload(*snap)
+    if rest:
+        with get_driver().session() as sess:
+            for i in range(0, len(rest), chunk_size):
+                chunk = rest[i:i + chunk_size]
+                for rec in sess.run(_PAYLOAD_BATCH_QUERY, items=chunk, top_trends=12):
+                    out[(rec["niche"], rec["region"])] = _context_payload(rec["examples"] or [], rec["trends"] or [])
+    # Con snapshot o con Neo4j: los pares sin datos quedan vacíos y todo se cachea
+    # (warm_contexts depende de esto); se devuelve la forma cacheada (fechas -> ISO)
+    for it in missing:
+        pair = (it["niche"], it["region"])
+        ctx = out.setdefault(pair, _context_payload([], []))
+        out[pair] = _CONTEXT_CACHE.set(f"{version}|{pair[0]}|{pair[1]}|{it['top_k']}", ctx)
+    return out
 
 # ---------------------------
 # Utilidades RAG (fallbacks)
@@ -142,44 +269,85 @@ _BANNED_ANALOGIES = [
     "final de fútbol",
 ]
 
-def _normalize_token(s: str) -> str:
-    s = (s or "").lower()
-    s = (
-        s.replace("á", "a").replace("é", "e").replace("í", "i")
-         .replace("ó", "o").replace("ú", "u").replace("ñ", "n")
-    )
-    s = re.sub(r"[^a-z0-9\-\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+_STOP_WORDS = {
+    "de","la","el","los","las","y","o","u","para","por","en","del","con","sin",
+    "una","un","uno","al","lo","que","como","sus","su","tu","mi","se","es",
+    "vs","vs.","en","sobre","guia","paso","checklist","errores","tutorial"
+}
 
-def _extract_top_keywords_from_titles(titles: List[str], limit: int = 20) -> List[str]:
-    stop = {
-        "de","la","el","los","las","y","o","u","para","por","en","del","con","sin",
-        "una","un","uno","al","lo","que","como","sus","su","tu","mi","se","es",
-        "vs","vs.","en","sobre","guia","paso","checklist","errores","tutorial"
-    }
+def _keyword_freq(titles: List[str]) -> Dict[str, int]:
     freq: Dict[str, int] = {}
-    for t in titles:
-        toks = _normalize_token(t).split()
-        for w in toks:
-            if len(w) < 3 or w in stop:
+    for norm in normalize_many(titles):
+        for w in norm.split():
+            if len(w) < 3 or w in _STOP_WORDS:
                 continue
             freq[w] = freq.get(w, 0) + 1
+    return freq
+
+def _extract_top_keywords_from_titles(titles: List[str], limit: int = 20) -> List[str]:
+    freq = _keyword_freq(titles)
     sorted_kw = [w for w, _ in sorted(freq.items(), key=lambda x: (-x[1], x[0]))]
     return sorted_kw[:limit] if sorted_kw else []
 
-def _expand_terms_fallback(terms: List[str], k: int = 6) -> List[str]:
-    acc = set()
-    for t in terms or []:
-        n = _normalize_token(t)
-        if not n:
-            continue
-        acc.add(n)
-        if n.endswith("s"):
-            acc.add(n[:-1])
-        if "-" in n:
-            acc.update(n.split("-"))
-    return list(sorted(acc))[:max(k, len(acc))]
+# ---------------------------
+# Índice por (nicho, región): glosario + frecuencias + vocab de hashtags
+# ---------------------------
+
+class NicheIndex(NamedTuple):
+    glossary: Tuple[str, ...]
+    freq: Tuple[Tuple[str, int], ...]
+    vocab: FrozenSet[str]
+
+_NICHE_INDEX_MAX = int(os.getenv("NICHE_INDEX_MAX", "512"))
+_NICHE_INDEX: "OrderedDict[Tuple[Any, ...], NicheIndex]" = OrderedDict()
+_NICHE_INDEX_LOCK = threading.Lock()
+
+def _build_niche_index(niche: str, titles: List[str], limit: int = 20) -> NicheIndex:
+    ranked = sorted(_keyword_freq(titles).items(), key=lambda x: (-x[1], x[0]))
+    glossary = tuple(w for w, _ in ranked[:limit])
+    if not glossary and niche:
+        glossary = (_normalize_token(niche),)
+    vocab = set(_tokenize_for_vocab(niche))
+    for w in glossary:
+        vocab.update(_tokenize_for_vocab(w))
+    return NicheIndex(glossary=glossary, freq=tuple(ranked), vocab=frozenset(vocab))
+
+def get_niche_index(niche: str, region: Optional[str], titles: List[str]) -> NicheIndex:
+    """
+    Glosario, tabla de frecuencias y vocab base de hashtags para (nicho, región).
+    Se calcula una sola vez por versión de datos: la clave incluye DATA_VERSION y
+    la huella de los títulos, así que un cambio en el grafo genera una entrada nueva.
+    """
+    key = (
+        (niche or "").lower().strip(),
+        (region or "GL").upper().strip(),
+        _DATA_VERSION,
+        hash(tuple(titles)),
+    )
+    idx = _NICHE_INDEX.get(key)
+    if idx is not None:
+        return idx
+    idx = _build_niche_index(niche, titles)
+    with _NICHE_INDEX_LOCK:
+        _NICHE_INDEX[key] = idx
+        while len(_NICHE_INDEX) > _NICHE_INDEX_MAX:
+            _NICHE_INDEX.popitem(last=False)
+    return idx
+
+def clear_niche_index() -> None:
+    with _NICHE_INDEX_LOCK:
+        _NICHE_INDEX.clear()
+
+_FEEDBACK_GLOSSARY_EXTRA = int(os.getenv("FEEDBACK_GLOSSARY_EXTRA", "5"))
+
+def _boost_with_feedback(glossary: List[str], weights: Dict[str, float]) -> List[str]:
+    """Términos con likes primero (orden estable) + los más votados que aún no estén."""
+    if not weights:
+        return glossary
+    boosted = sorted(glossary, key=lambda w: -weights.get(w, 0.0))
+    have = set(boosted)
+    extra = [t for t in weights if t not in have and t not in _STOP_WORDS][:_FEEDBACK_GLOSSARY_EXTRA]
+    return boosted + extra
 
 def build_llm_context(
     niche: str,
@@ -188,11 +356,12 @@ def build_llm_context(
     top_k: int = 10,
     region: Optional[str] = None,
     preset_examples: Optional[List[Dict[str, Any]]] = None,
+    preset_trends: Optional[List[Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
     # 1) Ejemplos (full) + trends desde Neo4j si no vienen pre-seteados
     if preset_examples is not None:
         examples = preset_examples
-        trends = []
+        trends = preset_trends or []
     else:
         ctx = get_context_for_llm(niche=niche, region=region, k=max(top_k, 10))
         examples = ctx.get("examples") or []
@@ -200,19 +369,19 @@ def build_llm_context(
 
     example_titles = [e.get("title") for e in examples if e.get("title")]
 
-    # 2) Glosario fallback desde títulos
-    glossary = _extract_top_keywords_from_titles(example_titles, limit=20)
-    if not glossary and niche:
-        glossary = [_normalize_token(niche)]
+    # 2) Glosario + vocab de hashtags (precomputados por nicho/región y versión de datos)
+    idx = get_niche_index(niche, region, example_titles)
+    glossary = _boost_with_feedback(list(idx.glossary), token_weights(niche, region))
 
-    # 3) Expansión sencilla de specialties (fallback)
-    expanded = _expand_terms_fallback(specialties, k=8)
+    # 3) Specialties + vecinos precalculados del nicho (lookup cacheado, sin modelo)
+    expanded = expand_terms(niche, specialties, k=8)
 
     # 4) Style por plataforma
     style = _STYLE_GUIDES.get((platform or "").lower(), [])
 
     return {
         "glossary": glossary,
+        "hashtag_vocab": idx.vocab,
         "expanded_specialties": expanded,
         "example_titles": example_titles[:top_k],
         "style_guides": _STYLE_GUIDES,
@@ -0,0 +1,145 @@
+# app/services/graph_schema.py
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from services.neo4j_client import get_driver
+
+# ------------------------------------------------------------
+# Esquema del grafo: constraints + índices para cada clave de búsqueda
+# ------------------------------------------------------------
+# El ETL solo crea UNIQUE sobre `id`; las queries de lectura buscan por otras
+# propiedades (Niche.name/region, Video.publishedAt, TrendKeyword.region...).
+# Todo es idempotente (IF NOT EXISTS): se puede ejecutar en cada despliegue.
+
+CONSTRAINTS: List[str] = [
+    # Mismos nombres que scripts/neo4j_etl.py: si ya existen no se duplican
+    "CREATE CONSTRAINT niche_id IF NOT EXISTS FOR (n:Niche) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT video_id IF NOT EXISTS FOR (v:Video) REQUIRE v.id IS UNIQUE",
+    "CREATE CONSTRAINT tag_id   IF NOT EXISTS FOR (t:Tag)   REQUIRE t.id IS UNIQUE",
+    "CREATE CONSTRAINT kw_id    IF NOT EXISTS FOR (k:TrendKeyword) REQUIRE k.id IS UNIQUE",
+    "CREATE CONSTRAINT lex_id   IF NOT EXISTS FOR (l:Lexeme) REQUIRE l.id IS UNIQUE",
+]
+
+INDEXES: List[str] = [
+    # graph_examples._PAYLOAD_QUERY / _PAYLOAD_BATCH_QUERY
+    "CREATE INDEX niche_name_region IF NOT EXISTS FOR (n:Niche) ON (n.name, n.region)",
+    # data_access_neo4j (Niche {name})
+    "CREATE INDEX niche_name IF NOT EXISTS FOR (n:Niche) ON (n.name)",
+    # orden por fecha de ejemplos / videos
+    "CREATE INDEX video_published_at IF NOT EXISTS FOR (v:Video) ON (v.publishedAt)",
+    "CREATE INDEX example_published_at IF NOT EXISTS FOR (e:Example) ON (e.publishedAt)",
+    # embed_graph.py actualiza por videoId; vector_search devuelve videoId
+    "CREATE INDEX video_video_id IF NOT EXISTS FOR (v:Video) ON (v.videoId)",
+    # trends por región ordenadas por score_norm
+    "CREATE INDEX trend_region_score IF NOT EXISTS FOR (k:TrendKeyword) ON (k.region, k.score_norm)",
+    "CREATE INDEX trend_keyword IF NOT EXISTS FOR (k:TrendKeyword) ON (k.keyword)",
+    # top-K materializado (scripts/rank_trends.py)
+    "CREATE INDEX trend_ranking_niche_region IF NOT EXISTS FOR (tr:TrendRanking) ON (tr.niche, tr.region)",
+    # MERGE del volcado de feedback (services/feedback.py)
+    "CREATE INDEX feedback_token_key IF NOT EXISTS FOR (f:FeedbackToken) ON (f.niche, f.region, f.token)",
+    # fallback de trends y tags por nombre
+    "CREATE INDEX keyword_name IF NOT EXISTS FOR (k:Keyword) ON (k.name)",
+    "CREATE INDEX tag_name IF NOT EXISTS FOR (t:Tag) ON (t.name)",
+    "CREATE INDEX lexeme_text IF NOT EXISTS FOR (l:Lexeme) ON (l.text)",
+    "CREATE INDEX region_code IF NOT EXISTS FOR (r:Region) ON (r.code)",
+]
+
+
+def ensure_schema(await_seconds: int = 300) -> Dict[str, Any]:
+    """Crea constraints e índices que falten y espera a que estén ONLINE."""
+    with get_driver().session() as s:
+        for q in CONSTRAINTS + INDEXES:
+            s.run(q).consume()
+        s.run(f"CALL db.awaitIndexes({int(await_seconds)})").consume()
+        rows = s.run("SHOW INDEXES YIELD name, state, labelsOrTypes, properties RETURN *").data()
+    return {"ok": True, "indexes": rows}
+
+# ------------------------------------------------------------
+# Queries de producción (para auditar sus planes con EXPLAIN)
+# ------------------------------------------------------------
+
+class ProductionQuery(NamedTuple):
+    name: str
+    query: str
+    params: Dict[str, Any]
+    allow_scan: bool = False   # recorridos por etiqueta aceptados (jobs de admin)
+
+
+def production_queries() -> List[ProductionQuery]:
+    """Todas las queries que ejecuta la API, con parámetros de ejemplo."""
+    from services import data_access_neo4j as da
+    from services import embeddings_neo4j as emb
+    from services import feedback as fb
+    from services import graph_examples as ge
+    from services import term_expansion as te
+
+    vec = [0.0] * emb.EXPECTED_DIM
+    return [
+        ProductionQuery("graph_examples.payload", ge._PAYLOAD_QUERY,
+                        {"niche": "fitness", "region": "ES", "top_k": 10, "top_trends": 12}),
+        ProductionQuery("graph_examples.payload_batch", ge._PAYLOAD_BATCH_QUERY,
+                        {"items": [{"niche": "fitness", "region": "ES", "top_k": 10}], "top_trends": 12}),
+        ProductionQuery("data_access.top_examples", da._TOP_EXAMPLES_QUERY, {"niche": "fitness", "region": "ES", "k": 8}),
+        ProductionQuery("data_access.top_trends", da._TOP_TRENDS_QUERY, {"niche": "fitness", "region": "ES", "k": 25}),
+        ProductionQuery("data_access.top_trends_ranked", da._TOP_TRENDS_RANKED_QUERY,
+                        {"niche": "fitness", "region": "ES", "k": 25}),
+        ProductionQuery("data_access.niche_lexicon", da._NICHE_LEXICON_QUERY, {"niche": "fitness"}),
+        ProductionQuery("term_expansion.lexeme_nn", te._LEXEME_NN_QUERY, {"niche": "fitness"}),
+        ProductionQuery("feedback.graph_flush", fb._GRAPH_QUERY,
+                        {"rows": [{"niche": "fitness", "region": "ES", "token": "rutina", "weight": 1.0}], "now": 0.0}),
+        ProductionQuery("embeddings.vector_search", emb._VECTOR_SEARCH_QUERY, {"limit": 50, "vec": vec, "k": 5}),
+        ProductionQuery("embeddings.set_embedding", emb._SET_EMBEDDING_QUERY, {"id": "x", "emb": vec}),
+        ProductionQuery("embeddings.set_embedding_i8", emb._SET_EMBEDDING_I8_QUERY,
+                        {"id": "x", "codes": bytes(emb.EXPECTED_DIM), "scale": 1.0}),
+        ProductionQuery("embeddings.count_missing", emb._COUNT_MISSING_QUERY, {}, allow_scan=True),
+        ProductionQuery("embeddings.pick_missing", emb._PICK_MISSING_QUERY, {"batch": 10}, allow_scan=True),
+    ]
+
+# ------------------------------------------------------------
+# Auditoría de planes
+# ------------------------------------------------------------
+
+SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+
+def _walk(plan: Any) -> List[Tuple[str, Dict[str, Any]]]:
+    """Aplana el árbol de EXPLAIN -> [(operatorType, arguments)]."""
+    if plan is None:
+        return []
+    if isinstance(plan, dict):
+        op, args, children = plan.get("operatorType", ""), plan.get("args") or {}, plan.get("children") or []
+    else:
+        op, args, children = getattr(plan, "operator_type", ""), getattr(plan, "arguments", {}) or {}, getattr(plan, "children", []) or []
+    out = [(str(op), dict(args))]
+    for ch in children:
+        out.extend(_walk(ch))
+    return out
+
+
+def explain(query: str, params: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    with get_driver().session() as s:
+        summary = s.run("EXPLAIN " + query, **(params or {})).consume()
+    return _walk(summary.plan)
+
+
+def audit_plans() -> List[Dict[str, Any]]:
+    """
+    EXPLAIN de cada query de producción. `ok=False` si el plan contiene un
+    NodeByLabelScan / AllNodesScan y la query no está marcada como allow_scan.
+    """
+    report = []
+    for pq in production_queries():
+        try:
+            ops = explain(pq.query, pq.params)
+        except Exception as e:
+            report.append({"name": pq.name, "ok": False, "error": f"{type(e).__name__}: {e}", "scans": []})
+            continue
+        scans = [f"{op} {args.get('Details', '')}".strip() for op, args in ops
+                 if op.split("@")[0] in SCAN_OPERATORS]
+        report.append({
+            "name": pq.name,
+            "ok": not scans or pq.allow_scan,
+            "allow_scan": pq.allow_scan,
+            "scans": scans,
+            "operators": [op.split("@")[0] for op, _ in ops],
+        })
+    return report
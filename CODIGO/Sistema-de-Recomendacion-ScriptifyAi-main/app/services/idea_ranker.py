@@ -0,0 +1,147 @@
+# app/services/idea_ranker.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.embeddings_neo4j import EMBED_MODEL, _check_dim, embed_many
+from services.shared_store import SharedCache
+
+# ------------------------------------------------------------
+# Re-ranking de ideas (sin otra llamada al LLM)
+# ------------------------------------------------------------
+# relevancia(idea) = w_trend * max cos(idea, trends) + w_examples * max cos(idea, ejemplos)
+# Las ideas casi duplicadas de otra mejor puntuada se penalizan. Todo sale de
+# un único embed batch de las ideas + un producto de matrices contra las
+# referencias (trends + ejemplos apilados), cuyos embeddings se cachean.
+
+IDEA_RERANK = os.getenv("IDEA_RERANK", "1") == "1"
+W_TREND = float(os.getenv("IDEA_RERANK_W_TREND", "0.6"))
+W_EXAMPLES = float(os.getenv("IDEA_RERANK_W_EXAMPLES", "0.4"))
+DUP_SIM = float(os.getenv("IDEA_RERANK_DUP_SIM", "0.9"))         # cos >= DUP_SIM -> casi duplicada
+DUP_PENALTY = float(os.getenv("IDEA_RERANK_DUP_PENALTY", "0.5"))  # fracción de relevancia que pierde
+MAX_REFS = int(os.getenv("IDEA_RERANK_MAX_REFS", "12"))           # trends / ejemplos considerados
+# Presupuesto de los embeds del re-ranking (va en línea en la request): si /api/embed
+# no responde a tiempo o falla, el borrador sale sin reordenar (sin reintentos por texto)
+TIMEOUT_S = float(os.getenv("IDEA_RERANK_TIMEOUT_S", "2.0"))
+
+# Embeddings de referencia (keywords de trends, títulos de ejemplos): compartidos entre workers
+_EMB_CACHE = SharedCache("emb", ttl=float(os.getenv("EMBED_CACHE_TTL", str(7 * 86400))), local_max=4096)
+
+# Matrices de referencia ya apiladas/normalizadas por conjunto de textos (por proceso)
+_REF_MAX = int(os.getenv("IDEA_RERANK_REF_MAX", "256"))
+_REF_MATRICES: "OrderedDict[Tuple[str, ...], np.ndarray]" = OrderedDict()
+_REF_LOCK = threading.Lock()
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def embed_texts(texts: Sequence[str], cache: bool = True, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+    """
+    Matriz (n, d) float32 con filas normalizadas (fila a 0 si el texto no tuvo vector).
+    Los que faltan en caché salen de UNA llamada batch. None si no hay ningún vector.
+    Con `timeout` la llamada batch va acotada y sin la caída a una llamada por texto.
+    """
+    keys = [f"{EMBED_MODEL}|{t}" for t in texts]
+    vecs: List[Optional[List[float]]] = [_EMB_CACHE.get(k) for k in keys] if cache else [None] * len(texts)
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        batch = [texts[i] for i in missing]
+        embs = embed_many(batch) if timeout is None else embed_many(batch, timeout=timeout, fallback=False)
+        for i, vec in zip(missing, embs):
+            if _check_dim(vec) is None:
+                vecs[i] = vec
+                if cache:
+                    _EMB_CACHE.set(keys[i], vec)
+    dim = next((len(v) for v in vecs if v), 0)
+    if not dim:
+        return None
+    m = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, v in enumerate(vecs):
+        if v and len(v) == dim:
+            m[i] = v
+    return _normalize_rows(m)
+
+
+def _reference_matrix(texts: Tuple[str, ...], timeout: Optional[float] = None) -> Optional[np.ndarray]:
+    m = _REF_MATRICES.get(texts)
+    if m is not None:
+        return m
+    m = embed_texts(texts, timeout=timeout)
+    if m is None:
+        return None
+    with _REF_LOCK:
+        _REF_MATRICES[texts] = m
+        while len(_REF_MATRICES) > _REF_MAX:
+            _REF_MATRICES.popitem(last=False)
+    return m
+
+
+def score_ideas(ideas_m: np.ndarray, ref_m: np.ndarray, n_trends: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (relevancia, penalizada) por idea. `ref_m` = trends (primeras n_trends filas) + ejemplos.
+    """
+    sims = ideas_m @ ref_m.T  # (ideas, refs): un único producto
+    n_ex = ref_m.shape[0] - n_trends
+    trend = sims[:, :n_trends].max(axis=1) if n_trends else np.zeros(len(ideas_m), dtype=np.float32)
+    ex = sims[:, n_trends:].max(axis=1) if n_ex else np.zeros(len(ideas_m), dtype=np.float32)
+    w_t = W_TREND if n_trends else 0.0
+    w_e = W_EXAMPLES if n_ex else 0.0
+    rel = (w_t * trend + w_e * ex) / ((w_t + w_e) or 1.0)
+    rel = np.clip(rel, 0.0, 1.0)
+
+    # Casi duplicados: recorriendo de mejor a peor, la que se parece a una ya vista pierde puntos
+    gram = ideas_m @ ideas_m.T
+    final = rel.copy()
+    kept: List[int] = []
+    for i in np.argsort(-rel, kind="stable"):
+        if kept and gram[i, kept].max() >= DUP_SIM:
+            final[i] = rel[i] * (1.0 - DUP_PENALTY)
+        else:
+            kept.append(int(i))
+    return rel, final
+
+
+def rerank_ideas(payload: Dict[str, Any], trends: List[Dict[str, Any]], examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reordena payload["ideas"] (y hashtags_for_ideas en paralelo) por relevancia y
+    añade payload["idea_scores"]. Si no hay embeddings disponibles no toca el orden.
+    """
+    ideas = [x for x in (payload.get("ideas") or []) if isinstance(x, str)]
+    if not IDEA_RERANK or len(ideas) < 2:
+        return payload
+
+    trend_kw = tuple(dict.fromkeys(
+        str(t.get("keyword")).strip().lower() for t in (trends or []) if t.get("keyword")
+    ))[:MAX_REFS]
+    ex_titles = tuple(dict.fromkeys(
+        str(e.get("title")).strip() for e in (examples or []) if e.get("title")
+    ))[:MAX_REFS]
+    if not trend_kw and not ex_titles:
+        return payload
+
+    deadline = time.monotonic() + TIMEOUT_S
+    ref_m = _reference_matrix(trend_kw + ex_titles, timeout=TIMEOUT_S)
+    left = deadline - time.monotonic()
+    if ref_m is None or left <= 0:
+        return payload
+    # Las ideas son nuevas en cada respuesta: no se guardan en la caché compartida
+    ideas_m = embed_texts(ideas, cache=False, timeout=left)
+    if ideas_m is None or ideas_m.shape[1] != ref_m.shape[1]:
+        return payload
+
+    _, final = score_ideas(ideas_m, ref_m, len(trend_kw))
+    order = np.argsort(-final, kind="stable")
+    payload["ideas"] = [ideas[i] for i in order]
+    hashtags = payload.get("hashtags_for_ideas")
+    if isinstance(hashtags, list) and len(hashtags) == len(ideas):
+        payload["hashtags_for_ideas"] = [hashtags[i] for i in order]
+    payload["idea_scores"] = [round(float(final[i]), 4) for i in order]
+    return payload
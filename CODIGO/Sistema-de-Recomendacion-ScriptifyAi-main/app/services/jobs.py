@@ -0,0 +1,414 @@
+# app/services/jobs.py
+import importlib.util
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# ----------------------------
+# Jobs en segundo plano (ETL, embeddings, warmups)
+# ----------------------------
+# - Tabla persistente en SQLite (JOBS_DB): cualquier worker de gunicorn puede
+#   consultar o cancelar un job aunque lo esté ejecutando otro proceso.
+# - Pool de hilos en proceso (JOB_WORKERS): la llamada HTTP solo encola y vuelve.
+# - Progreso (done/total), velocidad y ETA; cancelación cooperativa: la función del
+#   job consulta ctx.cancelled() / ctx.check() entre lotes.
+
+_APP_DIR = Path(__file__).resolve().parents[1]
+JOBS_DB = os.getenv("JOBS_DB") or str(_APP_DIR / "var" / "jobs.sqlite")
+SCRIPTS_DIR = Path(os.getenv("SCRIPTS_DIR") or (_APP_DIR.parent / "scripts"))
+_MAX_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+_PROGRESS_EVERY_S = 0.5
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+  id         TEXT PRIMARY KEY,
+  kind       TEXT NOT NULL,
+  params     TEXT NOT NULL,
+  status     TEXT NOT NULL,
+  done       INTEGER NOT NULL DEFAULT 0,
+  total      INTEGER,
+  message    TEXT,
+  result     TEXT,
+  error      TEXT,
+  cancel     INTEGER NOT NULL DEFAULT 0,
+  owner      TEXT,
+  created_at REAL NOT NULL,
+  started_at REAL,
+  updated_at REAL,
+  finished_at REAL
+)
+"""
+
+_tls = threading.local()
+
+
+def _conn() -> sqlite3.Connection:
+    pid = os.getpid()
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and getattr(_tls, "pid", None) == pid:
+        return conn
+    Path(JOBS_DB).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+    _tls.conn, _tls.pid = conn, pid
+    return conn
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _update(job_id: str, **fields: Any) -> None:
+    fields["updated_at"] = time.time()
+    cols = ", ".join(f"{k}=?" for k in fields)
+    _conn().execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+# ----------------------------
+# Contexto que recibe cada job
+# ----------------------------
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Progreso y cancelación cooperativa. Las escrituras a SQLite van limitadas en frecuencia."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last_write = 0.0
+        self._last_poll = 0.0
+        self._cancelled = False
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None,
+                 force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_write < _PROGRESS_EVERY_S:
+            return
+        self._last_write = now
+        fields: Dict[str, Any] = {"done": int(done)}
+        if total is not None:
+            fields["total"] = int(total)
+        if message is not None:
+            fields["message"] = message
+        _update(self.job_id, **fields)
+
+    def cancelled(self) -> bool:
+        if self._cancelled:
+            return True
+        now = time.time()
+        if now - self._last_poll >= _PROGRESS_EVERY_S:
+            self._last_poll = now
+            row = _conn().execute("SELECT cancel FROM jobs WHERE id=?", (self.job_id,)).fetchone()
+            self._cancelled = bool(row and row["cancel"])
+        return self._cancelled
+
+    def check(self) -> None:
+        if self.cancelled():
+            raise JobCancelled()
+
+# ----------------------------
+# Registro de tipos de job
+# ----------------------------
+
+JobFn = Callable[..., Any]
+_REGISTRY: Dict[str, JobFn] = {}
+
+
+def register(kind: str) -> Callable[[JobFn], JobFn]:
+    """@register("kind"): fn(ctx: JobContext, **params) -> resultado JSON."""
+    def deco(fn: JobFn) -> JobFn:
+        _REGISTRY[kind] = fn
+        return fn
+    return deco
+
+
+def kinds() -> List[str]:
+    return sorted(_REGISTRY)
+
+# ----------------------------
+# Ejecución
+# ----------------------------
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="job")
+    return _EXECUTOR
+
+
+def _run(job_id: str, kind: str, params: Dict[str, Any]) -> None:
+    ctx = JobContext(job_id)
+    if ctx.cancelled():
+        _update(job_id, status="cancelled", finished_at=time.time())
+        return
+    now = time.time()
+    _update(job_id, status="running", started_at=now, owner=_owner())
+    try:
+        result = _REGISTRY[kind](ctx, **params)
+    except JobCancelled:
+        _update(job_id, status="cancelled", finished_at=time.time())
+    except Exception as e:
+        _update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time())
+    else:
+        _update(job_id, status="cancelled" if ctx.cancelled() else "done",
+                result=json.dumps(result, default=str), finished_at=time.time())
+
+
+def submit(kind: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if kind not in _REGISTRY:
+        raise KeyError(f"tipo de job desconocido: {kind} (disponibles: {', '.join(kinds())})")
+    params = params or {}
+    job_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    _conn().execute(
+        "INSERT INTO jobs (id, kind, params, status, created_at, updated_at, owner) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+        (job_id, kind, json.dumps(params), now, now, _owner()),
+    )
+    _executor().submit(_run, job_id, kind, params)
+    return get(job_id)  # type: ignore[return-value]
+
+
+def submit_unique(kind: str, params: Optional[Dict[str, Any]] = None, within_s: float = 600.0) -> Optional[Dict[str, Any]]:
+    """
+    Como submit(), pero no encola si ya hay uno del mismo tipo en cola/corriendo o
+    terminado hace menos de `within_s` (p.ej. N workers de gunicorn arrancando a la vez).
+    """
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE kind=? AND (status IN ('queued', 'running') OR created_at >= ?) LIMIT 1",
+            (kind, time.time() - within_s),
+        ).fetchone()
+        if row is not None:
+            conn.execute("COMMIT")
+            return None
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (id, kind, params, status, created_at, updated_at, owner) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(params or {}), now, now, _owner()),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _executor().submit(_run, job_id, kind, params or {})
+    return get(job_id)
+
+
+def _view(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job["params"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel"] = bool(job["cancel"])
+    rate = eta = None
+    started = job.get("started_at")
+    if started and job["done"]:
+        end = job.get("finished_at") or time.time()
+        rate = job["done"] / max(end - started, 1e-6)
+        if job["status"] == "running" and job.get("total"):
+            eta = max(job["total"] - job["done"], 0) / rate
+    job["rate_per_s"] = rate
+    job["eta_s"] = eta
+    return job
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    row = _conn().execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+    return _view(row) if row else None
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    if status:
+        rows = _conn().execute("SELECT * FROM jobs WHERE status=? ORDER BY created_at DESC LIMIT ?",
+                               (status, int(limit))).fetchall()
+    else:
+        rows = _conn().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (int(limit),)).fetchall()
+    return [_view(r) for r in rows]
+
+
+def cancel(job_id: str) -> Optional[Dict[str, Any]]:
+    """Marca el job para cancelar; el hilo que lo ejecuta lo verá en su próximo check."""
+    _conn().execute("UPDATE jobs SET cancel=1, updated_at=? WHERE id=? AND status IN ('queued', 'running')",
+                    (time.time(), job_id))
+    return get(job_id)
+
+
+def recover() -> int:
+    """
+    Al arrancar: los jobs 'queued'/'running' de un proceso de esta máquina que ya no
+    existe quedan huérfanos; se marcan como fallidos.
+    """
+    host = socket.gethostname()
+    n = 0
+    for row in _conn().execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall():
+        owner_host, _, pid = (row["owner"] or "").rpartition(":")
+        if owner_host != host or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue
+        _update(row["id"], status="failed", error="interrumpido (proceso terminado)", finished_at=time.time())
+        n += 1
+    return n
+
+
+def shutdown() -> None:
+    """Parada del worker: pide cancelar lo que corre aquí y no espera a los hilos."""
+    global _EXECUTOR
+    _conn().execute("UPDATE jobs SET cancel=1 WHERE status IN ('queued', 'running') AND owner=?", (_owner(),))
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
+# ----------------------------
+# Jobs incluidos
+# ----------------------------
+
+def load_script(name: str):
+    """Carga scripts/<name>.py como módulo (el ETL no es un paquete importable)."""
+    path = SCRIPTS_DIR / f"{name}.py"
+    if not path.exists():
+        raise FileNotFoundError(f"no existe {path} (configura SCRIPTS_DIR)")
+    spec = importlib.util.spec_from_file_location(f"scripts_{name}", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    return mod
+
+
+@register("seed_embeddings")
+def _job_seed_embeddings(ctx: JobContext, batch_size: int = 2000) -> Dict[str, Any]:
+    from services.embeddings_neo4j import seed_embeddings
+
+    return seed_embeddings(batch_size=int(batch_size),
+                           progress=lambda done, total: ctx.progress(done, total),
+                           should_cancel=ctx.cancelled)
+
+
+@register("etl")
+def _job_etl(ctx: JobContext, trends: str, youtube: str, lexicon: str) -> Dict[str, Any]:
+    from services.neo4j_client import get_driver
+
+    etl = load_script("neo4j_etl")
+    from services.snapshot import SNAPSHOT_PATH, export_snapshot
+
+    stages = [("schema", None), ("trends", trends), ("youtube", youtube), ("lexicon", lexicon),
+              ("rank_trends", trends)]
+    if SNAPSHOT_PATH:
+        # Las réplicas que leen del snapshot ven los datos nuevos tras el swap atómico
+        stages.append(("snapshot", None))
+    with get_driver().session() as s:
+        for i, (stage, path) in enumerate(stages):
+            ctx.check()
+            ctx.progress(i, len(stages), message=stage, force=True)
+            if stage == "schema":
+                from services.graph_schema import ensure_schema
+
+                for q in etl.SCHEMA:
+                    etl.run(s, q)
+                ensure_schema()
+            elif stage == "rank_trends":
+                load_script("rank_trends").materialize(s, path)
+            elif stage == "snapshot":
+                export_snapshot(s)
+            else:
+                getattr(etl, f"load_{stage}")(s, path)
+    ctx.progress(len(stages), len(stages), message="ok", force=True)
+    # Datos nuevos: fuera el contexto cacheado y, si procede, se vuelve a calentar
+    from services.graph_examples import clear_context_cache
+
+    clear_context_cache()
+    warm = submit("warmup") if os.getenv("WARMUP_AFTER_ETL", "1") == "1" else None
+    return {"ok": True, "stages": [st for st, _ in stages], "warmup_job": warm and warm["id"]}
+
+
+@register("feedback_flush")
+def _job_feedback_flush(ctx: JobContext) -> Dict[str, Any]:
+    """Vuelca al grafo todo el feedback pendiente (además del volcado periódico)."""
+    from services.feedback import flush_to_graph
+
+    likes = tokens = 0
+    while True:
+        ctx.check()
+        res = flush_to_graph()
+        if res.get("skipped"):
+            return {**res, "likes": likes, "tokens": tokens}
+        likes += res.get("likes", 0)
+        tokens += res.get("tokens", 0)
+        ctx.progress(likes, message="feedback")
+        if not res.get("likes"):
+            return {"ok": True, "likes": likes, "tokens": tokens}
+
+
+@register("snapshot")
+def _job_snapshot(ctx: JobContext, path: Optional[str] = None) -> Dict[str, Any]:
+    from services.snapshot import export_snapshot
+
+    return export_snapshot(path=path, progress=lambda done, total, step: ctx.progress(done, total, step, force=True))
+
+
+@register("schema")
+def _job_schema(ctx: JobContext) -> Dict[str, Any]:
+    from services.graph_schema import ensure_schema
+
+    return ensure_schema()
+
+
+@register("embed_graph")
+def _job_embed_graph(ctx: JobContext) -> Dict[str, Any]:
+    from services.neo4j_client import get_driver
+
+    eg = load_script("embed_graph")
+    stages = [("indexes", None), ("Video", (eg.Q_SELECT_V, eg.Q_UPDATE_V)),
+              ("TrendKeyword", (eg.Q_SELECT_T, eg.Q_UPDATE_T)), ("Lexeme", (eg.Q_SELECT_L, eg.Q_UPDATE_L)),
+              ("neighbors", None)]
+    counts: Dict[str, Any] = {}
+    with get_driver().session() as s:
+        for i, (stage, qs) in enumerate(stages):
+            ctx.check()
+            ctx.progress(i, len(stages), message=stage, force=True)
+            if stage == "indexes":
+                eg.create_indexes(s)
+            elif stage == "neighbors":
+                counts[stage] = eg.build_neighbors(s)
+            else:
+                counts[stage] = eg.process_label(s, qs[0], qs[1], stage)
+    ctx.progress(len(stages), len(stages), message="ok", force=True)
+    # Vecinos nuevos: la expansión de especialidades deja de usar la tabla cacheada
+    from services.term_expansion import clear_cache
+
+    clear_cache()
+    return {"ok": True, **counts}
+
+
+@register("warmup")
+def _job_warmup(ctx: JobContext, limit: Optional[int] = None, k: int = 10, responses: bool = False,
+                platforms: Optional[List[str]] = None) -> Dict[str, Any]:
+    from services.warmup import run_warmup
+
+    return run_warmup(limit=limit, k=int(k), responses=bool(responses), platforms=platforms or ["youtube"],
+                      progress=lambda done, total: ctx.progress(done, total), should_cancel=ctx.cancelled)
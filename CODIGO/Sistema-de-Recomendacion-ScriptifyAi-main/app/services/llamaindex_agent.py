@@ -1,9 +1,9 @@
 import os
+import threading
 from typing import Optional, List, Dict, Any
 
-from llama_index.core import Settings
-from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
+_INIT_LOCK = threading.Lock()
+_initialized = False
 
 # ----------------------------------------------------------------------
 # Inicialización explícita de LlamaIndex con Ollama (sin resolver defaults)
@@ -14,18 +14,26 @@ def _init_llamaindex_once() -> None:
     Fija Settings.llm y Settings.embed_model con Ollama, evitando acceder
     a Settings.llm antes de tiempo (lo que forzaría resolver el backend 'default').
     """
+    global _initialized
+    if _initialized:
+        return
+    # Import diferido: construir clientes en import ralentiza arranque y tests
+    from llama_index.core import Settings
+    from llama_index.llms.ollama import Ollama
+    from llama_index.embeddings.ollama import OllamaEmbedding
+
     # Lee envs (con defaults razonables)
     base_url = os.getenv("OLLAMA_HOST", "http://ollama:11434").rstrip("/")
     model = os.getenv("MODEL", "qwen2.5:7b-instruct")
     embed_model = os.getenv("EMBED_MODEL", "nomic-embed-text")
 
     # Asigna SIEMPRE sin consultar Settings.llm (evita resolver OpenAI)
-    Settings.llm = Ollama(model=model, base_url=base_url, request_timeout=500.0)
-    Settings.embed_model = OllamaEmbedding(model_name=embed_model, base_url=base_url)
-
-
-# Ejecuta la init en import
-_init_llamaindex_once()
+    with _INIT_LOCK:
+        if _initialized:
+            return
+        Settings.llm = Ollama(model=model, base_url=base_url, request_timeout=500.0)
+        Settings.embed_model = OllamaEmbedding(model_name=embed_model, base_url=base_url)
+        _initialized = True
 
 # ----------------------------------------------------------------------
 # Utilidades opcionales (wrapper simple por si quieres probar el LLM)
@@ -34,9 +42,12 @@ _init_llamaindex_once()
 def generate_with_llamaindex(prompt: str, system: Optional[str] = None, **kwargs) -> str:
     """
     Wrapper sencillo para invocar el LLM de Settings.llm.
-    No usa OpenAI; va directo contra Ollama (ya fijado arriba).
+    No usa OpenAI; va directo contra Ollama (fijado en _init_llamaindex_once).
     """
-    llm: Ollama = Settings.llm  # type: ignore
+    _init_llamaindex_once()
+    from llama_index.core import Settings
+
+    llm = Settings.llm
     if system:
         # Los backends de Ollama vía LlamaIndex no tienen "system" explícito;
         # lo concatenamos de forma simple.
@@ -50,6 +61,9 @@ def generate_with_llamaindex(prompt: str, system: Optional[str] = None, **kwargs
 
 def get_embed(texts: List[str]) -> List[List[float]]:
     """Embeddings desde OllamaEmbedding configurado en Settings.embed_model."""
-    em = Settings.embed_model  # type: ignore
+    _init_llamaindex_once()
+    from llama_index.core import Settings
+
+    em = Settings.embed_model
     vecs = em.get_text_embedding_batch(texts)
     return vecs
@@ -1,20 +1,34 @@
 # app/services/llm_ollama.py
+import os
 import re
 import json
-from typing import Any, Dict, List, Tuple, Union
+import time
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Tuple, Union
 
+from services import llm_pool
 from services.llamaindex_client import get_llm
 from services.graph_examples import build_llm_context
-
-# Tipos de chat tolerantes a versiones
-try:
-    from llama_index.core.llms.types import ChatMessage, MessageRole  # type: ignore
-except Exception:
+from services.idea_ranker import rerank_ideas
+from services.near_dup import keep_indices
+from services.text_norm import (
+    hashtag as _normalize_hashtag,
+    hashtag_candidate as _to_hashtag_candidate,
+    vocab_tokens as _tokenize_for_vocab,
+)
+from services.vocab_matcher import VocabMatcher, compile_vocab
+
+@lru_cache(maxsize=1)
+def _chat_types() -> Tuple[Any, Any]:
+    """Tipos de chat tolerantes a versiones (import diferido: llama-index es pesado)."""
     try:
-        from llama_index.core.llms import ChatMessage, MessageRole  # type: ignore
+        from llama_index.core.llms.types import ChatMessage, MessageRole  # type: ignore
     except Exception:
-        ChatMessage = None  # type: ignore
-        MessageRole = None  # type: ignore
+        try:
+            from llama_index.core.llms import ChatMessage, MessageRole  # type: ignore
+        except Exception:
+            return None, None
+    return ChatMessage, MessageRole
 
 # ----------------------------
 # Utilidades de saneo
@@ -38,57 +52,41 @@ def _bad_generic(s: str) -> bool:
     t = (s or "").lower()
     return any(bad in t for bad in GENERIC_BAD_WORDS)
 
-def _normalize_hashtag(tag: str) -> str:
-    t = (tag or "").strip().lower()
-    if not t.startswith("#"):
-        t = "#" + t
-    t = (t
-         .replace("á", "a").replace("é", "e").replace("í", "i")
-         .replace("ó", "o").replace("ú", "u").replace("ñ", "n"))
-    t = re.sub(r"[^#a-z0-9_]", "", t)
-    return t
-
-def _tokenize_for_vocab(text: str) -> List[str]:
-    t = (text or "").lower()
-    t = (t
-         .replace("á","a").replace("é","e").replace("í","i")
-         .replace("ó","o").replace("ú","u").replace("ñ","n"))
-    t = re.sub(r"[^a-z0-9\s\-_/]", " ", t)
-    toks = re.split(r"[\s\-_\/]+", t)
-    return [w for w in toks if len(w) >= 3]
+_VOCAB_JUNK = frozenset({"checklist","tips","tutorial","resultado","caso","referencia"})
+
+@lru_cache(maxsize=512)
+def _base_vocab_matcher(base: FrozenSet[str]) -> VocabMatcher:
+    # El vocab del índice por nicho es estable: se compila una vez y se reutiliza
+    return compile_vocab(frozenset(base - _VOCAB_JUNK))
 
 def _build_allowed_hashtag_vocab(
     niche: str,
     specialties: List[str],
     llm_ctx: Dict[str, Any],
     ideas: List[str],
-) -> set:
+) -> VocabMatcher:
+    base = llm_ctx.get("hashtag_vocab")
     vocab = set()
-    for w in (llm_ctx.get("glossary") or []):
-        vocab.update(_tokenize_for_vocab(w))
+    if base is None:
+        for w in (llm_ctx.get("glossary") or []):
+            vocab.update(_tokenize_for_vocab(w))
+        vocab.update(_tokenize_for_vocab(niche))
     for w in (llm_ctx.get("expanded_specialties") or []):
         vocab.update(_tokenize_for_vocab(w))
-    vocab.update(_tokenize_for_vocab(niche))
     for sp in specialties or []:
         vocab.update(_tokenize_for_vocab(sp))
     for title in ideas or []:
         vocab.update(_tokenize_for_vocab(title))
-    junk = {"checklist","tips","tutorial","resultado","caso","referencia"}
-    vocab = {w for w in vocab if w not in junk}
-    return vocab
-
-def _to_hashtag_candidate(token: str) -> str:
-    t = token.lower()
-    t = (t
-         .replace("á","a").replace("é","e").replace("í","i")
-         .replace("ó","o").replace("ú","u").replace("ñ","n"))
-    t = re.sub(r"[^a-z0-9_]", "", t)
-    return f"#{t}" if t else ""
+    vocab -= _VOCAB_JUNK
+    if base is None:
+        return VocabMatcher(vocab)
+    # Vocab del glosario + nicho ya precomputado: solo compilamos lo específico del request
+    return VocabMatcher(vocab, parent=_base_vocab_matcher(frozenset(base)))
 
 def _sanitize_hashtags_block(
     hblock: List[List[str]],
     niche: str,
-    allowed_vocab: set | None = None
+    allowed_vocab: VocabMatcher | set | None = None
 ) -> List[List[str]]:
     """Normaliza, filtra por vocabulario permitido, dedup global y elimina genéricos.
        Máx 1 hashtag del nicho en todo el bloque."""
@@ -96,12 +94,14 @@ def _sanitize_hashtags_block(
     out: List[List[str]] = []
     niche_tag = _normalize_hashtag(f"#{(niche or '').replace(' ','')}") if niche else None
     niche_used = False
+    if allowed_vocab is not None and not isinstance(allowed_vocab, VocabMatcher):
+        allowed_vocab = compile_vocab(frozenset(allowed_vocab))
 
     def _allowed(tag: str) -> bool:
         if allowed_vocab is None:
             return True
-        root = tag.lstrip("#")
-        return (root in allowed_vocab) or any(root.startswith(v) or v in root for v in allowed_vocab if len(v) >= 4)
+        # exacto o alguna palabra (len>=4) contenida en el hashtag; O(len(tag))
+        return allowed_vocab.allows(tag.lstrip("#"))
 
     for row in (hblock or []):
         row2 = []
@@ -121,7 +121,7 @@ def _sanitize_hashtags_block(
         out.append(row2[:3])
     return out
 
-def _enforce_hashtags(ideas: List[str], niche: str, specialties: List[str], allowed_vocab: set | None = None) -> List[List[str]]:
+def _enforce_hashtags(ideas: List[str], niche: str, specialties: List[str], allowed_vocab: VocabMatcher | set | None = None) -> List[List[str]]:
     uniq = set()
     results: List[List[str]] = []
     base_niche_tag = f"#{(niche or '').lower().replace(' ', '')}" if niche else None
@@ -157,48 +157,75 @@ def _enforce_hashtags(ideas: List[str], niche: str, specialties: List[str], allo
         results.append(tags[:3] if tags else [])
     return results
 
-def _validate_and_fix(payload: Dict[str, Any], niche: str, specialties: List[str], llm_ctx: Dict[str, Any] | None = None) -> Tuple[Dict[str, Any], bool]:
-    ok = True
+# Campos que el validador puede dar por fallidos (y que la reparación regenera por separado)
+REPAIRABLE_FIELDS = ("recommendation", "reason", "ideas")
+
+
+def _norm_reason(raw: Any) -> str:
+    # "reason" conserva sus líneas: los 4 bullets se cuentan por línea
+    return _spanish_only("\n".join(ln for ln in (_norm(x) for x in str(raw or "").splitlines()) if ln))
+
+
+def _recommendation_ok(v: str, specialties: List[str]) -> bool:
+    if not v or _bad_generic(v):
+        return False
+    low = v.lower()
+    return not specialties or any(sp.lower() in low for sp in specialties)
+
 
-    for k in ("recommendation", "reason"):
-        v = _spanish_only(_norm(payload.get(k, "")))
-        if not v or _bad_generic(v):
-            ok = False
-        payload[k] = v
+def _reason_ok(v: str) -> bool:
+    if not v or _bad_generic(v):
+        return False
+    return sum(1 for ln in v.splitlines() if ln.strip().startswith("- ")) == 4
+
+
+def _ideas_ok(ideas: List[str]) -> bool:
+    return len(ideas) >= 10 and not any(_bad_generic(x) for x in ideas)
+
+
+def _validate_fields(
+    payload: Dict[str, Any],
+    niche: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any] | None = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Sanea el borrador y devuelve (payload, campos fallidos de REPAIRABLE_FIELDS)."""
+    failed: List[str] = []
+
+    payload["recommendation"] = _spanish_only(_norm(payload.get("recommendation", "")))
+    payload["reason"] = _norm_reason(payload.get("reason", ""))
 
     ideas = payload.get("ideas") or []
     ideas = [_spanish_only(_norm(x)) for x in ideas if _norm(x)]
-    if len(ideas) < 10:
-        ok = False
-    if any(_bad_generic(x) for x in ideas):
-        ok = False
 
     allowed_vocab = _build_allowed_hashtag_vocab(niche, specialties, llm_ctx or {}, ideas)
 
     hashtags = payload.get("hashtags_for_ideas") or []
     if len(hashtags) != len(ideas) or not all(isinstance(h, list) for h in hashtags):
         hashtags = _enforce_hashtags(ideas, niche, specialties, allowed_vocab=allowed_vocab)
+
+    # Casi duplicados (parafraseos incluidos), no solo coincidencia exacta en minúsculas;
+    # los hashtags se filtran con los mismos índices para seguir alineados con las ideas
+    keep = keep_indices(ideas)
+    payload["ideas"] = [ideas[i] for i in keep]
+    hashtags = [hashtags[i] for i in keep]
     payload["hashtags_for_ideas"] = _sanitize_hashtags_block(hashtags, niche, allowed_vocab=allowed_vocab)
 
-    seen = set()
-    deduped = []
-    for it in ideas:
-        if it.lower() not in seen:
-            deduped.append(it)
-            seen.add(it.lower())
-    payload["ideas"] = deduped
+    if not _recommendation_ok(payload["recommendation"], specialties):
+        failed.append("recommendation")
+    if not _reason_ok(payload["reason"]):
+        failed.append("reason")
+    # el mínimo de 10 cuenta las ideas que quedan tras quitar casi duplicados: una
+    # lista corta va a la reparación (que pide las que faltan)
+    if not _ideas_ok(payload["ideas"]):
+        failed.append("ideas")
 
-    if specialties:
-        rec_low = (payload.get("recommendation") or "").lower()
-        if not any(sp.lower() in rec_low for sp in specialties):
-            ok = False
+    return payload, failed
 
-    reason = payload.get("reason") or ""
-    bullet_lines = [ln for ln in reason.splitlines() if ln.strip().startswith("- ")]
-    if len(bullet_lines) != 4:
-        ok = False
 
-    return payload, ok
+def _validate_and_fix(payload: Dict[str, Any], niche: str, specialties: List[str], llm_ctx: Dict[str, Any] | None = None) -> Tuple[Dict[str, Any], bool]:
+    payload, failed = _validate_fields(payload, niche, specialties, llm_ctx=llm_ctx)
+    return payload, not failed
 
 # ----------------------------
 # Prompts (genéricos por nicho)
@@ -236,16 +263,11 @@ Contexto del negocio:
 - Expansion de specialties: {expanded_specialties}
 - Estilo por plataforma (guía): {style_guide}
 - Analogías prohibidas: {banned_analogies}
-- Métricas crudas: {metrics}
+- Métricas: {metrics}
 - Ejemplos recientes (títulos): {examples}
 
-Guías por foco (aplícalas SOLO al foco actual):
-- attract (atraer): hooks claros, curiosidad, antes/después, comparativas, promesas de resultado visual.
-  * Patrones sugeridos: "Antes y después: ...", "Errores que arruinan ...", "En 3 pasos: ..."
-- retain (retener): series, paso a paso, comparativas más profundas, “qué haría un pro”, desmontar mitos.
-  * Patrones sugeridos: "Paso a paso: ...", "Comparativa real: A vs B", "Mitos vs realidad: ..."
-- convert (vender / siguiente paso): casos prácticos con coste/beneficio, mini-oferta, checklist de compra/preventa, objeciones.
-  * Patrones sugeridos: "Checklist antes de ...", "Caso real: ... y cuánto costó", "Qué elegir: ..."
+Guía del foco actual:
+{focus_guide}
 
 Tu tarea:
 1) "recommendation": una frase que contenga al menos UNA palabra de las especialidades (si hay).
@@ -260,6 +282,35 @@ SALIDA:
 {{"recommendation": "...", "reason": "...", "ideas": ["..."], "hashtags_for_ideas": [["#...","#..."]]}}
 """
 
+# Solo se envía la guía del foco que aplica (antes iban las tres en cada prompt).
+# Claves = valores de recommender.decide_focus (lo que main.py pasa como focus_hint).
+_FOCUS_GUIDES = {
+    "discovery": (
+        "- attract (atraer): hooks claros, curiosidad, antes/después, comparativas, promesas de resultado visual.\n"
+        '  * Patrones sugeridos: "Antes y después: ...", "Errores que arruinan ...", "En 3 pasos: ..."'
+    ),
+    "retention": (
+        "- retain (retener): series, paso a paso, comparativas más profundas, “qué haría un pro”, desmontar mitos.\n"
+        '  * Patrones sugeridos: "Paso a paso: ...", "Comparativa real: A vs B", "Mitos vs realidad: ..."'
+    ),
+    "conversion": (
+        "- convert (vender / siguiente paso): casos prácticos con coste/beneficio, mini-oferta, checklist de compra/preventa, objeciones.\n"
+        '  * Patrones sugeridos: "Checklist antes de ...", "Caso real: ... y cuánto costó", "Qué elegir: ..."'
+    ),
+}
+# Nombres cortos del prompt (attract/retain/convert) -> foco de decide_focus
+_FOCUS_ALIASES = {"attract": "discovery", "retain": "retention", "convert": "conversion"}
+DEFAULT_FOCUS = "discovery"
+
+
+def _focus_key(focus_hint: Union[str, None]) -> str:
+    """focus_hint -> clave de _FOCUS_GUIDES; un foco desconocido es un error, no 'attract'."""
+    focus = _FOCUS_ALIASES.get(focus_hint or DEFAULT_FOCUS, focus_hint or DEFAULT_FOCUS)
+    if focus not in _FOCUS_GUIDES:
+        raise ValueError(f"focus_hint desconocido: {focus_hint!r} (esperado uno de {sorted(_FOCUS_GUIDES)})")
+    return focus
+
+
 _CRITIC = """
 Repara el JSON si hay fallas:
 - "recommendation" debe incluir al menos UNA palabra de las especialidades (si existen).
@@ -269,11 +320,48 @@ Repara el JSON si hay fallas:
 Responde SOLO el JSON corregido.
 """
 
+# Reparación por campo: el validador dice qué campo falló y solo ese se regenera, con
+# un prompt corto propio (sin _AGENT_SYS ni el borrador entero). Las líneas "- Clave:"
+# siguen el formato del prompt principal.
+_FIELD_SYS = "Eres un editor de contenido. Escribe en ESPAÑOL NEUTRO. Devuelves SOLO JSON válido (sin markdown)."
+
+_FIELD_TMPL = {
+    "recommendation": """Reescribe la recomendación: 1 frase concreta (qué debe ser el siguiente video), sin minutajes ni números de métricas, que incluya al menos UNA palabra de las especialidades.
+- Nicho: {niche}
+- Plataforma: {platform}
+- Especialidades: {specialties}
+- Foco: {focus}
+- Actual: {current}
+Devuelve SOLO JSON con la clave "recommendation": {{"recommendation": "..."}}""",
+    "reason": """Reescribe el razonamiento: 1 párrafo (señales en humano, propósito, analogía breve y original; prohibidas: {banned}) y después **exactamente 4 bullets**, cada uno en su línea y empezando por "- ", imperativos y concretos. Sin porcentajes ni números de métricas.
+- Nicho: {niche}
+- Plataforma: {platform}
+- Especialidades: {specialties}
+- Foco: {focus}
+- Actual: {current}
+Devuelve SOLO JSON con la clave "reason": {{"reason": "párrafo\\n- ...\\n- ...\\n- ...\\n- ..."}}""",
+    "ideas": """Escribe {missing} títulos de video NUEVOS (30–70 caracteres), variados, coherentes con el foco y distintos de los existentes.
+- Nicho: {niche}
+- Plataforma: {platform}
+- Especialidades: {specialties}
+- Foco: {focus}
+- Glosario del nicho: {glossary}
+- Existentes: {current}
+Devuelve SOLO JSON con la clave "ideas": {{"ideas": ["...", "..."]}}""",
+}
+
+_HASHTAGS_TMPL = """Propón 2–3 hashtags para cada título: sin tildes, sin genéricos (#tips, #tutorial, #resultado), sin repetir entre títulos; usa palabras del título, del nicho o de las especialidades.
+- Nicho: {niche}
+- Especialidades: {specialties}
+- Títulos: {titles}
+Devuelve SOLO JSON con la clave "hashtags_for_ideas", una lista por título y en el mismo orden: {{"hashtags_for_ideas": [["#...", "#..."]]}}"""
+
 # ----------------------------
 # Chat helpers
 # ----------------------------
 
 def _coerce_messages(msgs: List[Any]) -> List[Any]:
+    ChatMessage, MessageRole = _chat_types()
     if ChatMessage is None or MessageRole is None:
         out: List[Dict[str, str]] = []
         for m in msgs:
@@ -302,6 +390,72 @@ def _coerce_messages(msgs: List[Any]) -> List[Any]:
     return out2  # type: ignore
 
 
+# ----------------------------
+# Prompt con presupuesto de tokens
+# ----------------------------
+# La evaluación del prompt en un 7B en CPU escala con su longitud. El texto fijo
+# (sistema + plantilla + guía del foco + métricas no nulas) va siempre; glosario,
+# expansión y títulos de ejemplo se ordenan por relevancia y entran por turnos
+# mientras quepan en PROMPT_TOKEN_BUDGET. Sin tokenizer del modelo a mano, se
+# estima: trozos de <= 4 letras/dígitos + cada signo (~BPE en español).
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1400"))
+LLM_REPAIR = os.getenv("LLM_REPAIR", "fields").lower()   # fields | full (ronda de crítica completa)
+_MAX_GLOSSARY, _MAX_EXPANDED, _MAX_EXAMPLES = 20, 12, 10
+_MIN_GLOSSARY, _MIN_EXAMPLES = 3, 2   # entran aunque el presupuesto no llegue
+# Ya van en su propia línea del prompt (o no aportan al modelo)
+_PROMPT_SKIP_INPUTS = frozenset({"platform", "niche", "specialties", "focus_hint", "use_graph", "top_k", "region"})
+_TOKEN_PIECE = re.compile(r"[^\W_]{1,4}|[^\w\s]|_")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN_PIECE.findall(text or ""))
+
+
+_AGENT_SYS_TOKENS = estimate_tokens(_AGENT_SYS)
+
+
+def _compact_metrics(metrics: Dict[str, Any]) -> str:
+    """Solo valores presentes; `inputs` se aplana (sin duplicar lo que ya va en el prompt)."""
+    flat: Dict[str, Any] = {}
+    for k, v in (metrics or {}).items():
+        if k == "inputs" and isinstance(v, dict):
+            flat.update((ik, iv) for ik, iv in v.items() if ik not in _PROMPT_SKIP_INPUTS)
+        else:
+            flat[k] = v
+    parts = [f"{k}={v}" for k, v in flat.items() if v is not None and v != "" and v != [] and v != {}]
+    return ", ".join(parts) or "—"
+
+
+def _rank_by_overlap(items: List[str], focus_tokens: FrozenSet[str]) -> List[str]:
+    """Primero los que comparten tokens con especialidades/expansión; empate -> orden original."""
+    if not focus_tokens:
+        return items
+    scored = [(-len(focus_tokens.intersection(_tokenize_for_vocab(it))), i, it) for i, it in enumerate(items)]
+    return [it for _, _, it in sorted(scored)]
+
+
+def _fit_lists(lists: List[List[str]], budget: int, floors: List[int]) -> Tuple[List[List[str]], int]:
+    """Mínimos fijos y luego round-robin: un elemento de cada lista por vuelta mientras quepa (", " ~ 1 token)."""
+    kept: List[List[str]] = [list(items[:n]) for items, n in zip(lists, floors)]
+    used = sum(estimate_tokens(it) + 1 for k in kept for it in k)
+    pos = [len(k) for k in kept]
+    progress = True
+    while progress:
+        progress = False
+        for li, items in enumerate(lists):
+            while pos[li] < len(items):
+                it = items[pos[li]]
+                pos[li] += 1
+                cost = estimate_tokens(it) + 1
+                if used + cost <= budget:
+                    kept[li].append(it)
+                    used += cost
+                    progress = True
+                    break
+    return kept, used
+
+
 def _build_prompt(
     niche: str,
     metrics: Dict[str, Any],
@@ -309,33 +463,51 @@ def _build_prompt(
     specialties: List[str],
     platform: Union[str, None],
     llm_ctx: Dict[str, Any],
+    budget: int | None = None,
+    stats: Dict[str, Any] | None = None,
 ) -> List[Any]:
-    ex_titles = [e.get("title") for e in (examples or []) if e.get("title")]
-    user = _USER_TMPL.format(
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    inputs = (metrics.get("inputs", {}) or {})
+    focus_hint = _focus_key(inputs.get("focus_hint"))
+    fields = dict(
         platform=platform or "multi-plataforma",
         niche=niche,
         specialties=", ".join(specialties) if specialties else "—",
-        glossary=", ".join(llm_ctx.get("glossary") or []),
-        expanded_specialties=", ".join(llm_ctx.get("expanded_specialties") or []),
         style_guide="; ".join(llm_ctx.get("style_for_platform") or []),
         banned_analogies=", ".join(llm_ctx.get("banned_analogies") or []),
-        metrics=json.dumps(metrics, ensure_ascii=False),
-        examples=json.dumps(ex_titles[:10], ensure_ascii=False),
-        focus_hint=(metrics.get("inputs", {}) or {}).get("focus_hint", "attract"),
+        metrics=_compact_metrics(metrics),
+        focus_hint=focus_hint,
+        focus_guide=_FOCUS_GUIDES[focus_hint],
     )
+
+    expanded = list(llm_ctx.get("expanded_specialties") or [])
+    focus_tokens = frozenset(t for w in list(specialties or []) + expanded for t in _tokenize_for_vocab(w))
+    glossary = _rank_by_overlap(list(llm_ctx.get("glossary") or [])[:_MAX_GLOSSARY], focus_tokens)
+    titles = [t for t in (e.get("title") for e in (examples or [])) if t]
+    titles = _rank_by_overlap(titles, focus_tokens)[:_MAX_EXAMPLES]
+
+    fixed = _AGENT_SYS_TOKENS + estimate_tokens(
+        _USER_TMPL.format(glossary="", expanded_specialties="", examples="", **fields))
+    (glossary, expanded, titles), used = _fit_lists(
+        [glossary, expanded[:_MAX_EXPANDED], titles], budget - fixed, [_MIN_GLOSSARY, 0, _MIN_EXAMPLES])
+
+    user = _USER_TMPL.format(
+        glossary=", ".join(glossary),
+        expanded_specialties=", ".join(expanded),
+        examples=" | ".join(titles) or "—",
+        **fields,
+    )
+    if stats is not None:
+        stats.update(prompt_tokens_est=fixed + used, prompt_budget=budget, glossary=len(glossary),
+                     expanded=len(expanded), examples=len(titles))
     return [
         {"role": "system", "content": _AGENT_SYS},
         {"role": "user", "content": user},
     ]
 
 
-def _chat_once(messages: List[Any], temperature: float) -> Dict[str, Any]:
-    """
-    Envía mensajes al LLM. Forzamos complete() (endpoint /api/generate) para evitar
-    timeouts del endpoint /api/chat que viste en los logs. Si falla, reintentamos.
-    """
-    llm = get_llm()
-
+def _flatten_messages(messages: List[Any]) -> str:
+    """Mensajes -> prompt único para /api/generate (secciones Sistema / Usuario)."""
     sys_txt, usr_txt = "", ""
     for m in messages:
         if isinstance(m, dict):
@@ -351,15 +523,10 @@ def _chat_once(messages: List[Any], temperature: float) -> Dict[str, Any]:
         else:
             usr_txt += (content or "").strip() + "\n\n"
 
-    prompt = (("### Sistema\n" + sys_txt) if sys_txt else "") + ("### Usuario\n" + usr_txt)
+    return (("### Sistema\n" + sys_txt) if sys_txt else "") + ("### Usuario\n" + usr_txt)
 
-    try:
-        resp = llm.complete(prompt, temperature=temperature)
-        txt = getattr(resp, "text", str(resp))
-    except Exception:
-        resp = llm.complete(prompt, temperature=max(0.2, temperature - 0.2))
-        txt = getattr(resp, "text", str(resp))
 
+def _parse_json(txt: str) -> Dict[str, Any]:
     m = re.search(r"\{[\s\S]*\}\s*$", txt)
     raw = txt if m is None else m.group(0)
     try:
@@ -369,18 +536,324 @@ def _chat_once(messages: List[Any], temperature: float) -> Dict[str, Any]:
         return json.loads(raw)
 
 
-def _critique_and_repair(draft: Dict[str, Any], niche: str, platform: str, specialties: List[str]) -> Dict[str, Any]:
+def _chat_once(messages: List[Any], temperature: float, stats: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    Envía mensajes al LLM. Forzamos complete() (endpoint /api/generate) para evitar
+    timeouts del endpoint /api/chat que viste en los logs. Si falla, reintentamos.
+    Con `stats`, anota los tokens que reporta Ollama (prompt_eval_count / eval_count).
+    """
+    llm = get_llm()
+    prompt = _flatten_messages(messages)
+    backend, model = str(getattr(llm, "base_url", "")), str(getattr(llm, "model", ""))
+
+    t0 = time.perf_counter()
+    try:
+        resp = llm.complete(prompt, temperature=temperature)
+        txt = getattr(resp, "text", str(resp))
+    except Exception:
+        llm_pool.record(backend, model, "errors", time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        try:
+            resp = llm.complete(prompt, temperature=max(0.2, temperature - 0.2))
+        except Exception:
+            llm_pool.record(backend, model, "errors", time.perf_counter() - t0)
+            raise
+        txt = getattr(resp, "text", str(resp))
+    raw_resp = getattr(resp, "raw", None)
+    raw_resp = raw_resp if isinstance(raw_resp, dict) else {}
+    llm_pool.record(backend, model, "ok", time.perf_counter() - t0, raw_resp.get("eval_count"))
+    if stats is not None:
+        for k in ("prompt_eval_count", "eval_count"):
+            if raw_resp.get(k) is not None:
+                stats[k] = raw_resp[k]
+
+    return _parse_json(txt)
+
+
+def _draft_accept(niche: str, specialties: List[str], llm_ctx: Dict[str, Any]):
+    def accept(gen: "llm_pool.Generation") -> Tuple[Tuple[Dict[str, Any], List[str]], bool]:
+        try:
+            draft, failed = _validate_fields(_parse_json(gen.text), niche, specialties, llm_ctx=llm_ctx)
+        except Exception:
+            return ({}, list(REPAIRABLE_FIELDS)), False
+        return (draft, failed), not failed
+    return accept
+
+
+def _fallback_draft(
+    messages: List[Any],
+    temperature: float,
+    niche: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any],
+    stats: Dict[str, Any],
+    error: Exception,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """El modelo grande no respondió: borrador por la ruta "fallback" de la cascada (pequeño primero)."""
+    if not llm_pool.cascade_enabled():
+        raise error
+    (draft, failed), _, report = llm_pool.cascade(
+        _flatten_messages(messages), temperature, _draft_accept(niche, specialties, llm_ctx), task="fallback")
+    stats["fallback"] = report["tried"]
+    return draft, failed
+
+
+def _draft(
+    messages: List[Any],
+    temperature: float,
+    niche: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any],
+    stats: Dict[str, Any],
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Borrador validado -> (payload, campos fallidos). Con LLM_HEDGE=hedge|race se generan
+    candidatos en paralelo o con cobertura (services/llm_pool.py) y gana el primero
+    que pasa la validación.
+    """
+    if llm_pool.HEDGE_MODE == "off":
+        t0 = time.perf_counter()
+        try:
+            draft = _chat_once(messages, temperature=temperature, stats=stats)
+        except Exception as e:
+            return _fallback_draft(messages, temperature, niche, specialties, llm_ctx, stats, e)
+        llm_pool.observe("draft", time.perf_counter() - t0)
+        return _validate_fields(draft, niche, specialties, llm_ctx=llm_ctx)
+
+    try:
+        (draft, failed), _, report = llm_pool.first_valid(
+            _flatten_messages(messages), temperature, _draft_accept(niche, specialties, llm_ctx))
+    except Exception:
+        # backends de LLM_BACKENDS caídos: camino secuencial de siempre
+        try:
+            draft = _chat_once(messages, temperature=temperature, stats=stats)
+        except Exception as e:
+            return _fallback_draft(messages, temperature, niche, specialties, llm_ctx, stats, e)
+        return _validate_fields(draft, niche, specialties, llm_ctx=llm_ctx)
+    for k in ("prompt_eval_count", "eval_count"):
+        if report.get(k) is not None:
+            stats[k] = report[k]
+    stats["hedge"] = {k: report[k] for k in ("mode", "launched", "cancelled", "winner", "seconds")}
+    return draft, failed
+
+
+def _critique_and_repair(
+    draft: Dict[str, Any],
+    niche: str,
+    platform: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
     msgs = [
         {"role": "system", "content": _AGENT_SYS},
         {"role": "user", "content": _CRITIC},
         {"role": "assistant", "content": json.dumps(draft, ensure_ascii=False)},
         {"role": "user", "content": f"Nicho: {niche} | Plataforma: {platform or 'multi'} | Especialidades: {', '.join(specialties) or '—'}"},
     ]
+
+    def accept(gen: "llm_pool.Generation") -> Tuple[Dict[str, Any], bool]:
+        try:
+            return _validate_and_fix(_parse_json(gen.text), niche, specialties, llm_ctx=llm_ctx)
+        except Exception:
+            return draft, False
+
     try:
-        return _chat_once(msgs, temperature=0.4)
+        fixed, _, _ = llm_pool.cascade(_flatten_messages(msgs), 0.4, accept, task="repair")
+        return fixed
     except Exception:
         return draft
 
+
+# "•" y "*" ya los quitó _spanish_only; quedan "- " y las listas numeradas
+_BULLET_PREFIX = re.compile(r"^\s*(?:-|\d+[.)])\s+")
+
+
+def _local_reason_fix(reason: str) -> str:
+    """Sin modelo: listas numeradas ("1.", "2)") pasan a "- " y, si sobran bullets, quedan los 4 primeros."""
+    lines, bullets = [], 0
+    for ln in reason.splitlines():
+        if _BULLET_PREFIX.match(ln):
+            bullets += 1
+            if bullets > 4:
+                continue
+            ln = _BULLET_PREFIX.sub("- ", ln, count=1)
+        lines.append(ln)
+    return "\n".join(lines)
+
+
+def _field_prompt(
+    field: str,
+    draft: Dict[str, Any],
+    niche: str,
+    platform: str,
+    specialties: List[str],
+    focus: str,
+    llm_ctx: Dict[str, Any],
+) -> List[Dict[str, str]]:
+    ideas = [x for x in draft.get("ideas") or [] if not _bad_generic(x)]
+    if field == "ideas":
+        current = " | ".join(ideas) or "—"
+    else:
+        current = str(draft.get(field) or "—").replace("\n", " / ")
+    user = _FIELD_TMPL[field].format(
+        niche=niche,
+        platform=platform,
+        specialties=", ".join(specialties) or "—",
+        focus=focus,
+        banned=", ".join(llm_ctx.get("banned_analogies") or []) or "—",
+        glossary=", ".join(list(llm_ctx.get("glossary") or [])[:_MAX_GLOSSARY // 2]),
+        missing=max(2, 12 - len(ideas)),
+        current=current,
+    )
+    return [{"role": "system", "content": _FIELD_SYS}, {"role": "user", "content": user}]
+
+
+def _field_update(
+    field: str,
+    value: Any,
+    draft: Dict[str, Any],
+    niche: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any],
+) -> Dict[str, Any] | None:
+    """Valor reparado -> cambios a aplicar al borrador, o None si no pasa su comprobación."""
+    if field == "recommendation":
+        value = _spanish_only(_norm(value if isinstance(value, str) else ""))
+        return {"recommendation": value} if _recommendation_ok(value, specialties) else None
+    if field == "reason":
+        value = _norm_reason(value if isinstance(value, str) else "")
+        return {"reason": value} if _reason_ok(value) else None
+    if field == "ideas" and isinstance(value, list):
+        # se conservan las ideas buenas con sus hashtags; las nuevas se etiquetan aparte
+        tags = draft.get("hashtags_for_ideas") or []
+        kept = [(x, tags[i] if i < len(tags) else []) for i, x in enumerate(draft.get("ideas") or [])
+                if not _bad_generic(x)]
+        new = [_spanish_only(_norm(x)) for x in value if isinstance(x, str) and _norm(x)]
+        new = [x for x in new if not _bad_generic(x)]
+        merged = [x for x, _ in kept] + new
+        keep = keep_indices(merged)
+        if len(keep) < 10:
+            return None
+        allowed = _build_allowed_hashtag_vocab(niche, specialties, llm_ctx, merged)
+        all_tags = [t for _, t in kept] + _enforce_hashtags(new, niche, specialties, allowed_vocab=allowed)
+        return {"ideas": [merged[i] for i in keep], "hashtags_for_ideas": [all_tags[i] for i in keep]}
+    return None
+
+
+def _repair_one(
+    field: str,
+    messages: List[Dict[str, str]],
+    draft: Dict[str, Any],
+    niche: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any],
+) -> Tuple[Dict[str, Any] | None, List[Dict[str, Any]]]:
+    """Cascada (modelo pequeño -> grande) hasta que el campo pase su comprobación."""
+    def accept(gen: "llm_pool.Generation") -> Tuple[Dict[str, Any] | None, bool]:
+        try:
+            upd = _field_update(field, _parse_json(gen.text).get(field), draft, niche, specialties, llm_ctx)
+        except Exception:
+            return None, False
+        return upd, upd is not None
+
+    try:
+        upd, _, report = llm_pool.cascade(_flatten_messages(messages), 0.4, accept, task="repair")
+    except Exception:
+        return None, []
+    return upd, report["tried"]
+
+
+def _repair_fields(
+    draft: Dict[str, Any],
+    failed: List[str],
+    niche: str,
+    platform: str,
+    specialties: List[str],
+    focus: str,
+    llm_ctx: Dict[str, Any],
+    stats: Dict[str, Any],
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Regenera solo los campos fallidos, cada uno con su prompt corto y en paralelo
+    (executor de llm_pool); un valor reparado entra solo si pasa su propia
+    comprobación. Devuelve el borrador revalidado y lo que siga fallando.
+    """
+    t0 = time.perf_counter()
+    report: Dict[str, Any] = {"mode": "fields", "failed": list(failed), "local": [], "llm": [],
+                              "models": {}, "prompt_tokens_est": 0}
+
+    if "reason" in failed:
+        fixed = _local_reason_fix(draft.get("reason") or "")
+        if _reason_ok(fixed):
+            draft["reason"] = fixed
+            report["local"].append("reason")
+    pending = [f for f in failed if f not in report["local"]]
+
+    futures = {}
+    for field in pending:
+        msgs = _field_prompt(field, draft, niche, platform, specialties, focus, llm_ctx)
+        report["prompt_tokens_est"] += estimate_tokens(_flatten_messages(msgs))
+        futures[field] = llm_pool.executor().submit(_repair_one, field, msgs, draft, niche, specialties, llm_ctx)
+
+    for field, fut in futures.items():
+        upd, tried = fut.result()
+        report["models"][field] = [t["model"] for t in tried]
+        if upd is not None:
+            draft.update(upd)
+            report["llm"].append(field)
+
+    draft, still = _validate_fields(draft, niche, specialties, llm_ctx=llm_ctx)
+    report.update(still_failed=still, seconds=round(time.perf_counter() - t0, 3))
+    stats["repair"] = report
+    return draft, still
+
+def _fill_hashtags(
+    draft: Dict[str, Any],
+    niche: str,
+    specialties: List[str],
+    llm_ctx: Dict[str, Any],
+    stats: Dict[str, Any],
+) -> None:
+    """
+    Ideas que se quedaron sin hashtags tras el saneo: se piden al modelo de la ruta
+    "hashtags". Solo con cascada activa (SMALL_MODEL); si no, quedan las reglas.
+    """
+    if not llm_pool.cascade_enabled():
+        return
+    ideas = draft.get("ideas") or []
+    block = draft.get("hashtags_for_ideas") or []
+    empty = [i for i, row in enumerate(block) if not row]
+    if len(block) != len(ideas) or not empty:
+        return
+    msgs = [
+        {"role": "system", "content": _FIELD_SYS},
+        {"role": "user", "content": _HASHTAGS_TMPL.format(
+            niche=niche, specialties=", ".join(specialties) or "—", titles=" | ".join(ideas[i] for i in empty))},
+    ]
+    allowed = _build_allowed_hashtag_vocab(niche, specialties, llm_ctx, ideas)
+
+    def accept(gen: "llm_pool.Generation") -> Tuple[List[List[str]] | None, bool]:
+        try:
+            rows = _parse_json(gen.text).get("hashtags_for_ideas")
+        except Exception:
+            return None, False
+        if not isinstance(rows, list) or len(rows) != len(empty) or not all(isinstance(r, list) for r in rows):
+            return None, False
+        merged = list(block)
+        for i, row in zip(empty, rows):
+            merged[i] = row
+        merged = _sanitize_hashtags_block(merged, niche, allowed_vocab=allowed)
+        # el vocabulario permitido puede dejar alguna vacía: basta con cubrir 4 de cada 5
+        return merged, sum(1 for i in empty if merged[i]) * 5 >= len(empty) * 4
+
+    try:
+        merged, ok, report = llm_pool.cascade(_flatten_messages(msgs), 0.3, accept, task="hashtags")
+    except Exception:
+        return
+    if merged is not None:
+        draft["hashtags_for_ideas"] = merged
+    stats["hashtags"] = {"empty": len(empty), "ok": ok, "models": [t["model"] for t in report["tried"]]}
+
 # ----------------------------
 # API principal
 # ----------------------------
@@ -392,10 +865,12 @@ def llm_recommend(
     examples: List[Dict[str, Any]],
     neighbors: List[Dict[str, Any]] | None = None,
     temperature: float = 0.6,
+    trends: List[Dict[str, Any]] | None = None,
 ) -> Dict[str, Any]:
     """
     Recomendación robusta y generalista (nicho-agnóstica).
-    Usa RAG (glossary/expanded/examples) + crítica/repair + saneo.
+    Usa RAG (glossary/expanded/examples) + reparación por campo + saneo, y reordena
+    las ideas por afinidad con trends/ejemplos (services/idea_ranker.py).
     """
     inputs = metrics.get("inputs", {}) or {}
     platform = inputs.get("platform")
@@ -409,8 +884,10 @@ def llm_recommend(
         top_k=top_k,
         region=inputs.get("region"),
         preset_examples=examples,
+        preset_trends=trends,
     )
 
+    prompt_stats: Dict[str, Any] = {}
     messages = _build_prompt(
         niche=niche,
         metrics=metrics,
@@ -418,15 +895,27 @@ def llm_recommend(
         specialties=specialties,
         platform=platform,
         llm_ctx=llm_ctx,
+        stats=prompt_stats,
     )
-    draft = _chat_once(messages, temperature=temperature)
-
-    draft, ok = _validate_and_fix(draft, niche, specialties, llm_ctx=llm_ctx)
-    if not ok:
-        draft2 = _critique_and_repair(draft, niche=niche, platform=(platform or "multi"), specialties=specialties)
+    draft, failed = _draft(messages, temperature, niche, specialties, llm_ctx, prompt_stats)
+    if failed and LLM_REPAIR == "full":
+        t0 = time.perf_counter()
+        draft2 = _critique_and_repair(draft, niche=niche, platform=(platform or "multi"), specialties=specialties,
+                                      llm_ctx=llm_ctx)
         draft2, ok2 = _validate_and_fix(draft2, niche, specialties, llm_ctx=llm_ctx)
         if ok2:
             draft = draft2
+        prompt_stats["repair"] = {"mode": "full", "failed": failed, "still_failed": [] if ok2 else failed,
+                                  "seconds": round(time.perf_counter() - t0, 3)}
+    elif failed:
+        draft, _ = _repair_fields(draft, failed, niche=niche, platform=(platform or "multi"),
+                                  specialties=specialties, focus=_focus_key(inputs.get("focus_hint")),
+                                  llm_ctx=llm_ctx, stats=prompt_stats)
+
+    _fill_hashtags(draft, niche, specialties, llm_ctx, prompt_stats)
+
+    # Mejores ideas primero (embeddings en batch + similitud vectorizada; sin llamada extra al LLM)
+    draft = rerank_ideas(draft, llm_ctx.get("trends") or [], llm_ctx.get("examples_full") or [])
 
     draft.setdefault("recommendation", "Tu siguiente video debe ser algo concreto y con resultado visible (sin minutajes).")
     draft.setdefault("reason", "Señales en humano; objetivo claro; analogía original; 4 bullets imperativos y concretos.")
@@ -437,5 +926,6 @@ def llm_recommend(
         "hashtags_for_ideas",
         _enforce_hashtags(draft.get("ideas", []), niche, specialties, allowed_vocab=allowed_vocab_final)
     )
+    draft["prompt_stats"] = prompt_stats
 
     return draft
@@ -0,0 +1,326 @@
+# app/services/llm_pool.py
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# ----------------------------
+# Generación cancelable contra uno o varios backends Ollama + hedging
+# ----------------------------
+# generate() habla directo con /api/generate en streaming: si se activa `cancel`,
+# se cierra la conexión entre trozos y Ollama deja de generar (el perdedor de una
+# carrera no sigue ocupando el modelo). Estadísticas por (backend, modelo).
+#
+# first_valid() implementa la generación con cobertura de llm_recommend:
+#   LLM_HEDGE=hedge -> si el primer borrador no ha terminado en el percentil
+#                      LLM_HEDGE_PCT de las latencias recientes, lanza un segundo
+#                      (en el siguiente backend de LLM_BACKENDS si lo hay)
+#   LLM_HEDGE=race  -> LLM_RACE_N candidatos a la vez con semillas distintas
+# Gana el primero que `accept` da por bueno; el resto se cancela.
+#
+# cascade() es la cascada de modelos: cada subtarea tiene ruta "small" o "large"
+# (LLM_ROUTES); con SMALL_MODEL definido, las de ruta "small" (reparaciones,
+# hashtags, borrador de emergencia) van primero al modelo pequeño y escalan al
+# grande si su salida no pasa `accept`. El borrador principal sigue en el grande.
+
+_OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
+LLM_BACKENDS: List[str] = [h.strip().rstrip("/") for h in os.getenv("LLM_BACKENDS", "").split(",") if h.strip()] \
+    or [_OLLAMA_HOST.rstrip("/")]
+DEFAULT_MODEL = os.getenv("MODEL", "qwen2.5:7b-instruct")
+HEDGE_MODE = os.getenv("LLM_HEDGE", "off").lower()                  # off | hedge | race
+HEDGE_PCT = float(os.getenv("LLM_HEDGE_PCT", "90"))
+HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", "15000"))    # plazo hasta tener historial
+RACE_N = int(os.getenv("LLM_RACE_N", "2"))
+SMALL_MODEL = os.getenv("SMALL_MODEL", "")                          # vacío = sin cascada
+ROUTES: Dict[str, str] = {"draft": "large", "repair": "small", "hashtags": "small", "fallback": "small"}
+ROUTES.update((k.strip(), v.strip().lower()) for k, v in
+              (kv.split("=", 1) for kv in os.getenv("LLM_ROUTES", "").split(",") if "=" in kv))
+_REQUEST_TIMEOUT_S = float(os.getenv("LLM_REQUEST_TIMEOUT_S", "300"))
+_MIN_SAMPLES = 20
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+class Generation(NamedTuple):
+    text: str
+    backend: str
+    model: str
+    seconds: float
+    prompt_eval_count: Optional[int]
+    eval_count: Optional[int]
+
+
+class Cancelled(Exception):
+    pass
+
+# ----------------------------
+# Estadísticas
+# ----------------------------
+
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+_LATENCIES: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=500))
+_TASK_LATENCIES: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=500))
+_CASCADE: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+
+def record(backend: str, model: str, outcome: str, seconds: float, tokens: Optional[int] = None) -> None:
+    """Una llamada a (backend, modelo); también las que no pasan por generate() (llama-index)."""
+    with _STATS_LOCK:
+        st = _STATS[(backend, model)]
+        st["calls"] += 1
+        st[outcome] += 1
+        st["seconds"] += seconds
+        st["eval_tokens"] += tokens or 0
+        if outcome == "ok":
+            _LATENCIES[(backend, model)].append(seconds)
+
+
+def observe(task: str, seconds: float) -> None:
+    """Latencia de una generación de `task` (p.ej. 'draft'); alimenta el plazo del hedge."""
+    with _STATS_LOCK:
+        _TASK_LATENCIES[task].append(seconds)
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round((len(s) - 1) * p / 100.0)))]
+
+
+def hedge_deadline_s(task: str = "draft") -> float:
+    with _STATS_LOCK:
+        lat = list(_TASK_LATENCIES[task])
+    if len(lat) < _MIN_SAMPLES:
+        return HEDGE_AFTER_MS / 1000.0
+    return _pct(lat, HEDGE_PCT)
+
+
+def stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        per = {}
+        for (backend, model), st in _STATS.items():
+            lat = list(_LATENCIES[(backend, model)])
+            per[f"{model}@{backend}"] = {**{k: int(v) if k != "seconds" else round(v, 3) for k, v in st.items()},
+                                         "p50_s": round(_pct(lat, 50), 3), "p95_s": round(_pct(lat, 95), 3)}
+        tasks = {t: {"n": len(v), "p50_s": round(_pct(list(v), 50), 3), "p99_s": round(_pct(list(v), 99), 3)}
+                 for t, v in _TASK_LATENCIES.items()}
+        cascade = {t: dict(v) for t, v in _CASCADE.items()}
+    return {"mode": HEDGE_MODE, "backends": LLM_BACKENDS, "models": per, "tasks": tasks,
+            "hedge_deadline_s": round(hedge_deadline_s(), 3),
+            "cascade": {"small_model": SMALL_MODEL or None, "routes": dict(ROUTES), "tasks": cascade}}
+
+
+def reset_stats() -> None:
+    with _STATS_LOCK:
+        _STATS.clear()
+        _LATENCIES.clear()
+        _TASK_LATENCIES.clear()
+        _CASCADE.clear()
+
+# ----------------------------
+# Generación
+# ----------------------------
+
+def generate(
+    prompt: str,
+    temperature: float,
+    backend: Optional[str] = None,
+    model: Optional[str] = None,
+    seed: Optional[int] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Generation:
+    """Una generación en streaming; lanza Cancelled si `cancel` se activa a mitad."""
+    import requests
+
+    backend = backend or LLM_BACKENDS[0]
+    model = model or DEFAULT_MODEL
+    options: Dict[str, Any] = {"temperature": temperature}
+    if seed is not None:
+        options["seed"] = seed
+    t0 = time.perf_counter()
+    parts: List[str] = []
+    last: Dict[str, Any] = {}
+    try:
+        with requests.post(f"{backend}/api/generate", stream=True, timeout=_REQUEST_TIMEOUT_S,
+                           json={"model": model, "prompt": prompt, "stream": True, "options": options}) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if cancel is not None and cancel.is_set():
+                    # salir del `with` cierra el socket: Ollama aborta la generación
+                    raise Cancelled()
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                parts.append(chunk.get("response") or "")
+                if chunk.get("done"):
+                    last = chunk
+                    break
+    except Cancelled:
+        record(backend, model, "cancelled", time.perf_counter() - t0, len(parts))
+        raise
+    except Exception:
+        record(backend, model, "errors", time.perf_counter() - t0)
+        raise
+    seconds = time.perf_counter() - t0
+    record(backend, model, "ok", seconds, last.get("eval_count"))
+    return Generation("".join(parts), backend, model, seconds, last.get("prompt_eval_count"), last.get("eval_count"))
+
+
+def executor() -> ThreadPoolExecutor:
+    """Pool compartido para generaciones concurrentes (hedging, reparaciones por campo)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_POOL_WORKERS", "16")),
+                                               thread_name_prefix="llm-hedge")
+    return _EXECUTOR
+
+
+def first_valid(
+    prompt: str,
+    temperature: float,
+    accept: Callable[[Generation], Tuple[Any, bool]],
+    mode: Optional[str] = None,
+    n: Optional[int] = None,
+    model: Optional[str] = None,
+    task: str = "draft",
+) -> Tuple[Any, bool, Dict[str, Any]]:
+    """
+    Generaciones en paralelo/cobertura; devuelve (valor, ok, informe) del primer
+    candidato aceptado. Si ninguno pasa, el del primero que terminó (ok=False) para
+    que el llamador siga con su reparación. Si todos fallan, relanza el último error.
+    """
+    mode = (mode or HEDGE_MODE).lower()
+    total = max(2, n or RACE_N) if mode == "race" else (2 if mode == "hedge" else 1)
+    cancel = threading.Event()
+    results: "queue.Queue[Tuple[int, Any]]" = queue.Queue()
+    base_seed = random.randrange(1 << 30)
+    t0 = time.perf_counter()
+
+    def run(i: int) -> None:
+        try:
+            g = generate(prompt, temperature, backend=LLM_BACKENDS[i % len(LLM_BACKENDS)], model=model,
+                         seed=base_seed + i, cancel=cancel)
+            # plazo del hedge = latencia de UNA generación (no la del conjunto ya cubierto)
+            observe(task, g.seconds)
+            results.put((i, g))
+        except Exception as e:
+            results.put((i, e))
+
+    launched = 0
+
+    def launch() -> None:
+        nonlocal launched
+        executor().submit(run, launched)
+        launched += 1
+
+    for _ in range(total if mode == "race" else 1):
+        launch()
+    deadline = t0 + hedge_deadline_s(task) if mode == "hedge" else None
+
+    fallback: Optional[Tuple[Any, Generation]] = None
+    error: Optional[BaseException] = None
+    finished = 0
+    winner: Optional[Tuple[int, Any, bool, Generation]] = None
+    while finished < launched:
+        timeout = None
+        if deadline is not None and launched < total:
+            timeout = max(0.0, deadline - time.perf_counter())
+        try:
+            i, res = results.get(timeout=timeout)
+        except queue.Empty:
+            launch()  # el primero va lento: cobertura
+            continue
+        finished += 1
+        if isinstance(res, BaseException):
+            error = res
+            if launched < total:
+                launch()  # un error no espera al plazo
+            continue
+        value, ok = accept(res)
+        if ok:
+            winner = (i, value, True, res)
+            break
+        if fallback is None:
+            fallback = (value, res)
+    cancel.set()
+
+    report = {"mode": mode, "launched": launched, "finished": finished,
+              "cancelled": launched - finished, "seconds": round(time.perf_counter() - t0, 3)}
+    if winner is not None:
+        i, value, ok, g = winner
+    elif fallback is not None:
+        (value, g), ok, i = fallback, False, -1
+    else:
+        raise error or RuntimeError("sin generaciones")
+    report.update(winner=i, backend=g.backend, prompt_eval_count=g.prompt_eval_count, eval_count=g.eval_count)
+    return value, ok, report
+
+# ----------------------------
+# Cascada de modelos
+# ----------------------------
+
+_RR = itertools.count()
+
+
+def cascade_enabled() -> bool:
+    return bool(SMALL_MODEL) and SMALL_MODEL != DEFAULT_MODEL
+
+
+def models_for(task: str) -> List[str]:
+    """Modelos a probar para `task`, en orden de escalado."""
+    if cascade_enabled() and ROUTES.get(task) == "small":
+        return [SMALL_MODEL, DEFAULT_MODEL]
+    return [DEFAULT_MODEL]
+
+
+def cascade(
+    prompt: str,
+    temperature: float,
+    accept: Callable[[Generation], Tuple[Any, bool]],
+    task: str,
+) -> Tuple[Any, bool, Dict[str, Any]]:
+    """
+    Prueba los modelos de la ruta de `task` en orden y escala al siguiente si la
+    generación falla o `accept` la rechaza. Devuelve (valor, ok, informe); sin ningún
+    candidato aceptado, el último valor obtenido con ok=False. Si todas las llamadas
+    fallan, relanza el último error.
+    """
+    tried: List[Dict[str, Any]] = []
+    value: Any = None
+    got = False
+    ok = False
+    error: Optional[BaseException] = None
+    for model in models_for(task):
+        backend = LLM_BACKENDS[next(_RR) % len(LLM_BACKENDS)]
+        try:
+            g = generate(prompt, temperature, backend=backend, model=model)
+        except Exception as e:
+            error = e
+            tried.append({"model": model, "ok": False, "error": type(e).__name__})
+            continue
+        value, ok = accept(g)
+        got = True
+        tried.append({"model": model, "ok": ok, "seconds": round(g.seconds, 3)})
+        if ok:
+            break
+
+    with _STATS_LOCK:
+        st = _CASCADE[task]
+        st["calls"] += 1
+        st["escalated"] += int(len(tried) > 1)
+        st["first_ok"] += int(ok and len(tried) == 1)
+        st["failed"] += int(not ok)
+    if not got:
+        raise error or RuntimeError("sin generaciones")
+    return value, ok, {"task": task, "tried": tried}
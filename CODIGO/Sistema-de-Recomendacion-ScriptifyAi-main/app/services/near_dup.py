@@ -0,0 +1,159 @@
+# app/services/near_dup.py
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.text_norm import normalize_words
+
+# ----------------------------
+# Detección de casi duplicados (shingles de caracteres + Jaccard / MinHash-LSH)
+# ----------------------------
+# Dos textos son casi duplicados si la similitud de Jaccard de sus shingles de
+# k caracteres (sobre el texto normalizado: minúsculas, sin tildes ni signos)
+# es >= NEAR_DUP_THRESHOLD. "Errores que arruinan tu rutina" y "Errores que
+# arruinan tus rutinas" lo son; "Rutina de pierna" y "Rutina de espalda" no.
+#
+# Lotes pequeños (ideas de una respuesta): comparación exacta por pares.
+# Lotes grandes (títulos de ejemplo): firmas MinHash vectorizadas en numpy y
+# bandas LSH para sacar candidatos; cada candidato se confirma con Jaccard exacto.
+# Es aproximado: no hay falsos positivos, pero un par por encima del umbral puede
+# no salir como candidato y sobrevivir (con 16 bandas de 4 filas, P(candidato) es
+# ~0.99 con J=0.7, ~0.89 con J=0.6 y ~1.0 desde J=0.8).
+
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))
+SHINGLE_K = int(os.getenv("NEAR_DUP_SHINGLE", "3"))
+NUM_PERM = int(os.getenv("NEAR_DUP_PERM", "64"))
+BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))  # filas por banda = NUM_PERM // BANDS
+EXACT_MAX = int(os.getenv("NEAR_DUP_EXACT_MAX", "48"))  # por encima: MinHash + LSH
+
+# Permutaciones por hashing multiply-shift: h(x) = (a*x + b) mod 2^64 >> 32, con a impar.
+# Sin módulo primo: solo multiplicaciones/sumas uint64 que numpy vectoriza bien.
+_rng = np.random.RandomState(1234)  # fijo: firmas reproducibles entre procesos
+_A = _rng.randint(1, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+_B = _rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_MIX = (_rng.randint(1, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) | np.uint64(1))
+
+
+@lru_cache(maxsize=65536)
+def shingles(text: str, k: int = SHINGLE_K) -> FrozenSet[int]:
+    """Hashes (crc32) de los k-gramas de caracteres del texto normalizado."""
+    t = f" {normalize_words(text)} "
+    if len(t) <= k:
+        return frozenset((zlib.crc32(t.encode("utf-8")),)) if t.strip() else frozenset()
+    return frozenset(zlib.crc32(t[i:i + k].encode("utf-8")) for i in range(len(t) - k + 1))
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a and not b:
+        return 1.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def _similar(a: FrozenSet[int], b: FrozenSet[int], threshold: float) -> bool:
+    la, lb = len(a), len(b)
+    # cota por tamaños: J <= min/max, evita la intersección en la mayoría de pares
+    if max(la, lb) and min(la, lb) < threshold * max(la, lb):
+        return False
+    return jaccard(a, b) >= threshold
+
+
+def minhash_signatures(sets: Sequence[FrozenSet[int]]) -> np.ndarray:
+    """Firmas (n, NUM_PERM) uint32: todas las permutaciones en una sola pasada numpy."""
+    n = len(sets)
+    sig = np.full((n, NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    sizes = np.fromiter((len(s) for s in sets), dtype=np.int64, count=n)
+    if not sizes.sum():
+        return sig
+    flat = np.fromiter((h for s in sets for h in s), dtype=np.uint64, count=int(sizes.sum()))
+    with np.errstate(over="ignore"):
+        perm = ((_A[:, None] * flat[None, :] + _B[:, None]) >> np.uint64(32)).astype(np.uint32)  # (NUM_PERM, total)
+    nonempty = np.flatnonzero(sizes)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[nonempty]
+    sig[nonempty] = np.minimum.reduceat(perm, starts, axis=1).T
+    return sig
+
+
+_SIG_MAX = 65536
+_SIG_CACHE: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_SIG_LOCK = threading.Lock()
+
+
+def _signatures(texts: Sequence[str], sets: Sequence[FrozenSet[int]]) -> np.ndarray:
+    """minhash_signatures memoizado por texto: solo se firman los títulos no vistos."""
+    rows = [_SIG_CACHE.get(t or "") for t in texts]
+    missing = [i for i, r in enumerate(rows) if r is None]
+    if missing:
+        fresh = minhash_signatures([sets[i] for i in missing])
+        with _SIG_LOCK:
+            for i, sig in zip(missing, fresh):
+                rows[i] = _SIG_CACHE[texts[i] or ""] = sig
+            while len(_SIG_CACHE) > _SIG_MAX:
+                _SIG_CACHE.popitem(last=False)
+    return np.stack(rows) if rows else np.empty((0, NUM_PERM), dtype=np.uint32)
+
+
+def _lsh_candidates(sig: np.ndarray) -> Dict[int, Set[int]]:
+    """Para cada índice, los anteriores con los que comparte alguna banda."""
+    rows = max(1, NUM_PERM // BANDS)
+    n_bands = NUM_PERM // rows
+    # Cada banda se reduce a una clave uint64 (mezcla con desbordamiento); una colisión
+    # de claves solo añade candidatos, que luego se confirman con Jaccard exacto.
+    bands = sig[:, :rows * n_bands].reshape(len(sig), n_bands, rows)
+    with np.errstate(over="ignore"):
+        keys = (bands.astype(np.uint64) * _MIX[None, None, :rows]).sum(axis=2, dtype=np.uint64)
+    cands: Dict[int, Set[int]] = {}
+    for b in range(n_bands):
+        _, inv = np.unique(keys[:, b], return_inverse=True)
+        inv = inv.ravel()
+        shared = np.flatnonzero(np.bincount(inv)[inv] > 1)  # solo filas en cubetas con >1
+        buckets: Dict[int, List[int]] = {}
+        for i, g in zip(shared.tolist(), inv[shared].tolist()):
+            bucket = buckets.setdefault(g, [])
+            if bucket:
+                cands.setdefault(i, set()).update(bucket)
+            bucket.append(i)
+    return cands
+
+
+def keep_indices(texts: Sequence[str], threshold: float = NEAR_DUP_THRESHOLD) -> List[int]:
+    """
+    Índices a conservar (en orden): cada texto se descarta si es casi duplicado
+    de uno anterior ya conservado. Textos vacíos tras normalizar se conservan.
+    """
+    sets = [shingles(t or "") for t in texts]
+    kept: List[int] = []
+    if len(texts) <= EXACT_MAX:
+        for i, s in enumerate(sets):
+            if not s or not any(sets[j] and _similar(s, sets[j], threshold) for j in kept):
+                kept.append(i)
+        return kept
+
+    cands = _lsh_candidates(_signatures(texts, sets))
+    dropped: Set[int] = set()
+    for i, s in enumerate(sets):
+        if s and any(j not in dropped and sets[j] and _similar(s, sets[j], threshold) for j in cands.get(i, ())):
+            dropped.add(i)
+        else:
+            kept.append(i)
+    return kept
+
+
+def dedup(texts: Sequence[str], threshold: float = NEAR_DUP_THRESHOLD) -> List[str]:
+    return [texts[i] for i in keep_indices(texts, threshold)]
+
+
+def near_duplicate_pairs(texts: Sequence[str], threshold: float = NEAR_DUP_THRESHOLD) -> List[Tuple[int, int, float]]:
+    """(i, j, jaccard) con i < j para todos los pares por encima del umbral (diagnóstico/bench)."""
+    sets = [shingles(t or "") for t in texts]
+    out: List[Tuple[int, int, float]] = []
+    for i in range(len(sets)):
+        for j in range(i + 1, len(sets)):
+            if sets[i] and sets[j] and _similar(sets[i], sets[j], threshold):
+                out.append((i, j, jaccard(sets[i], sets[j])))
+    return out
@@ -1,13 +1,17 @@
 # app/services/neo4j_client.py
 import os
-from typing import Optional
-from neo4j import GraphDatabase, Driver
+import threading
+from typing import TYPE_CHECKING, Optional
 
+if TYPE_CHECKING:
+    from neo4j import Driver
 
-_DRIVER: Optional[Driver] = None
 
+_DRIVER: Optional["Driver"] = None
+_LOCK = threading.Lock()
 
-def get_driver() -> Driver:
+
+def get_driver() -> "Driver":
     """
     Singleton del driver de Neo4j.
     Env:
@@ -17,10 +21,15 @@ def get_driver() -> Driver:
     """
     global _DRIVER
     if _DRIVER is None:
-        uri = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
-        user = os.getenv("NEO4J_USER", "neo4j")
-        pwd = os.getenv("NEO4J_PASSWORD", "neo4j")
-        _DRIVER = GraphDatabase.driver(uri, auth=(user, pwd))
+        with _LOCK:
+            if _DRIVER is None:
+                # Import diferido: el paquete neo4j pesa en el arranque
+                from neo4j import GraphDatabase
+
+                uri = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
+                user = os.getenv("NEO4J_USER", "neo4j")
+                pwd = os.getenv("NEO4J_PASSWORD", "neo4j")
+                _DRIVER = GraphDatabase.driver(uri, auth=(user, pwd))
     return _DRIVER
 
 
@@ -0,0 +1,90 @@
+# app/services/quantized_vectors.py
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# ----------------------------
+# Embeddings cuantizados (int8 por vector / float16) + búsqueda con re-rank exacto
+# ----------------------------
+# int8 simétrico por vector: x ≈ codes * scale, scale = max|x| / 127. 768 dims pasan
+# de 3 KB (float32) o ~6 KB como lista de floats en el grafo a 768 B + 4 B.
+# La búsqueda puntúa todo con los códigos (por bloques, en float32 para usar BLAS)
+# y re-ordena los `k * rerank` mejores con los vectores float32 originales, que
+# pueden estar en un .npy mapeado: solo se leen del disco esas filas.
+
+_BLOCK = 4096  # filas por bloque al desempaquetar (acota la memoria temporal a ~12 MB)
+
+
+class QuantizedMatrix(NamedTuple):
+    codes: np.ndarray   # (n, d) int8
+    scales: np.ndarray  # (n,) float32
+
+
+def quantize_int8(m: np.ndarray) -> QuantizedMatrix:
+    m = np.asarray(m, dtype=np.float32)
+    if m.ndim == 1:
+        m = m[None, :]
+    scales = np.abs(m).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(m / scales[:, None]), -127, 127).astype(np.int8)
+    return QuantizedMatrix(codes, scales.astype(np.float32))
+
+
+def dequantize_int8(q: QuantizedMatrix) -> np.ndarray:
+    return q.codes.astype(np.float32) * q.scales[:, None]
+
+
+def int8_to_bytes(vec) -> Tuple[bytes, float]:
+    """Un vector -> (bytes int8, scale): formato compacto para una propiedad del grafo."""
+    q = quantize_int8(np.asarray(vec, dtype=np.float32))
+    return q.codes[0].tobytes(), float(q.scales[0])
+
+
+def int8_from_bytes(raw: bytes, scale: float) -> np.ndarray:
+    return np.frombuffer(bytes(raw), dtype=np.int8).astype(np.float32) * np.float32(scale)
+
+
+def _normalize(q) -> np.ndarray:
+    q = np.asarray(q, dtype=np.float32).ravel()
+    n = float(np.linalg.norm(q))
+    return q / n if n else q
+
+
+def approx_scores(q: np.ndarray, data) -> np.ndarray:
+    """Producto punto aproximado contra int8 (QuantizedMatrix), float16 o float32, por bloques."""
+    if isinstance(data, QuantizedMatrix):
+        codes, scales = data.codes, data.scales
+        out = np.empty(len(codes), dtype=np.float32)
+        for i in range(0, len(codes), _BLOCK):
+            out[i:i + _BLOCK] = (codes[i:i + _BLOCK].astype(np.float32) @ q) * scales[i:i + _BLOCK]
+        return out
+    if data.dtype == np.float32:
+        return data @ q
+    out = np.empty(len(data), dtype=np.float32)
+    for i in range(0, len(data), _BLOCK):
+        out[i:i + _BLOCK] = data[i:i + _BLOCK].astype(np.float32) @ q
+    return out
+
+
+def search(query, data, k: int, exact: Optional[np.ndarray] = None, rerank: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k por coseno (filas de `data` normalizadas). Con `exact` (float32, p.ej. mmap)
+    los k*rerank candidatos se re-puntúan con precisión completa.
+    Devuelve (índices, scores) ordenados de mayor a menor.
+    """
+    q = _normalize(query)
+    n = len(data.codes) if isinstance(data, QuantizedMatrix) else len(data)
+    if not n or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    scores = approx_scores(q, data)
+    c = min(n, max(k, k * rerank) if exact is not None else k)
+    cand = np.argpartition(-scores, c - 1)[:c]
+    if exact is not None:
+        cand = np.sort(cand)  # acceso secuencial al mmap
+        cand_scores = np.asarray(exact[cand], dtype=np.float32) @ q
+    else:
+        cand_scores = scores[cand]
+    k = min(k, len(cand))
+    top = np.argpartition(-cand_scores, k - 1)[:k]
+    top = top[np.argsort(-cand_scores[top])]
+    return cand[top], cand_scores[top]
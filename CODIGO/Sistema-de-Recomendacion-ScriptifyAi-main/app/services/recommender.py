@@ -1,37 +1,7 @@
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel
-import math
-
-class Metrics(BaseModel):
-    # contexto
-    platform: Optional[str] = None
-    niche: str
-    format: Optional[str] = None
-
-    # MÉTRICAS (pueden venir vacías o como conteos)
-    ctr: Optional[float] = None                # 0–1 o 0–100 (normalizo)
-    retention: Optional[float] = None          # 0–1 o 0–100 (normalizo)
-    avg_watch_pct: Optional[float] = None      # 0–1 o 0–100 (normalizo)
-    completion_rate: Optional[float] = None    # 0–1 o 0–100 (normalizo)
-
-    impressions: Optional[int] = None
-    reach: Optional[int] = None
-    clicks: Optional[int] = None
-    conversions: Optional[int] = None
-
-    # nuevos conteos para inferir tasas cuando no pasen % directamente
-    followers: Optional[int] = None
-    likes: Optional[int] = None
-    shares: Optional[int] = None
-    saves: Optional[int] = None
-    comments: Optional[int] = None
-
-    followers_change: Optional[int] = None
-    freq: Optional[float] = None   # posts/semana aprox
-
-    # controles
-    use_graph: bool = True
-    top_k: Optional[int] = 5
+from typing import Dict, Any, List, Optional
+
+# Un único Metrics (compacto, __slots__) para /recommend, /recommend/llm y el lote
+from models.schemas import Metrics
 
 def _pct(x: Optional[float]) -> Optional[float]:
     if x is None:
@@ -44,8 +14,13 @@ def _safe_pct_str(x: Optional[float]) -> str:
     return f"{x:.2%}"
 
 def infer_rates(m: Metrics) -> Metrics:
-    """Si el usuario pasa solo conteos (clicks, likes, etc.), calculo CTR y una proxy de retención."""
-    m = m.copy(deep=True)
+    """
+    Si el usuario pasa solo conteos (clicks, likes, etc.), calculo CTR y una proxy de retención.
+    Se hace sobre el propio objeto y una sola vez (m.rates_inferred): decide_focus y
+    reason_for_focus vuelven a llamarla sin coste ni copias.
+    """
+    if m.rates_inferred:
+        return m
 
     # Normalizo si ya vienen en 0–100
     m.ctr = _pct(m.ctr) if m.ctr is not None else None
@@ -67,6 +42,7 @@ def infer_rates(m: Metrics) -> Metrics:
         num = 1.0*likes + 1.5*comments + 1.7*shares + 1.8*saves
         m.retention = max(0.0, min(0.95, num / m.impressions))
 
+    m.rates_inferred = True
     return m
 
 def score_discovery(m: Metrics) -> float:
@@ -0,0 +1,203 @@
+# app/services/shared_store.py
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+from core.serialization import dumps
+
+# ----------------------------
+# Almacén compartido entre workers (gunicorn pre-fork)
+# ----------------------------
+# Con N workers cada proceso tendría su propia copia del contexto de Neo4j y de los
+# embeddings de referencia. Aquí vive lo que es "casi solo lectura": un KV con TTL
+# en SQLite sobre /dev/shm (tmpfs); todas las páginas viven en la page cache del
+# kernel y se comparten entre procesos, y cada worker solo guarda un LRU pequeño
+# (ya decodificado) delante. clear() sube un contador de generación en SQLite que
+# cada get() consulta: los LRU de los demás workers se vacían en su siguiente lectura.
+#
+# La matriz de embeddings se comparte por otro camino: services/snapshot.py la abre
+# con np.load(mmap_mode="r") y el kernel mapea las mismas páginas en todos los workers.
+#
+# Todo es opcional: SHARED_STORE=0 desactiva la capa compartida y queda solo el LRU
+# local (comportamiento equivalente a un único proceso).
+
+def _default_dir() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "scriptify")
+
+SHARED_DIR = Path(os.getenv("SHARED_DIR") or _default_dir())
+_ENABLED = os.getenv("SHARED_STORE", "1").lower() not in ("0", "false", "no")
+_LOCAL_MAX = int(os.getenv("SHARED_LOCAL_LRU", "256"))
+
+# ----------------------------
+# KV compartido (SQLite WAL en tmpfs)
+# ----------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+  ns      TEXT NOT NULL,
+  key     TEXT NOT NULL,
+  value   BLOB NOT NULL,
+  expires REAL NOT NULL,
+  PRIMARY KEY (ns, key)
+) WITHOUT ROWID
+"""
+
+_GEN_SCHEMA = "CREATE TABLE IF NOT EXISTS gen (ns TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID"
+
+_tls = threading.local()
+
+
+def _conn() -> Optional[sqlite3.Connection]:
+    """Una conexión por hilo y por proceso (las conexiones no sobreviven a fork)."""
+    if not _ENABLED:
+        return None
+    pid = os.getpid()
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and getattr(_tls, "pid", None) == pid:
+        return conn
+    try:
+        SHARED_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(SHARED_DIR / "kv.sqlite"), timeout=5, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")   # es una caché: no necesitamos durabilidad
+        conn.execute(_SCHEMA)
+        conn.execute(_GEN_SCHEMA)
+    except sqlite3.Error:
+        return None
+    _tls.conn, _tls.pid = conn, pid
+    return conn
+
+
+class SharedCache:
+    """
+    Caché clave -> valor JSON con TTL, compartida entre procesos, con un LRU local
+    delante. En SQLite se guarda el JSON serializado; el LRU local guarda el objeto ya
+    decodificado, así que un acierto local no paga json.loads; solo se fía de él si la
+    generación del espacio en SQLite no ha cambiado (clear() en cualquier proceso).
+
+    Lo que devuelven get/set/get_or_set es siempre la forma JSON del valor (fechas de
+    Neo4j -> ISO, NaN -> null), tanto en el primer build como en un acierto, y es
+    compartido: el llamador lo trata como solo lectura.
+    """
+
+    def __init__(self, ns: str, ttl: float, local_max: int = _LOCAL_MAX):
+        self.ns = ns
+        self.ttl = float(ttl)
+        self.local_max = local_max
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._gen = 0   # generación con la que se llenó el LRU local
+
+    def _sync(self, conn: Optional[sqlite3.Connection]) -> None:
+        """Vacía el LRU local si otro proceso ha hecho clear() desde la última lectura."""
+        if conn is None:
+            return
+        try:
+            row = conn.execute("SELECT value FROM gen WHERE ns=?", (self.ns,)).fetchone()
+        except sqlite3.Error:
+            return
+        gen = row[0] if row else 0
+        if gen != self._gen:
+            with self._lock:
+                self._local.clear()
+                self._gen = gen
+
+    def _local_get(self, key: str, now: float) -> Optional[Any]:
+        with self._lock:
+            hit = self._local.get(key)
+            if hit is None:
+                return None
+            if hit[0] < now:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return hit[1]
+
+    def _local_put(self, key: str, expires: float, value: Any) -> None:
+        with self._lock:
+            self._local[key] = (expires, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max:
+                self._local.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        conn = _conn()
+        self._sync(conn)
+        value = self._local_get(key, now)
+        if value is not None:
+            return value
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT value, expires FROM kv WHERE ns=? AND key=? AND expires>=?",
+                               (self.ns, key, now)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        value = json.loads(bytes(row[0]))
+        self._local_put(key, row[1], value)
+        return value
+
+    def set(self, key: str, value: Any) -> Any:
+        """Guarda `value` y devuelve su forma JSON (la misma que devolverá get)."""
+        raw = dumps(value)
+        value = json.loads(raw)
+        if self.ttl <= 0:
+            return value
+        expires = time.time() + self.ttl
+        conn = _conn()
+        self._sync(conn)
+        self._local_put(key, expires, value)
+        if conn is None:
+            return value
+        try:
+            conn.execute("INSERT OR REPLACE INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                         (self.ns, key, raw, expires))
+        except sqlite3.Error:
+            pass
+        return value
+
+    def get_or_set(self, key: str, build: Callable[[], Any]) -> Any:
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        return self.set(key, build())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+        conn = _conn()
+        if conn is not None:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM kv WHERE ns=?", (self.ns,))
+                conn.execute("INSERT OR IGNORE INTO gen (ns, value) VALUES (?, 0)", (self.ns,))
+                conn.execute("UPDATE gen SET value=value+1 WHERE ns=?", (self.ns,))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+
+
+def purge_expired() -> int:
+    """Borra entradas caducadas (lo llama el master de gunicorn al arrancar)."""
+    conn = _conn()
+    if conn is None:
+        return 0
+    try:
+        cur = conn.execute("DELETE FROM kv WHERE expires < ?", (time.time(),))
+        return cur.rowcount or 0
+    except sqlite3.Error:
+        return 0
@@ -0,0 +1,477 @@
+# app/services/snapshot.py
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.serialization import dumps
+
+# ----------------------------
+# Snapshot de solo lectura del grafo (sin Neo4j en el camino caliente)
+# ----------------------------
+# El camino de lectura de la API solo necesita, por nicho/región: ejemplos, trends,
+# léxico y los embeddings de los videos. export_snapshot() los materializa en:
+#
+#   GRAPH_SNAPSHOT_PATH/
+#     current -> snap-<ts>/          (symlink; el cambio es atómico con os.replace)
+#     snap-<ts>/read.sqlite          (tablas clave -> JSON, PK por nicho/región)
+#     snap-<ts>/embeddings.npy       (float32 normalizado, abierto con mmap)
+#     snap-<ts>/embeddings_i8.npy    (+ embeddings_scale.npy) / embeddings_f16.npy
+#
+# La búsqueda vectorial recorre la copia compacta (SNAPSHOT_VECTORS, en RAM) y
+# re-puntúa los SNAPSHOT_RERANK*k mejores con las filas float32 del mmap: en memoria
+# residente queda ~1/4 (int8) o ~1/2 (float16) de la matriz completa.
+#
+# Con GRAPH_SNAPSHOT_PATH definido y un `current` válido, graph_examples,
+# data_access_neo4j y embeddings_neo4j leen de aquí; si no, de Neo4j como siempre.
+# Cada réplica de la API lleva su copia local: escalar lecturas no escala la BD.
+
+SNAPSHOT_PATH = os.getenv("GRAPH_SNAPSHOT_PATH", "")
+SNAPSHOT_TOP_K = int(os.getenv("SNAPSHOT_TOP_K", "50"))      # ejemplos guardados por contexto
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "2"))         # snapshots antiguos conservados
+_CHECK_EVERY_S = float(os.getenv("SNAPSHOT_CHECK_S", "2"))   # cada cuánto se mira `current`
+_TOP_TRENDS = 12
+SNAPSHOT_VECTORS = os.getenv("SNAPSHOT_VECTORS", "int8").lower()  # int8 | float16 | float32
+SNAPSHOT_RERANK = int(os.getenv("SNAPSHOT_RERANK", "4"))            # candidatos = k * esto
+
+_SCHEMA = [
+    "CREATE TABLE contexts (niche TEXT, region TEXT, examples TEXT, trends TEXT, PRIMARY KEY (niche, region))",
+    "CREATE TABLE top_examples (niche TEXT PRIMARY KEY, rows TEXT)",
+    "CREATE TABLE trends (niche TEXT, region TEXT, keywords TEXT, PRIMARY KEY (niche, region))",
+    "CREATE TABLE lexicon (niche TEXT PRIMARY KEY, top_keywords TEXT, top_tags TEXT, vocab TEXT)",
+    "CREATE TABLE videos (row INTEGER PRIMARY KEY, videoId TEXT, title TEXT, engagement_rate REAL, "
+    "seconds REAL, publishedAt TEXT)",
+    "CREATE TABLE lexeme_nn (niche TEXT PRIMARY KEY, neighbors TEXT)",
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+# ----------------------------
+# Export (job "snapshot" / scripts/export_snapshot.py)
+# ----------------------------
+
+# Todas las tablas se indexan por Niche.id y leen lo que escribe scripts/neo4j_etl.py:
+# Video.id / Video.engagement y (TrendKeyword)-[:IN_NICHE]->(Niche); con coalesce para
+# grafos que traen videoId / engagement_rate.
+_LEXICON_QUERY = """
+MATCH (n:Niche)
+WHERE n.id IS NOT NULL
+RETURN n.id AS niche, n.top_keywords AS top_keywords, n.top_tags AS top_tags, n.vocab AS vocab
+"""
+
+_TOP_EXAMPLES_QUERY = """
+MATCH (v:Video)-[:IN_NICHE]->(n:Niche)
+WHERE n.id IS NOT NULL
+WITH n, v, coalesce(v.engagement_rate, v.engagement) AS er
+RETURN n.id AS niche, coalesce(v.videoId, v.id) AS videoId, v.title AS title, er AS engagement_rate,
+       v.seconds AS seconds, v.publishedAt AS publishedAt, v.region AS region,
+       coalesce(v.tags, [(v)-[:HAS_TAG]->(t:Tag) | coalesce(t.text, t.name)]) AS tags
+ORDER BY niche, coalesce(er, 0.0) DESC, coalesce(v.views, 0) DESC
+"""
+
+# Vecinos precalculados por scripts/embed_graph.py (services/term_expansion.py)
+_LEXEME_NN_QUERY = """
+MATCH (n:Niche)<-[:IN_NICHE]-(l:Lexeme)
+WHERE l.nn_terms IS NOT NULL
+RETURN n.id AS niche, l.text AS text, l.nn_terms AS terms, l.nn_scores AS scores
+"""
+
+_RANKINGS_QUERY = """
+MATCH (tr:TrendRanking)
+RETURN tr.niche AS niche, tr.region AS region, tr.keywords AS keywords
+"""
+
+_TREND_KEYWORDS_QUERY = """
+MATCH (t:TrendKeyword)-[:IN_NICHE]->(n:Niche)
+WHERE n.id IS NOT NULL AND t.keyword IS NOT NULL
+RETURN n.id AS niche, t.region AS region, t.keyword AS keyword, t.score AS score,
+       t.score_norm AS score_norm, t.timeframe AS timeframe, t.sources AS source
+ORDER BY coalesce(t.score_norm, 0.0) DESC
+"""
+
+_VIDEOS_QUERY = """
+MATCH (v:Video)
+WHERE v.embedding IS NOT NULL OR v.embedding_i8 IS NOT NULL
+RETURN coalesce(v.videoId, v.id) AS videoId, v.title AS title,
+       coalesce(v.engagement_rate, v.engagement) AS engagement_rate,
+       v.seconds AS seconds, v.publishedAt AS publishedAt, v.embedding AS embedding,
+       v.embedding_i8 AS embedding_i8, v.embedding_scale AS embedding_scale
+"""
+
+
+def _contexts_query() -> str:
+    """Payload de graph_examples por Niche.id (import tardío: graph_examples importa este módulo)."""
+    from services.graph_examples import _PAYLOAD_BODY
+
+    return """
+UNWIND $items AS it
+MATCH (n:Niche {id: it.niche})
+WITH it, n, it.region AS region
+""" + _PAYLOAD_BODY + """
+RETURN
+  it.niche  AS niche,
+  it.region AS region,
+  examples[..it.top_k] AS examples,
+  (CASE WHEN size(trends_ranked) > 0 THEN trends_ranked
+        WHEN size(trends_real) > 0 THEN trends_real
+        ELSE trends_fallback END)[..$top_trends] AS trends
+"""
+
+
+def _j(x: Any) -> str:
+    return dumps(x).decode("utf-8")
+
+
+def _as_example(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila de top_examples -> forma de los examples del payload de graph_examples."""
+    vid = row.get("videoId")
+    tags = [t for t in (row.get("tags") or []) if isinstance(t, str) and t.strip()]
+    return {"videoId": vid, "url": f"https://youtu.be/{vid}" if vid else None, "title": row.get("title"),
+            "publishedAt": row.get("publishedAt"),
+            "hashtags_for_examples": ["#" + t.strip().lower().replace(" ", "") for t in tags[:3]]}
+
+
+def _export_contexts(session, db: sqlite3.Connection, seen: Dict[str, Any], chunk: int = 200) -> int:
+    """
+    Un contexto por (Niche.id x regiones de sus TrendKeyword, más GL). Lo que el payload
+    de graph_examples no encuentre (sin Example/BELONGS_TO ni ranking) se completa con
+    los videos IN_NICHE de la región (o del nicho) y sus TrendKeyword por score_norm.
+    """
+    pairs = {(n, "GL"): None for n in seen["niches"]}
+    for niche, region in seen["keywords"]:
+        if region != "*":
+            pairs[(niche, region)] = None
+    items = [{"niche": n, "region": r, "top_k": SNAPSHOT_TOP_K} for n, r in pairs]
+    got: Dict[Tuple[str, str], Tuple[List[Any], List[Any]]] = {}
+    query = _contexts_query()
+    for i in range(0, len(items), chunk):
+        for r in session.run(query, items=items[i:i + chunk], top_trends=_TOP_TRENDS):
+            got[(r["niche"], r["region"])] = (r["examples"] or [], r["trends"] or [])
+    rows = []
+    for pair in pairs:
+        examples, trends = got.get(pair, ([], []))
+        if not examples:
+            videos = seen["examples"].get(pair) or seen["examples"].get((pair[0], "*")) or []
+            examples = [_as_example(v) for v in videos]
+        if not trends:
+            trends = (seen["keywords"].get(pair) or seen["keywords"].get((pair[0], "*")) or [])[:_TOP_TRENDS]
+        rows.append((pair[0], pair[1], _j(examples), _j(trends)))
+    db.executemany("INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def _export_data_access(session, db: sqlite3.Connection, seen: Dict[str, Any], per_niche: int = 100) -> Dict[str, int]:
+    """Tablas de data_access; deja en `seen` nichos, videos y keywords para _export_contexts."""
+    lex = [(r["niche"], _j(r["top_keywords"] or []), _j(r["top_tags"] or []), _j(r["vocab"] or []))
+           for r in session.run(_LEXICON_QUERY)]
+    db.executemany("INSERT OR REPLACE INTO lexicon VALUES (?, ?, ?, ?)", lex)
+    seen["niches"] = [row[0] for row in lex]
+
+    top: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    by_region: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for r in session.run(_TOP_EXAMPLES_QUERY):
+        row = {k: r[k] for k in ("videoId", "title", "engagement_rate", "seconds", "publishedAt", "tags")}
+        if len(top[r["niche"]]) < per_niche:
+            top[r["niche"]].append(row)
+        for key in ((r["niche"], (r["region"] or "GL").upper()), (r["niche"], "*")):
+            if len(by_region[key]) < SNAPSHOT_TOP_K:
+                by_region[key].append(row)
+    db.executemany("INSERT INTO top_examples VALUES (?, ?)", [(k, _j(v)) for k, v in top.items()])
+    seen["examples"] = by_region
+
+    # Trends: ranking precalculado y, donde no haya, keywords por score_norm (región o '*')
+    trends: Dict[Tuple[str, str], List[str]] = {}
+    for r in session.run(_RANKINGS_QUERY):
+        trends[(r["niche"], r["region"])] = [k for k in (r["keywords"] or []) if isinstance(k, str)]
+    keywords: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for r in session.run(_TREND_KEYWORDS_QUERY):
+        kw = {"keyword": r["keyword"], "score": r["score"], "score_norm": r["score_norm"],
+              "timeframe": r["timeframe"], "source": r["source"]}
+        for key in ((r["niche"], r["region"] or "*"), (r["niche"], "*")):
+            if len(keywords[key]) < per_niche:
+                keywords[key].append(kw)
+    for (niche, region), kws in keywords.items():
+        trends.setdefault(("~" + niche.strip().lower(), region), [k["keyword"] for k in kws])
+    db.executemany("INSERT OR REPLACE INTO trends VALUES (?, ?, ?)", [(n, r, _j(k)) for (n, r), k in trends.items()])
+    seen["keywords"] = keywords
+
+    nn: Dict[str, Dict[str, List[List[Any]]]] = defaultdict(dict)
+    for r in session.run(_LEXEME_NN_QUERY):
+        nn[r["niche"]][r["text"]] = [[t, float(sc)] for t, sc in zip(r["terms"] or [], r["scores"] or [])]
+    db.executemany("INSERT OR REPLACE INTO lexeme_nn VALUES (?, ?)", [(k, _j(v)) for k, v in nn.items()])
+    return {"lexicon": len(lex), "top_examples": len(top), "trends": len(trends), "lexeme_nn": len(nn)}
+
+
+def _export_videos(session, db: sqlite3.Connection, out: Path) -> int:
+    import numpy as np
+
+    from services.quantized_vectors import int8_from_bytes, quantize_int8
+
+    vecs: List[Any] = []
+    rows = []
+    dim = 0
+    for r in session.run(_VIDEOS_QUERY):
+        emb = r["embedding"] or []
+        if emb:
+            vec = np.asarray(emb, dtype=np.float32)
+        elif r.get("embedding_i8"):
+            # Grafo con EMBED_GRAPH_FORMAT=int8: el re-rank usa la reconstrucción
+            vec = int8_from_bytes(r["embedding_i8"], r.get("embedding_scale") or 1.0)
+        else:
+            continue
+        if dim and len(vec) != dim:
+            continue
+        dim = dim or len(vec)
+        rows.append((len(rows), r["videoId"], r["title"], r["engagement_rate"], r["seconds"],
+                     None if r["publishedAt"] is None else str(r["publishedAt"])))
+        vecs.append(vec)
+    db.executemany("INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?)", rows)
+    m = np.vstack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+    if len(m):
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        m = m / norms
+    m = np.ascontiguousarray(m, dtype=np.float32)
+    np.save(str(out / "embeddings.npy"), m)
+    q = quantize_int8(m) if len(m) else None
+    np.save(str(out / "embeddings_i8.npy"), q.codes if q else np.zeros((0, 0), dtype=np.int8))
+    np.save(str(out / "embeddings_scale.npy"), q.scales if q else np.zeros(0, dtype=np.float32))
+    np.save(str(out / "embeddings_f16.npy"), m.astype(np.float16))
+    return len(rows)
+
+
+def _swap_current(root: Path, target: Path) -> None:
+    """`current` -> target de forma atómica (symlink temporal + os.replace)."""
+    tmp = root / f".current.{os.getpid()}"
+    if tmp.is_symlink() or tmp.exists():
+        tmp.unlink()
+    os.symlink(target.name, tmp)
+    os.replace(tmp, root / "current")
+
+
+def _prune(root: Path, keep: int) -> None:
+    current = os.path.realpath(root / "current")
+    snaps = sorted(p for p in root.glob("snap-*") if p.is_dir() and not p.name.endswith(".tmp"))
+    for p in snaps[:-keep] if keep > 0 else snaps:
+        if os.path.realpath(p) != current:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+def export_snapshot(session=None, path: Optional[str] = None,
+                    progress: Optional[Callable[[int, int, str], None]] = None) -> Dict[str, Any]:
+    """Exporta el modelo de lectura a un snapshot nuevo y lo publica como `current`."""
+    root = Path(path or SNAPSHOT_PATH)
+    if not str(root):
+        raise ValueError("GRAPH_SNAPSHOT_PATH no definido")
+    root.mkdir(parents=True, exist_ok=True)
+    name = time.strftime("snap-%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+    work = root / f"{name}.tmp"
+    work.mkdir()
+
+    def run(sess) -> Dict[str, Any]:
+        db = sqlite3.connect(str(work / "read.sqlite"), isolation_level=None)
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute("BEGIN")
+        for q in _SCHEMA:
+            db.execute(q)
+        seen: Dict[str, Any] = {}
+        steps = [("data_access", lambda: _export_data_access(sess, db, seen)),
+                 ("contexts", lambda: _export_contexts(sess, db, seen)),
+                 ("videos", lambda: _export_videos(sess, db, work))]
+        counts: Dict[str, Any] = {}
+        for i, (step, fn) in enumerate(steps):
+            if progress:
+                progress(i, len(steps), step)
+            counts[step] = fn()
+        db.execute("INSERT INTO meta VALUES ('created_at', ?)", (str(time.time()),))
+        db.execute("COMMIT")
+        db.close()
+        return counts
+
+    try:
+        if session is None:
+            from services.neo4j_client import get_driver
+
+            with get_driver().session() as s:
+                counts = run(s)
+        else:
+            counts = run(session)
+        final = root / name
+        os.replace(work, final)
+        _swap_current(root, final)
+    except Exception:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    _prune(root, SNAPSHOT_KEEP)
+    return {"ok": True, "snapshot": str(final), **counts}
+
+# ----------------------------
+# Lectura
+# ----------------------------
+
+class _Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        self._tls = threading.local()
+        self._emb = None
+        self._vectors = None
+        self._emb_lock = threading.Lock()
+
+    def db(self) -> sqlite3.Connection:
+        conn = getattr(self._tls, "conn", None)
+        if conn is None:
+            # immutable=1: sin locks ni comprobaciones de WAL (el fichero nunca cambia)
+            uri = f"file:{os.path.join(self.path, 'read.sqlite')}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._tls.conn = conn
+        return conn
+
+    def one(self, sql: str, *args: Any) -> Optional[Tuple[Any, ...]]:
+        return self.db().execute(sql, args).fetchone()
+
+    def embeddings(self):
+        if self._emb is None:
+            import numpy as np
+
+            with self._emb_lock:
+                if self._emb is None:
+                    self._emb = np.load(os.path.join(self.path, "embeddings.npy"), mmap_mode="r")
+        return self._emb
+
+    def vectors(self):
+        """Copia compacta para la primera pasada (en RAM); el mmap float32 si no la hay."""
+        if self._vectors is None:
+            import numpy as np
+
+            from services.quantized_vectors import QuantizedMatrix
+
+            with self._emb_lock:
+                if self._vectors is None:
+                    f = lambda name: os.path.join(self.path, name)
+                    if SNAPSHOT_VECTORS == "int8" and os.path.exists(f("embeddings_i8.npy")):
+                        self._vectors = QuantizedMatrix(np.load(f("embeddings_i8.npy")), np.load(f("embeddings_scale.npy")))
+                    elif SNAPSHOT_VECTORS == "float16" and os.path.exists(f("embeddings_f16.npy")):
+                        self._vectors = np.load(f("embeddings_f16.npy"))
+                    else:
+                        self._vectors = False
+        return self._vectors
+
+
+_CURRENT: Dict[str, Any] = {"checked": 0.0, "target": None, "snap": None}
+_CURRENT_LOCK = threading.Lock()
+
+
+def current() -> Optional[_Snapshot]:
+    """Snapshot publicado o None (sin GRAPH_SNAPSHOT_PATH o sin `current`). Barato por request."""
+    if not SNAPSHOT_PATH:
+        return None
+    now = time.monotonic()
+    if now - _CURRENT["checked"] < _CHECK_EVERY_S:
+        return _CURRENT["snap"]
+    with _CURRENT_LOCK:
+        _CURRENT["checked"] = now
+        try:
+            target = os.path.realpath(os.path.join(SNAPSHOT_PATH, "current"), strict=True)
+        except (OSError, TypeError):
+            target = None
+        if target != _CURRENT["target"]:
+            # Swap detectado: las consultas en curso terminan con el objeto viejo
+            _CURRENT["target"] = target
+            _CURRENT["snap"] = _Snapshot(target) if target else None
+    return _CURRENT["snap"]
+
+
+def version() -> str:
+    """Identifica el snapshot activo (para claves de caché); '' sin snapshot."""
+    snap = current()
+    return os.path.basename(snap.path) if snap else ""
+
+
+def context(niche: str, region: str, top_k: int) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """(examples, trends) del par; None sin snapshot o si el par no está exportado (-> Neo4j)."""
+    snap = current()
+    if snap is None:
+        return None
+    row = snap.one("SELECT examples, trends FROM contexts WHERE niche=? AND region=?",
+                   (niche or "").strip().lower(), (region or "GL").strip().upper())
+    if row is None:
+        return None
+    return json.loads(row[0])[:top_k], json.loads(row[1])
+
+
+def top_examples(niche: str, k: int) -> Optional[List[Dict[str, Any]]]:
+    snap = current()
+    if snap is None:
+        return None
+    row = snap.one("SELECT rows FROM top_examples WHERE niche=?", (niche or "").strip().lower())
+    return json.loads(row[0])[:k] if row else []
+
+
+def top_trends(niche: str, region: Optional[str], k: int) -> Optional[List[str]]:
+    snap = current()
+    if snap is None:
+        return None
+    # Como data_access: ranking de la región y, sin él, sus keywords por score_norm;
+    # después el ranking global (GL) y todas las keywords del nicho ('*')
+    n = (niche or "").strip().lower()
+    keys = [(n, region or "GL"), ("~" + n, region or "*"), (n, "GL"), ("~" + n, "*")]
+    for key in dict.fromkeys(keys):
+        row = snap.one("SELECT keywords FROM trends WHERE niche=? AND region=?", *key)
+        if row:
+            return json.loads(row[0])[:k]
+    return []
+
+
+def lexicon(niche: str) -> Optional[Dict[str, Any]]:
+    snap = current()
+    if snap is None:
+        return None
+    row = snap.one("SELECT top_keywords, top_tags, vocab FROM lexicon WHERE niche=?", (niche or "").strip().lower())
+    if not row:
+        return {"top_keywords": [], "top_tags": [], "vocab": []}
+    return {"top_keywords": json.loads(row[0]), "top_tags": json.loads(row[1]), "vocab": json.loads(row[2])}
+
+
+def lexeme_neighbors(niche: str) -> Optional[Dict[str, List[List[Any]]]]:
+    snap = current()
+    if snap is None:
+        return None
+    try:
+        row = snap.one("SELECT neighbors FROM lexeme_nn WHERE niche=?", niche)
+    except sqlite3.OperationalError:
+        # snapshot exportado antes de existir la tabla
+        return None
+    return json.loads(row[0]) if row else {}
+
+
+def vector_search(vec: Any, k: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Top-k por coseno: primera pasada sobre la copia cuantizada y re-rank exacto
+    float32 de los candidatos. Mismo formato que embeddings_neo4j.vector_search.
+    """
+    snap = current()
+    if snap is None:
+        return None
+    from services.quantized_vectors import search
+
+    m = snap.embeddings()
+    if not len(m):
+        return []
+    compact = snap.vectors()
+    if compact is False:
+        top, scores = search(vec, m, k)
+    else:
+        top, scores = search(vec, compact, k, exact=m, rerank=SNAPSHOT_RERANK)
+    out = []
+    for i, score in zip(top.tolist(), scores.tolist()):
+        row = snap.one("SELECT videoId, title, engagement_rate, seconds, publishedAt FROM videos WHERE row=?", i)
+        if row:
+            # score en [0, 1] como el índice vectorial de Neo4j (coseno)
+            out.append({"videoId": row[0], "title": row[1], "engagement_rate": row[2], "seconds": row[3],
+                        "publishedAt": row[4], "score": (score + 1) / 2})
+    return out
@@ -0,0 +1,157 @@
+# app/services/term_expansion.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from services import snapshot
+from services.neo4j_client import get_driver
+from services.shared_store import SharedCache
+from services.text_norm import normalize_token, vocab_tokens
+
+# ----------------------------
+# Expansión de especialidades por vecinos semánticos precalculados
+# ----------------------------
+# scripts/embed_graph.py guarda en cada Lexeme sus vecinos (coseno sobre embeddings
+# de lexemas + TrendKeywords del mismo nicho) como l.nn_terms / l.nn_scores. Aquí
+# solo se consulta esa tabla: nada de llamadas al modelo por request.
+#
+# Una especialidad se liga a lexemas por texto exacto o por tokens compartidos
+# (índice invertido por nicho); sus vecinos puntúan sim * solapamiento de tokens. Las
+# formas morfológicas de siempre (singular, partes con guion) van primero.
+
+EXPAND_K = int(os.getenv("EXPAND_K", "8"))
+EXPAND_MIN_SIM = float(os.getenv("EXPAND_MIN_SIM", "0.55"))
+_DATA_VERSION = os.getenv("DATA_VERSION", "")
+
+_LEXEME_NN_QUERY = """
+MATCH (:Niche {id:$niche})<-[:IN_NICHE]-(l:Lexeme)
+WHERE l.nn_terms IS NOT NULL
+RETURN l.text AS text, l.nn_terms AS terms, l.nn_scores AS scores
+"""
+
+# Tabla por nicho compartida entre workers; el índice construido vive en cada proceso
+_NN_CACHE = SharedCache("lexnn", ttl=float(os.getenv("LEXEME_NN_CACHE_TTL", "3600")))
+
+
+class NeighborIndex(NamedTuple):
+    neighbors: Dict[str, Tuple[Tuple[str, float], ...]]   # lexema normalizado -> vecinos
+    by_token: Dict[str, Tuple[str, ...]]                    # token -> lexemas que lo contienen
+    sizes: Dict[str, int]                                   # lexema -> nº de tokens
+
+
+_INDEX_MAX = 256
+_INDEX_TTL_S = 300.0
+_INDEX: "OrderedDict[Tuple[str, str], Tuple[float, NeighborIndex]]" = OrderedDict()
+_INDEX_LOCK = threading.Lock()
+
+
+def _fetch_table(niche: str) -> Dict[str, List[List[Any]]]:
+    table = snapshot.lexeme_neighbors(niche)
+    if table is not None:
+        return table
+    out: Dict[str, List[List[Any]]] = {}
+    with get_driver().session() as s:
+        for r in s.run(_LEXEME_NN_QUERY, niche=niche):
+            out[r["text"]] = [[t, float(sc)] for t, sc in zip(r["terms"] or [], r["scores"] or [])]
+    return out
+
+
+def _singular(tok: str) -> str:
+    return tok[:-1] if len(tok) > 3 and tok.endswith("s") else tok
+
+
+def _build_index(table: Dict[str, List[List[Any]]]) -> NeighborIndex:
+    neighbors: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+    by_token: Dict[str, List[str]] = {}
+    sizes: Dict[str, int] = {}
+    for text, nn in table.items():
+        key = normalize_token(text)
+        if not key:
+            continue
+        neighbors[key] = tuple((t, float(s)) for t, s in nn)
+        toks = {_singular(w) for w in vocab_tokens(key)}
+        sizes[key] = len(toks)
+        for tok in toks:
+            by_token.setdefault(tok, []).append(key)
+    return NeighborIndex(neighbors, {t: tuple(v) for t, v in by_token.items()}, sizes)
+
+
+def neighbor_index(niche: str) -> NeighborIndex:
+    niche = (niche or "").strip().lower()
+    version = f"{_DATA_VERSION}{snapshot.version()}"
+    key = (niche, version)
+    now = time.monotonic()
+    hit = _INDEX.get(key)
+    if hit is not None and now - hit[0] < _INDEX_TTL_S:
+        return hit[1]
+    try:
+        table = _NN_CACHE.get_or_set(f"{version}|{niche}", lambda: _fetch_table(niche))
+    except Exception:
+        # sin grafo ni snapshot: se expande solo por morfología
+        table = {}
+    idx = _build_index(table)
+    with _INDEX_LOCK:
+        _INDEX[key] = (now, idx)
+        _INDEX.move_to_end(key)
+        while len(_INDEX) > _INDEX_MAX:
+            _INDEX.popitem(last=False)
+    return idx
+
+
+def clear_cache() -> None:
+    _NN_CACHE.clear()
+    with _INDEX_LOCK:
+        _INDEX.clear()
+
+
+def _morph_forms(n: str) -> List[str]:
+    forms = [n]
+    if n.endswith("s"):
+        forms.append(n[:-1])
+    if "-" in n:
+        forms.extend(p for p in n.split("-") if p)
+    return forms
+
+
+def expand_terms(niche: str, terms: List[str], k: int = EXPAND_K) -> List[str]:
+    """
+    Especialidades + sus formas morfológicas + hasta k términos vecinos del nicho
+    (lookup en la tabla precalculada; sin embeddings en el request).
+    """
+    base: List[str] = []
+    for t in terms or []:
+        n = normalize_token(t)
+        if n:
+            base.extend(f for f in _morph_forms(n) if f not in base)
+    if not base:
+        return []
+
+    idx = neighbor_index(niche)
+    scores: Dict[str, float] = {}
+    if idx.neighbors:
+        for t in terms or []:
+            n = normalize_token(t)
+            toks = {_singular(w) for w in vocab_tokens(n)}
+            if n in idx.neighbors:
+                matches = {n: 1.0}
+            else:
+                # lexemas que comparten tokens con la especialidad (singular/plural indistinto)
+                hits: Dict[str, int] = {}
+                for tok in toks:
+                    for lex in idx.by_token.get(tok, ()):
+                        hits[lex] = hits.get(lex, 0) + 1
+                # cobertura de la especialidad, con menos peso si el lexema es mucho más largo
+                matches = {lex: c / len(toks) * (0.5 + 0.5 * c / idx.sizes[lex]) for lex, c in hits.items()}
+            for lex, overlap in matches.items():
+                if lex != n and overlap >= EXPAND_MIN_SIM:
+                    scores[lex] = max(scores.get(lex, 0.0), overlap)
+                for term, sim in idx.neighbors.get(lex, ()):
+                    s = sim * overlap
+                    if s >= EXPAND_MIN_SIM:
+                        scores[term] = max(scores.get(term, 0.0), s)
+
+    seen = set(base)
+    extra = [t for t, _ in sorted(scores.items(), key=lambda x: (-x[1], x[0])) if t not in seen][:k]
+    return base + extra
@@ -0,0 +1,78 @@
+# app/services/text_norm.py
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+# ----------------------------
+# Normalización de texto compartida (tildes, tokens, hashtags)
+# ----------------------------
+# Todas las variantes hacen lower() + quitar tildes y UNA sola pasada de regex
+# precompilada (findall de los tramos válidos en lugar de sub + colapsar espacios).
+# Las funciones están memoizadas: los títulos de ejemplo y los hashtags se repiten
+# mucho entre requests.
+#
+# Nota: para solo 6 caracteres, la cadena de .replace() (C, sin coincidencias en
+# texto ascii) mide 3-10x más rápida que str.translate con tabla en CPython 3.11,
+# por eso fold() la conserva, definida una única vez aquí.
+
+_ALNUM_RUN = re.compile(r"[a-z0-9]+")
+_TOKEN_RUN = re.compile(r"[a-z0-9\-]+")
+_NON_HASHTAG = re.compile(r"[^#a-z0-9_]")
+_NON_HASHTAG_BODY = re.compile(r"[^a-z0-9_]")
+
+_CACHE_SIZE = 65536
+
+
+def fold(s: str) -> str:
+    """lower() + tildes/ñ -> ascii."""
+    s = (s or "").lower()
+    if s.isascii():
+        return s
+    return (s.replace("á", "a").replace("é", "e").replace("í", "i")
+             .replace("ó", "o").replace("ú", "u").replace("ñ", "n"))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def normalize_token(s: str) -> str:
+    """Texto a tokens ascii separados por un espacio (conserva guiones)."""
+    return " ".join(_TOKEN_RUN.findall(fold(s)))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def normalize_words(s: str) -> str:
+    """Texto a palabras ascii alfanuméricas separadas por un espacio."""
+    return " ".join(_ALNUM_RUN.findall(fold(s)))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def vocab_tokens(text: str) -> Tuple[str, ...]:
+    """Tokens de >= 3 caracteres para vocabulario de hashtags."""
+    return tuple(w for w in _ALNUM_RUN.findall(fold(text)) if len(w) >= 3)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def hashtag(tag: str) -> str:
+    """'Mecánica Pro' -> '#mecanicapro'."""
+    t = (tag or "").strip().lower()
+    if not t.startswith("#"):
+        t = "#" + t
+    return _NON_HASHTAG.sub("", fold(t))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def hashtag_candidate(token: str) -> str:
+    """Token suelto a hashtag ('' si no queda nada utilizable)."""
+    t = _NON_HASHTAG_BODY.sub("", fold(token))
+    return f"#{t}" if t else ""
+
+
+# ----------------------------
+# API por lotes
+# ----------------------------
+
+def normalize_many(texts: Iterable[str]) -> List[str]:
+    return [normalize_token(t) for t in texts]
+
+
+def vocab_tokens_many(texts: Iterable[str]) -> List[Tuple[str, ...]]:
+    return [vocab_tokens(t) for t in texts]
@@ -0,0 +1,103 @@
+# app/services/vocab_matcher.py
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+# ----------------------------
+# Matcher de vocabulario (trie de prefijos + autómata Aho–Corasick)
+# ----------------------------
+
+class VocabMatcher:
+    """
+    Vocabulario compilado para validar hashtags en tiempo independiente de su tamaño.
+      - exacto:     `root in m`
+      - prefijo:    m.has_prefix_in(root)  -> alguna palabra es prefijo de root
+      - subcadena:  m.has_substring_in(root) -> alguna palabra aparece dentro de root
+    Solo las palabras con len >= min_len participan en prefijo/subcadena (igual que
+    el filtro original `len(v) >= 4`). `parent` permite encadenar un vocab base
+    cacheado (glosario del nicho) con uno pequeño por request (specialties, ideas).
+    """
+
+    def __init__(self, words: Iterable[str], min_len: int = 4, parent: Optional["VocabMatcher"] = None):
+        self.words: FrozenSet[str] = frozenset(w for w in words if w)
+        self.min_len = min_len
+        self.parent = parent
+        # Trie: goto[nodo][char] -> nodo; term = fin de palabra; hit = term en la cadena de fallos
+        self._goto: List[Dict[str, int]] = [{}]
+        self._term: List[bool] = [False]
+        for w in self.words:
+            if len(w) >= min_len:
+                self._insert(w)
+        self._fail: List[int] = [0] * len(self._goto)
+        self._hit: List[bool] = list(self._term)
+        self._build_failure_links()
+
+    def _insert(self, word: str) -> None:
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._term.append(False)
+            node = nxt
+        self._term[node] = True
+
+    def _build_failure_links(self) -> None:
+        goto, fail, hit = self._goto, self._fail, self._hit
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                hit[nxt] = hit[nxt] or hit[fail[nxt]]
+                queue.append(nxt)
+
+    def __contains__(self, word: object) -> bool:
+        if word in self.words:
+            return True
+        return self.parent is not None and word in self.parent
+
+    def __len__(self) -> int:
+        return len(self.words) + (len(self.parent) if self.parent is not None else 0)
+
+    def __iter__(self):
+        yield from self.words
+        if self.parent is not None:
+            yield from self.parent
+
+    def has_prefix_in(self, text: str) -> bool:
+        goto, term = self._goto, self._term
+        node = 0
+        for ch in text:
+            node = goto[node].get(ch, -1)
+            if node < 0:
+                break
+            if term[node]:
+                return True
+        return self.parent is not None and self.parent.has_prefix_in(text)
+
+    def has_substring_in(self, text: str) -> bool:
+        goto, fail, hit = self._goto, self._fail, self._hit
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if hit[node]:
+                return True
+        return self.parent is not None and self.parent.has_substring_in(text)
+
+    def allows(self, root: str) -> bool:
+        """Equivale a `root in vocab or any(root.startswith(v) or v in root ...)`."""
+        return root in self or self.has_substring_in(root)
+
+
+@lru_cache(maxsize=512)
+def compile_vocab(words: FrozenSet[str], min_len: int = 4) -> VocabMatcher:
+    """Matcher cacheado para vocabularios estables (p.ej. el del índice por nicho)."""
+    return VocabMatcher(words, min_len=min_len)
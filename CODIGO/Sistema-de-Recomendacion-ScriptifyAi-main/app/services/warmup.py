@@ -0,0 +1,228 @@
+# app/services/warmup.py
+import csv
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.graph_examples import _DATA_VERSION, build_llm_context, get_context_for_llm, get_contexts_for_llm
+from services.shared_store import SharedCache
+
+# ----------------------------
+# Warm-up de cachés para los nichos con tráfico
+# ----------------------------
+# Recorre los pares (nicho, región) del lexicon pack y deja calientes:
+#   1) el contexto de Neo4j (caché compartida "ctx" de graph_examples)
+#   2) el índice de nicho (glosario + vocab de hashtags) de cada worker
+#   3) opcional: un borrador base de llm_recommend por foco en la caché de respuestas
+#
+# El paso 3 habla con el servidor del modelo: va con su propio límite de
+# concurrencia y un rate limit (peticiones/segundo) para no saturarlo.
+
+_APP_DIR = Path(__file__).resolve().parents[1]
+WARMUP_LEXICON = os.getenv("WARMUP_LEXICON") or str(
+    _APP_DIR.parent / "data" / "DATASETS USADOS" / "niche_lexicon_pack.csv"
+)
+
+# Caché de borradores de llm_recommend (RESPONSE_CACHE_TTL=0 la desactiva: por defecto off)
+RESPONSE_CACHE = SharedCache("resp", ttl=float(os.getenv("RESPONSE_CACHE_TTL", "0")))
+
+FOCUSES = ("discovery", "retention", "conversion")
+DRAFT_TEMPERATURE = 0.7   # la de los borradores base (y la por defecto de /recommend/llm)
+_CONTEXT_CHUNK = int(os.getenv("WARMUP_CONTEXT_CHUNK", "50"))
+
+# Perfiles de métricas que decide_focus clasifica en cada foco
+_BASELINE_INPUTS: Dict[str, Dict[str, Any]] = {
+    "discovery": {"impressions": 1500, "reach": 300, "followers": 5000, "clicks": 15,
+                  "likes": 60, "comments": 10, "shares": 5, "saves": 8},
+    "retention": {"impressions": 20000, "reach": 15000, "followers": 5000, "clicks": 600, "conversions": 40,
+                  "likes": 100, "comments": 10, "shares": 5, "saves": 8, "avg_watch_pct": 0.18},
+    "conversion": {"impressions": 20000, "reach": 15000, "followers": 5000, "clicks": 900, "conversions": 3,
+                   "likes": 4000, "comments": 500, "shares": 400, "saves": 600, "avg_watch_pct": 0.5},
+}
+
+# ----------------------------
+# Pares calientes
+# ----------------------------
+
+def hot_pairs(path: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    (nicho, región) a precalentar. WARMUP_PAIRS="fitness:ES,cocina:MX" tiene prioridad
+    sobre el CSV (útil en el contenedor, que no lleva data/).
+    """
+    env_pairs = os.getenv("WARMUP_PAIRS", "").strip()
+    pairs: List[Tuple[str, str]] = []
+    if env_pairs:
+        for item in env_pairs.split(","):
+            niche, _, region = item.strip().partition(":")
+            if niche:
+                pairs.append((niche.lower(), (region or "GL").upper()))
+    else:
+        p = Path(path or WARMUP_LEXICON)
+        if not p.exists():
+            return []
+        with p.open(encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                niche = (row.get("niche") or "").strip().lower()
+                if niche:
+                    pairs.append((niche, (row.get("region") or "GL").strip().upper() or "GL"))
+    seen = set()
+    out = [pr for pr in pairs if not (pr in seen or seen.add(pr))]
+    return out[:limit] if limit else out
+
+# ----------------------------
+# Rate limit (token bucket)
+# ----------------------------
+
+class RateLimiter:
+    """Token bucket thread-safe: como mucho `rate` adquisiciones por segundo (ráfaga = burst)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# ----------------------------
+# Caché de respuestas
+# ----------------------------
+
+def draft_key(niche: str, region: Optional[str], platform: Optional[str], focus: str, top_k: int,
+              specialties: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Clave de la caché de borradores; None si la caché está desactivada. Solo
+    warm_responses escribe en ella (borradores base, sin métricas de ningún usuario).
+    """
+    if RESPONSE_CACHE.ttl <= 0:
+        return None
+    spec = ",".join(sorted((s or "").strip().lower() for s in (specialties or []) if s))
+    return "|".join([_DATA_VERSION, (niche or "").strip().lower(), (region or "GL").strip().upper(),
+                     (platform or "").strip().lower(), focus or "", str(int(top_k)), spec])
+
+
+def baseline_inputs(niche: str, region: str, platform: Optional[str], focus: str, top_k: int = 10) -> Dict[str, Any]:
+    """Inputs como los arma /recommend/llm, con el perfil de métricas del foco."""
+    return {
+        "platform": platform, "niche": niche, "region": region, "format": None,
+        **{f: None for f in ("ctr", "retention", "avg_watch_pct", "completion_rate", "followers_change", "freq")},
+        **_BASELINE_INPUTS[focus],
+        "specialties": [], "use_graph": True, "top_k": top_k, "focus_hint": focus,
+    }
+
+# ----------------------------
+# Warm-up
+# ----------------------------
+
+Progress = Callable[[int, int], None]
+
+
+def _parallel(fn: Callable[[Any], Any], items: List[Any], concurrency: int,
+              progress: Optional[Progress], should_cancel: Optional[Callable[[], bool]],
+              offset: int = 0, total: Optional[int] = None) -> Dict[str, int]:
+    total = total if total is not None else len(items)
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="warmup") as ex:
+        futures = set()
+        # Ventana acotada: no encolamos más de `concurrency` tareas a la vez
+        for item in items:
+            if should_cancel and should_cancel():
+                break
+            futures.add(ex.submit(fn, item))
+            if len(futures) >= concurrency:
+                fut = next(as_completed(futures))
+                futures.discard(fut)
+                done, failed = done + 1, failed + (fut.exception() is not None)
+                if progress:
+                    progress(offset + done, total)
+        for fut in as_completed(futures):
+            done, failed = done + 1, failed + (fut.exception() is not None)
+            if progress:
+                progress(offset + done, total)
+    return {"done": done, "failed": failed}
+
+
+def warm_contexts(pairs: List[Tuple[str, str]], k: int = 10, concurrency: int = 4,
+                  progress: Optional[Progress] = None, should_cancel: Optional[Callable[[], bool]] = None,
+                  offset: int = 0, total: Optional[int] = None) -> Dict[str, int]:
+    # Bloques de pares resueltos con una sola query UNWIND (get_contexts_for_llm)
+    chunks = [pairs[i:i + _CONTEXT_CHUNK] for i in range(0, len(pairs), _CONTEXT_CHUNK)]
+    total = total if total is not None else len(pairs)
+    done = [offset]
+    lock = threading.Lock()
+
+    def one(chunk: List[Tuple[str, str]]) -> None:
+        ctxs = get_contexts_for_llm([(n, r, k) for n, r in chunk])
+        # Deja también calculado el índice de nicho de este worker
+        for (niche, region), ctx in ctxs.items():
+            build_llm_context(niche, [], None, k, region, preset_examples=ctx.get("examples") or [])
+        with lock:
+            done[0] += len(chunk)
+            if progress:
+                progress(done[0], total)
+
+    res = _parallel(one, chunks, concurrency, None, should_cancel)
+    return {"done": done[0] - offset, "failed_chunks": res["failed"]}
+
+
+def warm_responses(pairs: List[Tuple[str, str]], platforms: Iterable[str] = ("youtube",),
+                   focuses: Iterable[str] = FOCUSES, k: int = 10, concurrency: int = 1, rate: float = 0.5,
+                   progress: Optional[Progress] = None, should_cancel: Optional[Callable[[], bool]] = None,
+                   offset: int = 0, total: Optional[int] = None) -> Dict[str, int]:
+    from services.llm_ollama import llm_recommend
+
+    limiter = RateLimiter(rate)
+    items = [(n, r, p, f) for n, r in pairs for p in platforms for f in focuses]
+
+    def one(item: Tuple[str, str, str, str]) -> None:
+        niche, region, platform, focus = item
+        key = draft_key(niche, region, platform, focus, k)
+        if key is None or RESPONSE_CACHE.get(key) is not None:
+            return
+        ctx = get_context_for_llm(niche=niche, region=region, k=k)
+        limiter.acquire()
+        draft = llm_recommend(focus="", niche=niche, metrics={"inputs": baseline_inputs(niche, region, platform, focus, k)},
+                              examples=ctx.get("examples") or [], neighbors=[], temperature=DRAFT_TEMPERATURE,
+                              trends=ctx.get("trends") or [])
+        RESPONSE_CACHE.set(key, draft)
+
+    return _parallel(one, items, concurrency, progress, should_cancel, offset, total)
+
+
+def run_warmup(limit: Optional[int] = None, k: int = 10, responses: bool = False,
+               platforms: Iterable[str] = ("youtube",),
+               concurrency: int = int(os.getenv("WARMUP_CONCURRENCY", "4")),
+               llm_concurrency: int = int(os.getenv("WARMUP_LLM_CONCURRENCY", "1")),
+               llm_rate: float = float(os.getenv("WARMUP_LLM_RPS", "0.5")),
+               progress: Optional[Progress] = None,
+               should_cancel: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    pairs = hot_pairs(limit=limit)
+    platforms = list(platforms)
+    do_resp = bool(responses) and RESPONSE_CACHE.ttl > 0
+    total = len(pairs) + (len(pairs) * len(platforms) * len(FOCUSES) if do_resp else 0)
+    t0 = time.time()
+    out: Dict[str, Any] = {"pairs": len(pairs)}
+    out["contexts"] = warm_contexts(pairs, k, concurrency, progress, should_cancel, 0, total)
+    if do_resp and not (should_cancel and should_cancel()):
+        out["responses"] = warm_responses(pairs, platforms, FOCUSES, k, llm_concurrency, llm_rate,
+                                          progress, should_cancel, len(pairs), total)
+    elif responses:
+        out["responses"] = "skipped (RESPONSE_CACHE_TTL=0)"
+    out["seconds"] = round(time.time() - t0, 3)
+    return out
@@ -0,0 +1,48 @@
+# bench/_util.py
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = ROOT / "app"
+DATA_DIR = ROOT / "data" / "DATASETS USADOS"
+
+# Los módulos de la API se importan como en el contenedor (PYTHONPATH=/app)
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+csv.field_size_limit(10 ** 7)
+
+
+def read_csv(name: str) -> List[Dict[str, str]]:
+    with open(DATA_DIR / name, newline="", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
+
+
+def youtube_titles() -> List[str]:
+    return [r["title"] for r in read_csv("youtube_merged_clean.csv") if r.get("title")]
+
+
+def lexicon_terms() -> List[str]:
+    out: List[str] = []
+    for r in read_csv("niche_lexicon_pack.csv"):
+        for col in ("top_keywords", "top_tags", "vocab"):
+            out.extend(t.strip() for t in (r.get(col) or "").split("|") if t.strip())
+    return out
+
+
+def best_of(fn: Callable[[], object], number: int = 100, repeat: int = 5) -> float:
+    """Mejor tiempo medio por llamada (segundos) en `repeat` rondas de `number` llamadas."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def fmt_us(sec: float) -> str:
+    return f"{sec * 1e6:10.1f} µs"
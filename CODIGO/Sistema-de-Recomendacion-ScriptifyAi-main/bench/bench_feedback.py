@@ -0,0 +1,91 @@
+# bench/bench_feedback.py
+"""
+Ingesta de feedback (services/feedback.py) sin Neo4j:
+
+  - latencia de record_like() en el camino de la request (p50/p99, solo encolar)
+  - throughput del escritor por lotes hasta tener todo en SQLite (WAL)
+  - volcado write-behind al grafo (UNWIND agregado) contra una sesión falsa
+  - lectura de agregados por (nicho, región) para el constructor de contexto
+
+    python bench/bench_feedback.py [--likes 50000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from _util import fmt_us, youtube_titles
+
+# Base aislada y sin hilo de volcado periódico: el volcado se mide aparte
+os.environ.setdefault("FEEDBACK_DB", os.path.join(tempfile.mkdtemp(prefix="scriptify-fb-"), "feedback.sqlite"))
+os.environ["FEEDBACK_GRAPH_FLUSH_S"] = "0"
+
+from services import feedback  # noqa: E402
+
+
+class CountingSession:
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+
+    def run(self, query, **params):
+        self.calls += 1
+        self.rows += len(params.get("rows") or [])
+        return self
+
+    def consume(self):
+        return None
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100.0 * len(xs)))]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--likes", type=int, default=50000)
+    args = ap.parse_args()
+
+    rng = random.Random(3)
+    titles = youtube_titles()
+    pairs = [(n, r) for n in ("fitness", "automotriz", "cocina", "tecnologia") for r in ("ES", "MX", "US")]
+    items = [(rng.choice(pairs), rng.choice(titles)) for _ in range(args.likes)]
+
+    feedback.start()
+    lat = []
+    t0 = time.perf_counter()
+    for (niche, region), idea in items:
+        s = time.perf_counter()
+        feedback.record_like(niche, idea, region=region)
+        lat.append(time.perf_counter() - s)
+    enq = time.perf_counter() - t0
+    while feedback.stats()["stored"] < args.likes:
+        time.sleep(0.01)
+    total = time.perf_counter() - t0
+    print(f"record_like      p50 {fmt_us(pct(lat, 50))}  p99 {fmt_us(pct(lat, 99))}  ({args.likes / enq:,.0f} likes/s encolando)")
+    print(f"en SQLite        {args.likes:,} likes en {total:.2f} s -> {args.likes / total:,.0f} likes/s")
+
+    sess = CountingSession()
+    t0 = time.perf_counter()
+    likes = 0
+    while True:
+        res = feedback.flush_to_graph(session=sess)
+        if not res.get("likes"):
+            break
+        likes += res["likes"]
+    dt = time.perf_counter() - t0
+    print(f"volcado al grafo {likes:,} likes -> {sess.rows:,} filas en {sess.calls} UNWIND, {dt * 1000:.0f} ms")
+
+    feedback.token_weights("fitness", "ES")
+    n = 100000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        feedback.token_weights("fitness", "ES")
+    print(f"token_weights    {fmt_us((time.perf_counter() - t0) / n)} (en caché)")
+    feedback.shutdown(flush_graph=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench/bench_hedge.py
+"""
+Benchmark: latencia de cola de llm_recommend con generación secuencial vs con
+cobertura (LLM_HEDGE=hedge) vs carrera de N candidatos (LLM_HEDGE=race).
+
+Usa el Ollama simulado de stubs.py con una cola lenta (--tail-prob de las
+generaciones tardan --tail-factor veces más) y, con --backends 2, dos servidores
+como LLM_BACKENDS. Por modo: p50/p95/p99 de la petición completa y carga extra
+sobre el modelo (generaciones lanzadas, canceladas y tokens emitidos por petición).
+
+    python bench/bench_hedge.py [--requests 200] [--concurrency 4] [--tail-prob 0.1] [--tail-factor 6]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from _util import ROOT  # noqa: F401  (sys.path -> app/)
+from stubs import OllamaStub, install_stubs
+
+
+def pct(vals: List[float], p: float) -> float:
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(round((len(s) - 1) * p / 100.0)))] if s else 0.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--tokens-per-s", type=float, default=2000.0)
+    ap.add_argument("--tail-prob", type=float, default=0.1)
+    ap.add_argument("--tail-factor", type=float, default=6.0)
+    ap.add_argument("--backends", type=int, default=2)
+    ap.add_argument("--modes", default="off,hedge,race")
+    args = ap.parse_args()
+
+    stubs = [OllamaStub(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s, tail_prob=args.tail_prob,
+                        tail_factor=args.tail_factor, seed=11 + i).start() for i in range(max(1, args.backends))]
+    os.environ["LLM_BACKENDS"] = ",".join(s.url for s in stubs)
+    os.environ.setdefault("LLM_HEDGE_AFTER_MS", "400")
+    install_stubs(stubs[0], query_delay_ms=0)
+
+    from services import llm_pool
+    from services.graph_examples import get_context_for_llm
+    from services.llm_ollama import llm_recommend
+
+    niches = [("fitness", "ES"), ("cocina", "MX"), ("gaming", "US"), ("finanzas", "ES")]
+    ctxs = {n: get_context_for_llm(n[0], n[1], k=10) for n in niches}
+
+    def one(i: int) -> float:
+        niche, region = niches[i % len(niches)]
+        inputs = {"platform": "youtube", "niche": niche, "region": region, "top_k": 10,
+                  "specialties": [], "focus_hint": "discovery", "ctr": 0.03}
+        ctx = ctxs[(niche, region)]
+        t0 = time.perf_counter()
+        llm_recommend("", niche, {"inputs": inputs}, ctx["examples"], trends=ctx["trends"])
+        return time.perf_counter() - t0
+
+    print(f"{args.requests} peticiones, concurrencia {args.concurrency}, {len(stubs)} backend(s), "
+          f"cola {args.tail_prob:.0%} x{args.tail_factor:g}")
+    print(f"{'modo':<8} | {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} | {'gen/req':>7} {'cancel':>6} {'tok/req':>8}")
+    for mode in args.modes.split(","):
+        llm_pool.HEDGE_MODE = mode
+        llm_pool.reset_stats()
+        for s in stubs:
+            s.calls.clear()
+            s.cancelled = 0
+            s.tokens_generated = 0
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            list(ex.map(one, range(min(20, args.requests))))  # historial para el plazo del hedge
+        for s in stubs:
+            s.calls.clear()
+            s.cancelled = 0
+            s.tokens_generated = 0
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            lat = list(ex.map(one, range(args.requests)))
+        time.sleep(0.2)  # que los perdedores terminen de cortar
+        gens = sum(s.calls.get("/api/generate", 0) + s.calls.get("/api/chat", 0) for s in stubs)
+        cancelled = sum(s.cancelled for s in stubs)
+        toks = sum(s.tokens_generated for s in stubs)
+        n = len(lat)
+        print(f"{mode:<8} | {pct(lat, 50) * 1e3:8.1f} {pct(lat, 95) * 1e3:8.1f} {pct(lat, 99) * 1e3:8.1f} | "
+              f"{gens / n:7.2f} {cancelled:6d} {toks / n:8.0f}")
+    print(f"plazo del hedge aprendido: {llm_pool.hedge_deadline_s() * 1e3:.0f} ms (p{llm_pool.HEDGE_PCT:g})")
+    for s in stubs:
+        s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench/bench_http.py
+"""
+Benchmark: bytes en el cable y latencia para un cliente remoto con la caché HTTP
+y la compresión de core/http_cache.py.
+
+Contra la app en proceso (httpx + ASGI, stubs de Ollama/Neo4j) mide, por endpoint,
+el tamaño de la respuesta sin comprimir / gzip / br (si hay brotli), el tiempo de
+servidor y la latencia estimada de un cliente a --mbps con --rtt-ms de ida y vuelta
+(servidor + RTT + bytes/ancho de banda). Con If-None-Match, el schema (GET) responde
+304; /recommend y /recommend/llm son POST: sin ETag, solo ganan por compresión.
+
+    python bench/bench_http.py [--requests 100] [--mbps 10] [--rtt-ms 60]
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from _util import ROOT  # noqa: F401  (sys.path -> app/)
+from stubs import OllamaStub, install_stubs
+
+API_KEY = os.getenv("API_KEY", "supersecreto")
+
+
+def pct(vals: List[float], p: float) -> float:
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(round((len(s) - 1) * p / 100.0)))] if s else 0.0
+
+
+async def measure(client, method: str, url: str, body: Optional[Dict[str, Any]], encoding: str,
+                  n: int, revalidate: bool) -> Tuple[List[float], List[int], int]:
+    headers = {"x-api-key": API_KEY, "accept-encoding": encoding}
+    etag = None
+    server: List[float] = []
+    sizes: List[int] = []
+    not_modified = 0
+    for _ in range(n):
+        h = dict(headers)
+        if revalidate and etag:
+            h["if-none-match"] = etag
+        t0 = time.perf_counter()
+        resp = await client.request(method, url, headers=h, json=body)
+        server.append(time.perf_counter() - t0)
+        # bytes tal como viajan (httpx descomprime .content; el cuerpo crudo es .stream)
+        raw = int(resp.headers.get("content-length") or len(resp.content))
+        sizes.append(raw + sum(len(k) + len(v) + 4 for k, v in resp.headers.items()))
+        not_modified += resp.status_code == 304
+        etag = resp.headers.get("etag") or etag
+    return server, sizes, not_modified
+
+
+async def run(args) -> None:
+    import httpx
+
+    os.environ.setdefault("RESPONSE_CACHE_TTL", "600")
+    stub = OllamaStub(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s).start()
+    install_stubs(stub, query_delay_ms=0)
+    import main  # noqa: E402  (tras instalar los stubs)
+    from core import http_cache
+    from services import warmup
+
+    metrics = {"platform": "youtube", "niche": "fitness", "region": "ES", "impressions": 20000,
+               "reach": 15000, "clicks": 300, "likes": 400, "followers": 5000, "top_k": 10}
+    # Borradores base (k=10) para /recommend/llm: la request solo los lee
+    warmup.warm_responses([("fitness", "ES")], k=10, rate=0)
+    cases = [
+        ("schema", "GET", "/recommend/schema", None),
+        ("recommend", "POST", "/recommend", metrics),
+        ("recommend_llm", "POST", "/recommend/llm", metrics),   # sin specialties: borrador cacheable
+    ]
+    encodings = ["identity", "gzip"] + (["br"] if http_cache.brotli is not None else [])
+
+    transport = httpx.ASGITransport(app=main.app)
+    print(f"cliente remoto: {args.mbps:g} Mbit/s, RTT {args.rtt_ms:g} ms | {args.requests} peticiones por caso")
+    print(f"{'endpoint':<14} {'codif.':<9} {'reval.':<6} | {'bytes':>7} {'304':>4} | "
+          f"{'srv p50':>7} {'srv p95':>7} | {'remoto p95 ms':>13}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for name, method, url, body in cases:
+            await client.request(method, url, headers={"x-api-key": API_KEY}, json=body)  # calienta cachés
+            for enc in encodings:
+                for reval in (False, True):
+                    server, sizes, n304 = await measure(client, method, url, body, enc, args.requests, reval)
+                    remote = [s + args.rtt_ms / 1e3 + b * 8 / (args.mbps * 1e6) for s, b in zip(server, sizes)]
+                    print(f"{name:<14} {enc:<9} {'sí' if reval else 'no':<6} | {sum(sizes) / len(sizes):7.0f} "
+                          f"{n304:4d} | {pct(server, 50) * 1e3:7.2f} {pct(server, 95) * 1e3:7.2f} | "
+                          f"{pct(remote, 95) * 1e3:13.1f}")
+    stub.stop()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--mbps", type=float, default=10.0)
+    ap.add_argument("--rtt-ms", type=float, default=60.0)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--tokens-per-s", type=float, default=2000.0)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
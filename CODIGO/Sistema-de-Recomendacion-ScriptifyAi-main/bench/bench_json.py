@@ -0,0 +1,131 @@
+# bench/bench_json.py
+"""
+Micro-benchmark: serialización de la respuesta de /recommend/llm.
+Compara el camino anterior (_clean_json recursivo con json.dumps como sonda por
+hoja + json.dumps final, y otra vez con indent para pretty=1) con
+core.serialization.dumps (una pasada, orjson si está disponible).
+Reporta tiempo por respuesta y memoria asignada (tracemalloc).
+
+    python bench/bench_json.py [--examples 10,50,200]
+"""
+import argparse
+import datetime
+import json
+import math
+import random
+import tracemalloc
+
+from _util import best_of, fmt_us, read_csv
+
+from core import serialization
+
+try:
+    from neo4j.time import DateTime as NeoDateTime, Date as NeoDate
+except Exception:
+    NeoDateTime = None  # type: ignore
+    NeoDate = None      # type: ignore
+
+
+# ---- copia de referencia (implementación anterior en main.py)
+
+def _to_iso(val):
+    if NeoDateTime is not None and isinstance(val, (NeoDateTime, NeoDate)):
+        try: return val.to_native().isoformat()
+        except Exception: return str(val)
+    if isinstance(val, (datetime.datetime, datetime.date)):
+        return val.isoformat()
+    return str(val)
+
+
+def legacy_clean_json(x):
+    if isinstance(x, float):
+        if math.isnan(x) or math.isinf(x): return None
+        return x
+    if NeoDateTime is not None and isinstance(x, (NeoDateTime, NeoDate)):
+        return _to_iso(x)
+    if isinstance(x, (datetime.datetime, datetime.date)):
+        return _to_iso(x)
+    if isinstance(x, dict):
+        return {k: legacy_clean_json(v) for k, v in x.items()}
+    if isinstance(x, (list, set, tuple)):
+        return [legacy_clean_json(v) for v in x]
+    try:
+        json.dumps(x)
+        return x
+    except Exception:
+        return str(x)
+
+
+def legacy_render(payload, pretty: bool) -> bytes:
+    safe = legacy_clean_json(payload)
+    if pretty:
+        return json.dumps(safe, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(safe, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+# ---- payload realista a partir del dataset
+
+def build_payload(rows, n_examples: int, rng: random.Random) -> dict:
+    def _published(r):
+        try:
+            dt = datetime.datetime.fromisoformat(r["publishedAt"].replace("Z", "+00:00"))
+        except Exception:
+            return None
+        return NeoDateTime.from_native(dt) if NeoDateTime is not None else dt
+
+    picked = rng.sample(rows, n_examples)
+    examples = [{
+        "videoId": r["videoId"],
+        "url": f"https://youtu.be/{r['videoId']}",
+        "title": r["title"],
+        "publishedAt": _published(r),
+        "hashtags_for_examples": [f"#{t.strip().replace(' ', '')}" for t in r["tags"].split(",")[:3] if t.strip()],
+    } for r in picked]
+    trends = [{"keyword": r["title"].split(" ")[0].lower(), "score": float(rng.randint(1, 100)),
+               "score_norm": rng.random() if i % 7 else float("nan"), "timeframe": "now 7-d", "source": "gtrends_top"}
+              for i, r in enumerate(picked[:12])]
+    ideas = [r["title"][:60] for r in picked[:12]]
+    return {
+        "recommendation": "Muestra el resultado del detailing al inicio y cierra con un siguiente paso claro.",
+        "reason": "Señales...\n- Haz esto\n- Prueba aquello\n- Enseña el antes\n- Cierra con una pregunta",
+        "ideas": ideas,
+        "diagnostics": {"focus": "personalized", "inputs": {"niche": "automotriz", "ctr": None, "impressions": 90000,
+                                                            "specialties": ["detailing"], "top_k": 10},
+                        "llm": True, "trends": trends},
+        "examples": examples,
+        "hashtags_for_ideas": [["#detailing", "#motor"] for _ in ideas],
+        "hashtags_for_examples": [],
+    }
+
+
+def allocated_bytes(fn) -> int:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--examples", default="10,50,200")
+    args = ap.parse_args()
+
+    rng = random.Random(11)
+    rows = [r for r in read_csv("youtube_merged_clean.csv") if r.get("title")]
+    backend = "orjson" if serialization.orjson is not None else "json (stdlib)"
+    print(f"backend: {backend}")
+    print(f"{'examples':>8} {'pretty':>6} | {'legacy':>13} | {'dumps':>13} | {'mem legacy':>10} | {'mem dumps':>10}")
+    for n in (int(x) for x in args.examples.split(",")):
+        payload = build_payload(rows, n, rng)
+        for pretty in (False, True):
+            assert json.loads(legacy_render(payload, pretty)) == json.loads(serialization.dumps(payload, pretty))
+            legacy = best_of(lambda: legacy_render(payload, pretty), number=50)
+            fast = best_of(lambda: serialization.dumps(payload, pretty), number=50)
+            m_legacy = allocated_bytes(lambda: legacy_render(payload, pretty))
+            m_fast = allocated_bytes(lambda: serialization.dumps(payload, pretty))
+            print(f"{n:>8} {str(pretty):>6} | {fmt_us(legacy)} | {fmt_us(fast)} | {m_legacy / 1024:8.1f}KB | {m_fast / 1024:8.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# bench/bench_metrics.py
+"""
+Micro-benchmark: coste por request de las métricas en /recommend y /recommend/llm.
+
+Compara la copia anterior (json del body -> dict `inputs` campo a campo -> Metrics
+de pydantic -> infer_rates con copy(deep=True), repetido dentro de decide_focus y
+reason_for_focus) con models.schemas.Metrics (__slots__, un decode + validación
+desde bytes, tasas inferidas una vez sobre el objeto). Además, el lote: N cuerpos
+por separado vs una lista en Metrics.many_from_json, y /recommend por HTTP en
+proceso (N peticiones vs una a /recommend/batch).
+
+    python bench/bench_metrics.py [--batch 100]
+"""
+import argparse
+import asyncio
+import json
+import random
+import warnings
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from _util import best_of, fmt_us
+
+from models.schemas import Metrics
+from services import recommender
+
+# la copia anterior usa .copy()/.dict() de pydantic v1, como el código original
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+# ---- copias de referencia (implementación anterior)
+
+class LegacyMetrics(BaseModel):
+    platform: Optional[str] = None
+    niche: str
+    format: Optional[str] = None
+    ctr: Optional[float] = None
+    retention: Optional[float] = None
+    avg_watch_pct: Optional[float] = None
+    completion_rate: Optional[float] = None
+    impressions: Optional[int] = None
+    reach: Optional[int] = None
+    clicks: Optional[int] = None
+    conversions: Optional[int] = None
+    followers: Optional[int] = None
+    likes: Optional[int] = None
+    shares: Optional[int] = None
+    saves: Optional[int] = None
+    comments: Optional[int] = None
+    followers_change: Optional[int] = None
+    freq: Optional[float] = None
+    use_graph: bool = True
+    top_k: Optional[int] = 5
+
+
+class LegacyRecommendation(BaseModel):
+    recommendation: str
+    reason: str
+    ideas: List[str]
+    diagnostics: Dict[str, Any]
+    examples: List[Dict[str, Any]] = []
+    ideas_by_focus: Dict[str, List[str]] = {}
+    hashtags_by_focus: Dict[str, List[str]] = {}
+
+
+def legacy_infer_rates(m: LegacyMetrics) -> LegacyMetrics:
+    m = m.copy(deep=True)
+    p = recommender._pct
+    m.ctr = p(m.ctr) if m.ctr is not None else None
+    m.retention = p(m.retention) if m.retention is not None else None
+    m.avg_watch_pct = p(m.avg_watch_pct) if m.avg_watch_pct is not None else None
+    m.completion_rate = p(m.completion_rate) if m.completion_rate is not None else None
+    if m.ctr is None and (m.clicks is not None and m.impressions not in (None, 0)):
+        m.ctr = max(0.0, min(1.0, m.clicks / m.impressions))
+    if m.retention is None and m.impressions not in (None, 0):
+        num = 1.0 * (m.likes or 0) + 1.5 * (m.comments or 0) + 1.7 * (m.shares or 0) + 1.8 * (m.saves or 0)
+        m.retention = max(0.0, min(0.95, num / m.impressions))
+    return m
+
+
+def legacy_recommend(raw: bytes) -> Dict[str, Any]:
+    """/recommend anterior: FastAPI valida el body con pydantic y se infiere 3 veces."""
+    m = LegacyMetrics(**json.loads(raw))
+    m = legacy_infer_rates(m)
+    m2 = legacy_infer_rates(m)                       # dentro de decide_focus
+    scores = {"discovery": recommender.score_discovery(m2), "retention": recommender.score_retention(m2),
+              "conversion": recommender.score_conversion(m2)}
+    focus = max(scores, key=lambda k: (scores[k], 1 if k == "conversion" else 0, 0.5 if k == "retention" else 0))
+    m3 = legacy_infer_rates(m)                       # dentro de reason_for_focus
+    reason = f"CTR={recommender._safe_pct_str(m3.ctr)}, retención={recommender._safe_pct_str(m3.retention)}"
+    return LegacyRecommendation(recommendation=f"Sugerencia base para foco={focus}", reason=reason, ideas=[],
+                                diagnostics={"focus": focus, "scores": scores, "inputs": m.dict()}).dict()
+
+
+_LLM_KEYS = ("platform", "niche", "format", "ctr", "retention", "avg_watch_pct", "completion_rate", "impressions",
+             "reach", "clicks", "conversions", "followers", "likes", "shares", "saves", "comments",
+             "followers_change", "freq")
+
+
+def legacy_llm_inputs(raw: bytes) -> Dict[str, Any]:
+    """/recommend/llm anterior: dict a mano + Metrics de pydantic + infer_rates x2."""
+    payload_in = json.loads(raw)
+    inputs = {k: payload_in.get(k) for k in _LLM_KEYS}
+    inputs.update(specialties=payload_in.get("specialties") or [], use_graph=True,
+                  top_k=int(payload_in.get("top_k") or 10), region=payload_in.get("region"))
+    m = LegacyMetrics(**{k: inputs.get(k) for k in _LLM_KEYS if k not in ("format", "clicks", "conversions",
+                                                                            "followers_change")})
+    m = legacy_infer_rates(m)
+    legacy_infer_rates(m)                            # dentro de decide_focus
+    return inputs
+
+
+# ---- implementación actual
+
+def new_recommend(raw: bytes) -> Dict[str, Any]:
+    m = Metrics.from_json(raw)
+    decision = recommender.decide_focus(recommender.infer_rates(m))
+    focus = decision["focus"]
+    return {"recommendation": f"Sugerencia base para foco={focus}", "reason": recommender.reason_for_focus(focus, m),
+            "ideas": [], "diagnostics": {"focus": focus, "scores": decision["scores"], "inputs": m.dict()},
+            "examples": [], "ideas_by_focus": {}, "hashtags_by_focus": {}}
+
+
+def new_llm_inputs(raw: bytes) -> Dict[str, Any]:
+    m = Metrics.from_json(raw, lenient=True, defaults={"top_k": 10})
+    inputs = m.dict()
+    inputs["specialties"] = m.specialties or []
+    inputs["focus_hint"] = recommender.decide_focus(m)["focus"]
+    return inputs
+
+
+def bodies(n: int, seed: int = 7) -> List[Dict[str, Any]]:
+    r = random.Random(seed)
+    return [{"platform": "youtube", "niche": r.choice(["fitness", "cocina", "gaming"]), "region": "ES",
+             "impressions": r.randint(1000, 200000), "reach": r.randint(500, 150000),
+             "clicks": r.randint(10, 5000), "followers": r.randint(100, 100000), "likes": r.randint(10, 10000),
+             "shares": r.randint(0, 500), "saves": r.randint(0, 800), "comments": r.randint(0, 600),
+             "conversions": r.randint(0, 50), "ctr": r.choice([None, 3.5, 0.04]),
+             "specialties": ["rutinas"], "top_k": 8} for _ in range(n)]
+
+
+async def http_batch(items: List[Dict[str, Any]]) -> Dict[str, float]:
+    import time
+
+    import httpx
+    from stubs import OllamaStub, install_stubs
+
+    stub = OllamaStub(latency_ms=1).start()
+    install_stubs(stub, query_delay_ms=0)
+    import main  # noqa: E402  (tras instalar los stubs)
+
+    h = {"x-api-key": "supersecreto"}
+    out: Dict[str, float] = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as c:
+        for _ in range(2):  # calentamiento + medida
+            t0 = time.perf_counter()
+            for it in items:
+                await c.post("/recommend", json=it, headers=h)
+            out["single"] = (time.perf_counter() - t0) / len(items)
+            t0 = time.perf_counter()
+            resp = await c.post("/recommend/batch", json=items, headers=h)
+            out["batch"] = (time.perf_counter() - t0) / len(items)
+            assert resp.status_code == 200 and len(resp.json()["results"]) == len(items)
+    stub.stop()
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--batch", type=int, default=100)
+    args = ap.parse_args()
+
+    items = bodies(args.batch)
+    raws = [json.dumps(b).encode() for b in items]
+    raw = raws[0]
+    batch_raw = json.dumps(items).encode()
+
+    print(f"{'caso':<38} | {'anterior':>13} | {'actual':>13} | {'x':>5}")
+
+    def row(name: str, old: float, new: float) -> None:
+        print(f"{name:<38} | {fmt_us(old):>13} | {fmt_us(new):>13} | {old / new:5.1f}")
+
+    row("/recommend (por request)", best_of(lambda: legacy_recommend(raw), 500), best_of(lambda: new_recommend(raw), 500))
+    row("/recommend/llm inputs+foco", best_of(lambda: legacy_llm_inputs(raw), 500),
+        best_of(lambda: new_llm_inputs(raw), 500))
+    row(f"lote decode+validación (x{args.batch}, /item)",
+        best_of(lambda: [LegacyMetrics(**json.loads(r)) for r in raws], 20) / args.batch,
+        best_of(lambda: Metrics.many_from_json(batch_raw, limit=10 ** 6), 20) / args.batch)
+
+    t = asyncio.run(http_batch(items))
+    row("HTTP /recommend vs /batch (/item)", t["single"], t["batch"])
+
+
+if __name__ == "__main__":
+    main()
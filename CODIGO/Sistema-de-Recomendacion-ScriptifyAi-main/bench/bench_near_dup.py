@@ -0,0 +1,119 @@
+# bench/bench_near_dup.py
+"""
+Micro-benchmark: deduplicación de ideas / títulos de ejemplo.
+Compara la dedup exacta anterior (lower()) con services.near_dup:
+
+  - exacto:  Jaccard de shingles por pares (lo que usa near_dup hasta NEAR_DUP_EXACT_MAX)
+  - lsh:     firmas MinHash (numpy) + bandas LSH + confirmación exacta
+
+sobre títulos reales con parafraseos sintéticos (plural, mayúsculas, signos,
+palabra extra) para medir también cuántos casi duplicados detecta cada uno (lsh es
+aproximado: puede quitar alguno menos que exacto).
+
+Antes de medir comprueba (assert) que ideas cortas distintas sobreviven al umbral,
+que un parafraseo se quita por ambos caminos y que un borrador que baja de 10 ideas
+al quitar casi duplicados queda con "ideas" como campo fallido.
+
+    python bench/bench_near_dup.py [--sizes 12,50,200,1000,3000] [--threshold 0.7]
+"""
+import argparse
+import random
+from typing import Callable, List
+
+from _util import best_of, fmt_us, youtube_titles
+
+from services import near_dup
+
+
+def legacy_dedup(texts: List[str]) -> List[str]:
+    seen = set()
+    out = []
+    for it in texts:
+        if it.lower() not in seen:
+            out.append(it)
+            seen.add(it.lower())
+    return out
+
+
+_VARIANTS: List[Callable[[str], str]] = [
+    lambda t: t.upper(),
+    lambda t: t + "!",
+    lambda t: t.replace(" ", "  ") + "s",
+    lambda t: "Nuevo: " + t,
+]
+
+
+def with_paraphrases(rng: random.Random, pool: List[str], n: int, dup_ratio: float = 0.2) -> List[str]:
+    base = rng.sample(pool, n - int(n * dup_ratio))
+    dups = [rng.choice(_VARIANTS)(rng.choice(base)) for _ in range(n - len(base))]
+    out = base + dups
+    rng.shuffle(out)
+    return out
+
+
+# Ideas cortas distintas del mismo nicho: comparten prefijo ("Rutina de ...") pero
+# ningún par llega a 0.7 con shingles de 3 (el máximo es 0.5)
+DISTINCT_SHORT = ["Rutina de pierna", "Rutina de espalda", "Rutina de brazos", "Rutina de pecho",
+                  "Dieta keto", "Dieta vegana", "Errores al correr", "Errores al nadar",
+                  "Mitos del cardio", "Mitos del ayuno", "Pierna en casa", "Pierna en gym"]
+PARAPHRASE = ["Errores que arruinan tu rutina", "Errores que arruinan tus rutinas"]
+
+
+def check(threshold: float) -> None:
+    from services import llm_ollama
+
+    exact_max = near_dup.EXACT_MAX
+    try:
+        for path, limit in (("exacto", 10 ** 9), ("lsh", 0)):
+            near_dup.EXACT_MAX = limit
+            assert near_dup.keep_indices(DISTINCT_SHORT, threshold) == list(range(len(DISTINCT_SHORT))), path
+            assert near_dup.keep_indices(PARAPHRASE, threshold) == [0], path
+    finally:
+        near_dup.EXACT_MAX = exact_max
+
+    # 10 ideas, una es parafraseo de otra -> quedan 9: el mínimo se mira tras la dedup
+    draft = {"recommendation": "x", "reason": "y", "ideas": DISTINCT_SHORT[:8] + PARAPHRASE}
+    draft, failed = llm_ollama._validate_fields(draft, "fitness", [])
+    assert len(draft["ideas"]) == 9 and "ideas" in failed, (len(draft["ideas"]), failed)
+    print("checks ok: ideas cortas distintas se conservan, parafraseos fuera, mínimo de ideas tras dedup")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="12,50,200,1000,3000")
+    ap.add_argument("--threshold", type=float, default=near_dup.NEAR_DUP_THRESHOLD)
+    args = ap.parse_args()
+
+    check(args.threshold)
+
+    rng = random.Random(11)
+    pool = youtube_titles()
+    print(f"{'n':>5} | {'legacy':>13} {'quita':>5} | {'exacto':>13} {'quita':>5} | {'lsh':>13} {'quita':>5}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        texts = with_paraphrases(rng, pool, min(n, len(pool)))
+        number = max(1, 2000 // n)
+        # shingles memoizados: estado estable de un proceso que ya vio estos títulos
+        near_dup.EXACT_MAX = 10 ** 9
+        exact_keep = near_dup.keep_indices(texts, args.threshold)
+        exact = best_of(lambda: near_dup.keep_indices(texts, args.threshold), number=number, repeat=3) if n <= 1000 else float("nan")
+        near_dup.EXACT_MAX = 0
+        lsh_keep = near_dup.keep_indices(texts, args.threshold)
+        lsh = best_of(lambda: near_dup.keep_indices(texts, args.threshold), number=number, repeat=3)
+        legacy = best_of(lambda: legacy_dedup(texts), number=number, repeat=3)
+        print(f"{n:>5} | {fmt_us(legacy)} {n - len(legacy_dedup(texts)):>5} | {fmt_us(exact)} {n - len(exact_keep):>5} "
+              f"| {fmt_us(lsh)} {n - len(lsh_keep):>5}")
+
+    # Sin memoización (títulos nuevos): coste de shinglear + firmar
+    texts = pool[:1000]
+    near_dup.EXACT_MAX = 0
+
+    def cold() -> None:
+        near_dup.shingles.cache_clear()
+        near_dup._SIG_CACHE.clear()
+        near_dup.keep_indices(texts, args.threshold)
+
+    print(f"frío 1000 títulos (shingles + MinHash + LSH): {fmt_us(best_of(cold, number=3, repeat=3))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bench/bench_quantized.py
+"""
+Benchmark: búsqueda vectorial sobre los títulos del proyecto con embeddings
+float32 / float16 / int8 (escala por vector) de services.quantized_vectors.
+
+Para cada formato: memoria de la matriz que se recorre, latencia por consulta
+(p50/p95) y recall@k contra el coseno exacto float32, sin y con re-rank exacto
+de los k*rerank mejores candidatos (lo que hace snapshot.vector_search).
+
+    python bench/bench_quantized.py [--k 10] [--queries 200] [--scale 1,10] [--embed fake|ollama]
+
+--embed fake usa los vectores deterministas de stubs.py (trigramas hasheados, sin
+red); --embed ollama pide los embeddings reales a OLLAMA_HOST (embed_many).
+--scale N replica el catálogo N veces con ruido para ver el coste a más filas.
+"""
+import argparse
+import random
+import time
+from typing import List
+
+import numpy as np
+
+from _util import youtube_titles
+from stubs import fake_embedding
+
+from services import quantized_vectors as qv
+
+
+def embed_titles(titles: List[str], how: str) -> np.ndarray:
+    if how == "ollama":
+        from services.embeddings_neo4j import embed_many
+
+        rows: List[List[float]] = []
+        for i in range(0, len(titles), 64):
+            rows.extend(embed_many(titles[i:i + 64]))
+        dim = max(len(r) for r in rows)
+        m = np.array([r if len(r) == dim else [0.0] * dim for r in rows], dtype=np.float32)
+    else:
+        m = np.array([fake_embedding(t) for t in titles], dtype=np.float32)
+    return _unit(m)
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(m, axis=1, keepdims=True)
+    n[n == 0] = 1.0
+    return (m / n).astype(np.float32)
+
+
+def variant(rng: random.Random, title: str) -> str:
+    """Consulta 'parecida' a un título: recorte de palabras y minúsculas."""
+    words = title.split()
+    if len(words) > 3:
+        words = words[: max(3, int(len(words) * rng.uniform(0.5, 0.9)))]
+    return " ".join(words).lower()
+
+
+def run(label: str, data, exact: np.ndarray, queries: np.ndarray, truth: List[set], k: int, rerank: int) -> None:
+    lat, hits = [], 0
+    for q, gold in zip(queries, truth):
+        t0 = time.perf_counter()
+        idx, _ = qv.search(q, data, k, exact=exact if rerank else None, rerank=rerank or 1)
+        lat.append(time.perf_counter() - t0)
+        hits += len(gold.intersection(idx.tolist()))
+    lat_ms = np.array(lat) * 1e3
+    mem = data.codes.nbytes + data.scales.nbytes if isinstance(data, qv.QuantizedMatrix) else data.nbytes
+    print(f"  {label:<22} {mem / 2**20:8.2f} MiB  p50 {np.percentile(lat_ms, 50):7.2f} ms  "
+          f"p95 {np.percentile(lat_ms, 95):7.2f} ms  recall@{k} {hits / (k * len(queries)):.4f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--rerank", type=int, default=4)
+    ap.add_argument("--scale", default="1,10")
+    ap.add_argument("--embed", choices=("fake", "ollama"), default="fake")
+    args = ap.parse_args()
+
+    rng = random.Random(5)
+    titles = youtube_titles()
+    base = embed_titles(titles, args.embed)
+    picked = rng.sample(titles, min(args.queries, len(titles)))
+    queries = embed_titles([variant(rng, t) for t in picked], args.embed)
+    print(f"{len(titles)} títulos, dim {base.shape[1]}, {len(queries)} consultas, embed={args.embed}")
+
+    nrng = np.random.default_rng(5)
+    for scale in (int(x) for x in args.scale.split(",")):
+        m = base if scale == 1 else _unit(np.vstack(
+            [base] + [base + nrng.normal(0, 0.02, base.shape).astype(np.float32) for _ in range(scale - 1)]))
+        truth = [set(qv.search(q, m, args.k)[0].tolist()) for q in queries]
+        q8 = qv.quantize_int8(m)
+        f16 = m.astype(np.float16)
+        print(f"\nfilas={len(m)} (x{scale})")
+        run("float32 exacto", m, m, queries, truth, args.k, 0)
+        run("float16", f16, m, queries, truth, args.k, 0)
+        run(f"float16 + rerank x{args.rerank}", f16, m, queries, truth, args.k, args.rerank)
+        run("int8", q8, m, queries, truth, args.k, 0)
+        run(f"int8 + rerank x{args.rerank}", q8, m, queries, truth, args.k, args.rerank)
+        err = np.abs(qv.dequantize_int8(q8) - m).max()
+        print(f"  error máx. int8 por componente: {err:.2e}; lista de floats en el grafo ≈ "
+              f"{m.shape[1] * 8 / 1024:.1f} KiB/video vs int8 {(m.shape[1] + 4) / 1024:.2f} KiB")
+
+
+if __name__ == "__main__":
+    main()
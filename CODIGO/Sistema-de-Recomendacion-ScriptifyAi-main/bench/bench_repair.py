@@ -0,0 +1,115 @@
+# bench/bench_repair.py
+"""
+Benchmark: coste de reparar un borrador inválido de llm_recommend con la ronda de
+crítica completa (LLM_REPAIR=full) vs la reparación por campo (LLM_REPAIR=fields)
+vs la reparación por campo con cascada de modelos (`cascade`: SMALL_MODEL para
+reparaciones y hashtags, escalando al grande si su salida no valida).
+
+El Ollama simulado de stubs.py estropea un campo de cada borrador (--defect-prob):
+bullets de "reason", especialidad en "recommendation" o nº de ideas. Por modo:
+borradores reparados, tiempo de la reparación (p50/p95) y tokens de prompt +
+generados que cuesta, también como fracción de una generación completa. Con
+`cascade`, además llamadas/latencia por modelo y escalados por subtarea.
+
+    python bench/bench_repair.py [--requests 120] [--concurrency 4] [--defect-prob 1.0]
+                                 [--small-speedup 4] [--small-defect-prob 0.2]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from _util import ROOT  # noqa: F401  (sys.path -> app/)
+from stubs import OllamaStub, install_stubs
+
+
+def pct(vals: List[float], p: float) -> float:
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(round((len(s) - 1) * p / 100.0)))] if s else 0.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=120)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--tokens-per-s", type=float, default=2000.0)
+    ap.add_argument("--defect-prob", type=float, default=1.0)
+    ap.add_argument("--small-model", default="qwen2.5:1.5b-instruct")
+    ap.add_argument("--small-speedup", type=float, default=4.0)
+    ap.add_argument("--small-defect-prob", type=float, default=0.2)
+    ap.add_argument("--modes", default="full,fields,cascade")
+    args = ap.parse_args()
+
+    stub = OllamaStub(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s,
+                      model_speed={args.small_model: args.small_speedup},
+                      model_defects={args.small_model: args.small_defect_prob}).start()
+    os.environ["LLM_BACKENDS"] = stub.url
+    install_stubs(stub, query_delay_ms=0)
+
+    from services import llm_ollama, llm_pool
+    from services.graph_examples import get_context_for_llm
+
+    niches = [("fitness", "ES", "rutinas"), ("cocina", "MX", "recetas"),
+              ("gaming", "US", "estrategia"), ("finanzas", "ES", "ahorro")]
+    ctxs = {n: get_context_for_llm(n[0], n[1], k=10) for n in niches}
+
+    def one(i: int) -> Tuple[float, Dict[str, Any]]:
+        niche, region, spec = niches[i % len(niches)]
+        inputs = {"platform": "youtube", "niche": niche, "region": region, "top_k": 10,
+                  "specialties": [spec], "focus_hint": "discovery", "ctr": 0.03}
+        ctx = ctxs[(niche, region, spec)]
+        t0 = time.perf_counter()
+        out = llm_ollama.llm_recommend("", niche, {"inputs": inputs}, ctx["examples"], trends=ctx["trends"])
+        return time.perf_counter() - t0, out["prompt_stats"].get("repair") or {}
+
+    def reset() -> None:
+        stub.calls.clear()
+        stub.tokens_generated = 0
+        stub.prompt_tokens = 0
+
+    def run(n: int) -> Tuple[List[Tuple[float, Dict[str, Any]]], int, int, int]:
+        reset()
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            res = list(ex.map(one, range(n)))
+        gens = stub.calls.get("/api/generate", 0) + stub.calls.get("/api/chat", 0)
+        return res, gens, stub.prompt_tokens, stub.tokens_generated
+
+    # Referencia: una generación completa sin defectos
+    stub.defect_prob = 0.0
+    res, gens, p_tok, g_tok = run(min(40, args.requests))
+    full_gen_tokens = (p_tok + g_tok) / max(1, gens)
+    full_gen_s = pct([t for t, _ in res], 50)
+    print(f"generación completa: {full_gen_tokens:.0f} tokens (prompt+salida), p50 {full_gen_s * 1e3:.1f} ms")
+
+    stub.defect_prob = args.defect_prob
+    print(f"{args.requests} peticiones, concurrencia {args.concurrency}, defectos {args.defect_prob:.0%}")
+    print(f"{'modo':<7} | {'reparadas':>9} {'rep/req':>7} | {'p50 ms':>7} {'p95 ms':>7} | "
+          f"{'tok/rep':>7} {'x gen':>6}")
+    for mode in args.modes.split(","):
+        llm_ollama.LLM_REPAIR = "full" if mode == "full" else "fields"
+        llm_pool.SMALL_MODEL = args.small_model if mode == "cascade" else ""
+        llm_pool.reset_stats()
+        res, gens, p_tok, g_tok = run(args.requests)
+        reps = [r for _, r in res if r]
+        fixed = sum(1 for r in reps if not r.get("still_failed"))
+        secs = [r["seconds"] for r in reps]
+        # lo que no es el borrador (1 generación por petición) es coste de reparación
+        draft_tokens = full_gen_tokens * len(res)
+        rep_tokens = max(0.0, p_tok + g_tok - draft_tokens) / max(1, len(reps))
+        print(f"{mode:<7} | {fixed:>4}/{len(reps):<4} {(gens - len(res)) / max(1, len(reps)):7.2f} | "
+              f"{pct(secs, 50) * 1e3:7.1f} {pct(secs, 95) * 1e3:7.1f} | "
+              f"{rep_tokens:7.0f} {rep_tokens / max(1.0, full_gen_tokens):6.2f}")
+        st = llm_pool.stats()
+        if mode == "cascade":
+            for name, m in st["models"].items():
+                print(f"          {name.split('@')[0]:<24} {m['calls']:5d} llamadas  p50 {m['p50_s'] * 1e3:6.1f} ms")
+            for task, c in st["cascade"]["tasks"].items():
+                print(f"          {task:<24} {c.get('calls', 0):5d} llamadas  {c.get('first_ok', 0)} al primer modelo, "
+                      f"{c.get('escalated', 0)} escalados, {c.get('failed', 0)} sin arreglo")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench/bench_text_norm.py
+"""
+Micro-benchmark: normalización de texto por request.
+Compara las copias originales (cadenas de .replace() + varias pasadas de re.sub)
+con services.text_norm (una regex precompilada por variante + memoización)
+en los dos caminos que las usan en cada /recommend/llm:
+
+  - glosario: frecuencia de keywords sobre los títulos de ejemplo
+  - hashtags: vocab permitido (ideas/specialties) + saneo de ~36 hashtags
+
+    python bench/bench_text_norm.py [--titles 10,50,200]
+"""
+import argparse
+import random
+import re
+from typing import Dict, List
+
+from _util import best_of, fmt_us, youtube_titles
+
+from services import text_norm
+
+
+# ---- copias de referencia (implementación anterior)
+
+def legacy_normalize_token(s: str) -> str:
+    s = (s or "").lower()
+    s = (s.replace("á", "a").replace("é", "e").replace("í", "i")
+          .replace("ó", "o").replace("ú", "u").replace("ñ", "n"))
+    s = re.sub(r"[^a-z0-9\-\s]", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def legacy_tokenize_for_vocab(text: str) -> List[str]:
+    t = (text or "").lower()
+    t = (t.replace("á", "a").replace("é", "e").replace("í", "i")
+          .replace("ó", "o").replace("ú", "u").replace("ñ", "n"))
+    t = re.sub(r"[^a-z0-9\s\-_/]", " ", t)
+    return [w for w in re.split(r"[\s\-_\/]+", t) if len(w) >= 3]
+
+
+def legacy_normalize_hashtag(tag: str) -> str:
+    t = (tag or "").strip().lower()
+    if not t.startswith("#"):
+        t = "#" + t
+    t = (t.replace("á", "a").replace("é", "e").replace("í", "i")
+          .replace("ó", "o").replace("ú", "u").replace("ñ", "n"))
+    return re.sub(r"[^#a-z0-9_]", "", t)
+
+
+# ---- caminos por request
+
+def glossary_path(titles: List[str], norm) -> Dict[str, int]:
+    freq: Dict[str, int] = {}
+    for t in titles:
+        for w in norm(t).split():
+            if len(w) >= 3:
+                freq[w] = freq.get(w, 0) + 1
+    return freq
+
+
+def hashtag_path(ideas: List[str], tags: List[str], tokenize, hashtag) -> int:
+    vocab = set()
+    for title in ideas:
+        vocab.update(tokenize(title))
+    return len(vocab) + sum(len(hashtag(t)) for t in tags)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--titles", default="10,50,200")
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    pool = youtube_titles()
+    print(f"{'path':>9} {'n':>5} | {'legacy':>13} | {'text_norm':>13} | ahorro/request")
+    for n in (int(x) for x in args.titles.split(",")):
+        titles = rng.sample(pool, n)
+        legacy = best_of(lambda: glossary_path(titles, legacy_normalize_token), number=50)
+        fast = best_of(lambda: glossary_path(text_norm.normalize_many(titles), lambda s: s), number=50)
+        print(f"{'glosario':>9} {n:>5} | {fmt_us(legacy)} | {fmt_us(fast)} | {fmt_us(legacy - fast)}")
+
+    ideas = rng.sample(pool, 12)
+    tags = [f"#{w}" for t in ideas for w in t.split()[:3]]
+    legacy = best_of(lambda: hashtag_path(ideas, tags, legacy_tokenize_for_vocab, legacy_normalize_hashtag), number=200)
+    fast = best_of(lambda: hashtag_path(ideas, tags, text_norm.vocab_tokens, text_norm.hashtag), number=200)
+    print(f"{'hashtags':>9} {len(tags):>5} | {fmt_us(legacy)} | {fmt_us(fast)} | {fmt_us(legacy - fast)}")
+
+    # Sin memoización (primer request con títulos nuevos): solo translate + regex única
+    text_norm.normalize_token.cache_clear()
+    cold = best_of(lambda: [text_norm.normalize_token.__wrapped__(t) for t in pool[:200]], number=20)
+    legacy = best_of(lambda: [legacy_normalize_token(t) for t in pool[:200]], number=20)
+    print(f"{'frío':>9} {200:>5} | {fmt_us(legacy)} | {fmt_us(cold)} | {fmt_us(legacy - cold)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench/bench_vocab_matcher.py
+"""
+Micro-benchmark: validación de hashtags contra el vocab permitido.
+Compara el scan lineal original (`any(root.startswith(v) or v in root ...)`) con
+VocabMatcher (trie + Aho–Corasick) para vocabularios crecientes.
+
+    python bench/bench_vocab_matcher.py [--sizes 100,1000,10000,50000]
+"""
+import argparse
+import random
+
+from _util import best_of, fmt_us, lexicon_terms, youtube_titles
+
+from services.text_norm import vocab_tokens
+from services.vocab_matcher import VocabMatcher
+
+
+def legacy_allowed(root: str, allowed_vocab: set) -> bool:
+    return (root in allowed_vocab) or any(root.startswith(v) or v in root for v in allowed_vocab if len(v) >= 4)
+
+
+def build_vocab(size: int, rng: random.Random) -> set:
+    pool = set()
+    for text in lexicon_terms() + youtube_titles():
+        pool.update(vocab_tokens(text))
+    pool = sorted(pool)
+    vocab = set(rng.sample(pool, min(size, len(pool))))
+    # Si el dataset no alcanza, sintetizamos variantes para llegar al tamaño pedido
+    i = 0
+    while len(vocab) < size:
+        vocab.add(f"{pool[i % len(pool)]}{i}")
+        i += 1
+    return vocab
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="100,1000,10000,50000")
+    ap.add_argument("--tags", type=int, default=36, help="hashtags por request (12 ideas x 3)")
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'vocab':>8} | {'legacy/request':>14} | {'build':>13} | {'matcher/request':>15} | speedup")
+    for size in (int(x) for x in args.sizes.split(",")):
+        vocab = build_vocab(size, rng)
+        words = sorted(vocab)
+        tags = [rng.choice(words) + rng.choice(["", "tips", "pro", "2025"]) for _ in range(args.tags // 2)]
+        tags += [f"zz{rng.randrange(10 ** 6)}" for _ in range(args.tags - len(tags))]
+
+        legacy = best_of(lambda: [legacy_allowed(t, vocab) for t in tags], number=3 if size > 5000 else 20)
+        build = best_of(lambda: VocabMatcher(vocab), number=1, repeat=3)
+        m = VocabMatcher(vocab)
+        fast = best_of(lambda: [m.allows(t) for t in tags], number=200)
+        assert [legacy_allowed(t, vocab) for t in tags] == [m.allows(t) for t in tags]
+        print(f"{size:>8} | {fmt_us(legacy):>14} | {fmt_us(build):>13} | {fmt_us(fast):>15} | {legacy / fast:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
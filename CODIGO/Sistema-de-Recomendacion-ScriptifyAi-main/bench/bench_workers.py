@@ -0,0 +1,145 @@
+# bench/bench_workers.py
+"""
+Benchmark: req/s agregados y memoria frente a nº de workers pre-fork (como
+gunicorn.conf.py: la app se importa una vez en el padre y los workers la heredan
+por fork).
+
+Con Ollama/Neo4j simulados (stubs.py) y los borradores precalentados, cada worker
+dispara en bucle peticiones CPU puras (/recommend/llm servido desde RESPONSE_CACHE y
+/recommend/batch) contra la app en proceso durante --seconds. Por nº de workers:
+req/s totales, escalado frente a 1 worker y memoria por worker (RSS, PSS y USS de
+/proc/<pid>/smaps_rollup): el PSS total crece menos que N x RSS porque el código
+importado y el almacén de /dev/shm (services/shared_store.py) se comparten.
+
+El escalado de req/s está acotado por los núcleos disponibles (se imprimen): en una
+máquina de 1 núcleo más workers no suben el throughput.
+
+    python bench/bench_workers.py [--workers 1,2,4] [--seconds 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from _util import ROOT  # noqa: F401  (sys.path -> app/)
+from stubs import OllamaStub, install_stubs
+
+API_KEY = os.getenv("API_KEY", "supersecreto")
+NICHES = [("fitness", "ES"), ("cocina", "MX"), ("gaming", "US"), ("finanzas", "ES")]
+
+
+def cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_kb() -> Dict[str, int]:
+    """RSS/PSS/USS del proceso actual (Linux); vacío si no hay smaps_rollup."""
+    out: Dict[str, int] = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as fh:
+            for line in fh:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    out[name] = int(rest.split()[0])
+    except OSError:
+        return {}
+    return {"rss": out.get("Rss", 0), "pss": out.get("Pss", 0),
+            "uss": out.get("Private_Clean", 0) + out.get("Private_Dirty", 0)}
+
+
+def bodies() -> List[Dict[str, Any]]:
+    return [{"platform": "youtube", "niche": niche, "region": region, "impressions": 1500, "reach": 300,
+             "followers": 5000, "clicks": 15, "likes": 60, "comments": 10, "shares": 5, "saves": 8, "top_k": 10}
+            for niche, region in NICHES]
+
+
+async def worker_loop(app, seconds: float) -> int:
+    import httpx
+
+    llm_bodies = bodies()
+    batch = llm_bodies * 5
+    h = {"x-api-key": API_KEY, "accept-encoding": "gzip"}
+    done = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as c:
+        end = time.perf_counter() + seconds
+        i = 0
+        while time.perf_counter() < end:
+            if i % 2:
+                resp = await c.post("/recommend/batch", json=batch, headers=h)
+            else:
+                resp = await c.post("/recommend/llm", json=llm_bodies[i // 2 % len(llm_bodies)], headers=h)
+            assert resp.status_code == 200, resp.status_code
+            done += 1
+            i += 1
+    return done
+
+
+def run_workers(app, n: int, seconds: float) -> Dict[str, Any]:
+    pids: List[int] = []
+    pipes: List[int] = []
+    for _ in range(n):
+        r, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # worker
+            os.close(r)
+            try:
+                count = asyncio.run(worker_loop(app, seconds))
+                msg = json.dumps({"count": count, "mem": memory_kb()}).encode()
+            except BaseException as e:  # noqa: BLE001
+                msg = json.dumps({"error": repr(e)}).encode()
+            os.write(wfd, msg)
+            os.close(wfd)
+            os._exit(0)
+        os.close(wfd)
+        pids.append(pid)
+        pipes.append(r)
+    results = []
+    for pid, r in zip(pids, pipes):
+        with os.fdopen(r, "rb") as fh:
+            results.append(json.loads(fh.read() or b'{"error": "sin salida"}'))
+        os.waitpid(pid, 0)
+    errors = [x["error"] for x in results if "error" in x]
+    if errors:
+        raise RuntimeError(f"worker falló: {errors[0]}")
+    return {"rps": sum(x["count"] for x in results) / seconds,
+            "rss": sum(x["mem"].get("rss", 0) for x in results) / n,
+            "pss": sum(x["mem"].get("pss", 0) for x in results),
+            "uss": sum(x["mem"].get("uss", 0) for x in results) / n}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    os.environ.setdefault("RESPONSE_CACHE_TTL", "600")
+    stub = OllamaStub(latency_ms=1).start()
+    install_stubs(stub, query_delay_ms=0)
+    import main as api  # noqa: E402  (tras instalar los stubs; "preload" en el padre)
+    from services import warmup
+
+    # Precalienta contexto + borradores base en el almacén compartido antes de hacer fork
+    # (el camino de la request solo lee RESPONSE_CACHE; lo escribe warm_responses)
+    warmup.warm_contexts(NICHES, k=10)
+    warmup.warm_responses(NICHES, k=10, rate=0)
+    stub.stop()  # los workers no llaman al LLM (hilo del stub no sobrevive al fork)
+
+    print(f"núcleos disponibles: {cpus()} | {args.seconds:g} s por corrida")
+    print(f"{'workers':>7} | {'req/s':>8} {'x1':>5} | {'RSS/worker':>10} {'USS/worker':>10} "
+          f"{'PSS total':>10} {'N x RSS':>10}")
+    base = None
+    for n in (int(x) for x in args.workers.split(",")):
+        res = run_workers(api.app, n, args.seconds)
+        base = base or res["rps"]
+        print(f"{n:>7} | {res['rps']:8.1f} {res['rps'] / base:5.2f} | {res['rss'] / 1024:8.1f}MB "
+              f"{res['uss'] / 1024:8.1f}MB {res['pss'] / 1024:8.1f}MB {n * res['rss'] / 1024:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
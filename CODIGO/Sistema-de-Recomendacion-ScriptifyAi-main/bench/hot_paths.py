@@ -0,0 +1,216 @@
+# bench/hot_paths.py
+"""
+Micro-benchmarks de los caminos CPU de cada request, con fixtures realistas
+construidas desde youtube_merged_clean.csv y niche_lexicon_pack.csv, a varios
+tamaños de entrada:
+
+  infer_rates / decide_focus, _build_prompt (una guía por foco), _validate_and_fix,
+  _enforce_hashtags, _sanitize_hashtags_block, _build_allowed_hashtag_vocab,
+  _extract_top_keywords_from_titles, el scoring del re-ranking de ideas
+  (idea_ranker.score_ideas, embeddings ya en caché) y la serialización de la respuesta.
+
+    python bench/hot_paths.py                  # mide y muestra
+    python bench/hot_paths.py --save           # guarda baseline (bench/baselines/hot_paths.json)
+    python bench/hot_paths.py --compare        # falla (exit 1) si algo empeora > --tolerance
+    python bench/hot_paths.py -k hashtags      # solo casos cuyo nombre contiene "hashtags"
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from _util import ROOT, lexicon_terms, read_csv
+from stubs import fake_embedding
+
+from core.serialization import dumps
+from services import graph_examples, idea_ranker, llm_ollama
+from services.recommender import Metrics, decide_focus, infer_rates
+
+BASELINE = ROOT / "bench" / "baselines" / "hot_paths.json"
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.05, repeat: int = 5) -> float:
+    """Mejor media por llamada (µs). Calibra `number` para que cada ronda dure >= min_time."""
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t0 >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best * 1e6
+
+
+# ----------------------------
+# Fixtures
+# ----------------------------
+
+class Fixtures:
+    def __init__(self, seed: int = 2024):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.rows = [r for r in read_csv("youtube_merged_clean.csv") if r.get("title")]
+        self.titles = [r["title"] for r in self.rows]
+        self.terms = lexicon_terms()
+        lex = read_csv("niche_lexicon_pack.csv")
+        self.niches = sorted({r["niche"] for r in lex})
+
+    def examples(self, n: int) -> List[Dict[str, Any]]:
+        return [{"videoId": r["videoId"], "title": r["title"], "publishedAt": r["publishedAt"],
+                 "hashtags_for_examples": ["#" + t.strip().replace(" ", "") for t in r["tags"].split(",")[:3] if t.strip()]}
+                for r in self.rng.sample(self.rows, n)]
+
+    def ideas(self, n: int) -> List[str]:
+        return [t[:70] for t in self.rng.sample(self.titles, n)]
+
+    def hashtags(self, ideas: List[str], per_idea: int = 3) -> List[List[str]]:
+        return [["#" + w.lower() for w in idea.split()[:per_idea]] for idea in ideas]
+
+    def llm_ctx(self, niche: str, n_examples: int) -> Dict[str, Any]:
+        return graph_examples.build_llm_context(niche, ["detailing", "branding"], "youtube", 10, "GL",
+                                                preset_examples=self.examples(n_examples))
+
+    def metrics(self) -> Metrics:
+        r = self.rng
+        return Metrics(platform="youtube", niche=r.choice(self.niches), impressions=r.randint(1000, 200000),
+                       reach=r.randint(500, 150000), clicks=r.randint(10, 5000), followers=r.randint(100, 100000),
+                       likes=r.randint(10, 10000), shares=r.randint(0, 500), saves=r.randint(0, 800),
+                       comments=r.randint(0, 600), conversions=r.randint(0, 50))
+
+
+def cases(fx: Fixtures) -> List[Case]:
+    out: List[Case] = []
+    niche = "automotriz"
+    specialties = ["detailing", "motor"]
+
+    # infer_rates se cachea en el objeto: cada vuelta parte de un Metrics nuevo (incluye validar)
+    raw = fx.metrics().dict()
+    out.append(("infer_rates", lambda: infer_rates(Metrics.from_dict(raw))))
+    out.append(("decide_focus", lambda: decide_focus(Metrics.from_dict(raw))))
+
+    # Cada foco de decide_focus lleva su propia guía en el prompt (y solo esa)
+    ctx = fx.llm_ctx(niche, 20)
+    examples = fx.examples(20)
+    for focus, guide in llm_ollama._FOCUS_GUIDES.items():
+        metrics = {"inputs": dict(raw, focus_hint=focus)}
+        msgs = llm_ollama._build_prompt(niche, metrics, examples, specialties, "youtube", ctx)
+        user = msgs[-1]["content"]
+        others = [g for f, g in llm_ollama._FOCUS_GUIDES.items() if f != focus]
+        assert guide in user and not any(g in user for g in others), f"guía incorrecta para foco={focus}"
+        out.append((f"build_prompt[{focus}]",
+                    lambda mt=metrics: llm_ollama._build_prompt(niche, mt, examples, specialties, "youtube", ctx)))
+
+    for n in (10, 50, 200):
+        titles = [e["title"] for e in fx.examples(n)]
+        out.append((f"extract_top_keywords[{n}]", lambda t=titles: graph_examples._extract_top_keywords_from_titles(t, 20)))
+
+    for n_ideas in (12, 50):
+        ctx = fx.llm_ctx(niche, 20)
+        ideas = fx.ideas(n_ideas)
+        tags = fx.hashtags(ideas)
+        vocab = llm_ollama._build_allowed_hashtag_vocab(niche, specialties, ctx, ideas)
+        out.append((f"build_allowed_vocab[{n_ideas}]",
+                    lambda c=ctx, i=ideas: llm_ollama._build_allowed_hashtag_vocab(niche, specialties, c, i)))
+        out.append((f"enforce_hashtags[{n_ideas}]",
+                    lambda i=ideas, v=vocab: llm_ollama._enforce_hashtags(i, niche, specialties, allowed_vocab=v)))
+        out.append((f"sanitize_hashtags[{n_ideas}]",
+                    lambda t=tags, v=vocab: llm_ollama._sanitize_hashtags_block(t, niche, allowed_vocab=v)))
+
+        base = {"recommendation": "Muestra el detailing completo de un coche real",
+                "reason": "Poca gente entra.\n- Abre con el resultado\n- Un paso por video\n- Pregunta al final\n- Repite lo que funciona",
+                "ideas": ideas, "hashtags_for_ideas": tags}
+        out.append((f"validate_and_fix[{n_ideas}]",
+                    lambda b=base, c=ctx: llm_ollama._validate_and_fix(dict(b), niche, specialties, llm_ctx=c)))
+
+    # Re-ranking: solo el producto de matrices + penalización de duplicados (sin HTTP)
+    for n_ideas in (12, 50):
+        ideas_m = idea_ranker._normalize_rows(np.array([fake_embedding(t) for t in fx.ideas(n_ideas)], dtype=np.float32))
+        refs = [e["title"] for e in fx.examples(12)] + list(fx.llm_ctx(niche, 12)["glossary"])
+        ref_m = idea_ranker._normalize_rows(np.array([fake_embedding(t) for t in refs], dtype=np.float32))
+        out.append((f"score_ideas[{n_ideas}]", lambda i=ideas_m, r=ref_m: idea_ranker.score_ideas(i, r, 12)))
+
+    for n in (10, 50, 200):
+        payload = {"recommendation": "x", "reason": "y", "ideas": fx.ideas(12),
+                   "diagnostics": {"inputs": {"niche": niche, "ctr": None}, "trends": [{"keyword": "k", "score": float("nan")}] * 12},
+                   "examples": fx.examples(n), "hashtags_for_ideas": fx.hashtags(fx.ideas(12))}
+        out.append((f"serialize_response[{n}]", lambda p=payload: dumps(p)))
+    return out
+
+
+# ----------------------------
+# Baseline
+# ----------------------------
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", "--filter", default="", help="solo casos cuyo nombre contiene este texto")
+    ap.add_argument("--save", action="store_true", help="guarda los resultados como baseline")
+    ap.add_argument("--compare", action="store_true", help="compara con el baseline guardado")
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--tolerance", type=float, default=1.25, help="ratio máximo actual/baseline")
+    args = ap.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if args.compare:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")).get("results", {})
+
+    results: Dict[str, float] = {}
+    regressions: List[str] = []
+    print(f"{'caso':<30} | {'µs/llamada':>12} | {'baseline':>12} | ratio")
+    for name, fn in cases(Fixtures()):
+        if args.filter and args.filter not in name:
+            continue
+        us = measure(fn)
+        results[name] = us
+        base = baseline.get(name)
+        ratio = (us / base) if base else None
+        flag = ""
+        if ratio is not None and ratio > args.tolerance:
+            regressions.append(name)
+            flag = "  <-- REGRESIÓN"
+        print(f"{name:<30} | {us:12.2f} | {base if base else float('nan'):12.2f} | "
+              f"{ratio if ratio is not None else float('nan'):5.2f}{flag}")
+
+    if args.save:
+        path = Path(args.baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "commit": git_rev(),
+            "python": sys.version.split()[0],
+            "machine": f"{platform.system()} {platform.machine()}",
+            "unit": "us_per_call",
+            "results": results,
+        }, indent=2), encoding="utf-8")
+        print(f"baseline -> {path}")
+
+    if regressions:
+        print(f"{len(regressions)} regresiones (> x{args.tolerance}): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench/import_time.py
+"""
+Presupuesto de arranque: mide `python -X importtime -c "import main"` y lo resume
+en una tabla por paquete de primer nivel. Sale con código 1 si la mediana supera
+el presupuesto (--budget-ms o IMPORT_BUDGET_MS), para usarlo como gate.
+
+    python bench/import_time.py [--runs 5] [--budget-ms 250] [--top 15] [--out res.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from _util import APP_DIR
+
+
+def run_once(module: str) -> List[Tuple[int, int, str]]:
+    """[(self_us, cumulative_us, nombre_con_indentación), ...] de una ejecución en frío."""
+    env = dict(os.environ, PYTHONPATH=str(APP_DIR))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cum_us, name = (p.strip(" ") for p in line.replace("import time:", "|", 1).split("|"))
+        rows.append((int(self_us), int(cum_us), name))
+    return rows
+
+
+def summarize(rows: List[Tuple[int, int, str]], module: str) -> Tuple[int, Dict[str, int]]:
+    total = next(cum for _, cum, name in rows if name.strip() == module)
+    by_pkg: Dict[str, int] = {}
+    for self_us, _, name in rows:
+        pkg = name.strip().split(".")[0]
+        by_pkg[pkg] = by_pkg.get(pkg, 0) + self_us
+    return total, by_pkg
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--module", default="main")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "250")))
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--out", default=None, help="guarda el resumen en JSON")
+    args = ap.parse_args()
+
+    totals: List[int] = []
+    pkg_runs: Dict[str, List[int]] = {}
+    for _ in range(args.runs):
+        total, by_pkg = summarize(run_once(args.module), args.module)
+        totals.append(total)
+        for pkg, us in by_pkg.items():
+            pkg_runs.setdefault(pkg, []).append(us)
+
+    median_ms = statistics.median(totals) / 1000
+    pkgs = sorted(((statistics.median(v) / 1000, k) for k, v in pkg_runs.items()), reverse=True)
+
+    print(f"{'paquete':<28} | {'self (ms)':>9}")
+    print("-" * 41)
+    for ms, pkg in pkgs[:args.top]:
+        print(f"{pkg:<28} | {ms:9.1f}")
+    print("-" * 41)
+    status = "OK" if median_ms <= args.budget_ms else "EXCEDIDO"
+    print(f"import {args.module}: mediana {median_ms:.1f} ms en {args.runs} runs "
+          f"(presupuesto {args.budget_ms:.0f} ms) -> {status}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"module": args.module, "median_ms": median_ms, "budget_ms": args.budget_ms,
+                       "runs_ms": [t / 1000 for t in totals],
+                       "packages_ms": {k: ms for ms, k in pkgs}}, fh, indent=2)
+
+    sys.exit(0 if median_ms <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
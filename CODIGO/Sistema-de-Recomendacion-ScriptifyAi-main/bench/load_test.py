@@ -0,0 +1,182 @@
+# bench/load_test.py
+"""
+Prueba de carga reproducible: levanta la app FastAPI en proceso (httpx + ASGI),
+con Ollama y Neo4j sustituidos por los dobles de bench/stubs.py, y dispara
+/recommend, /recommend/llm y /debug/vector-search a concurrencia fija.
+
+Reporta p50/p95/p99 y req/s por endpoint y guarda el resultado en JSON para
+comparar entre commits (regresiones en serialización, build_llm_context,
+validación, ...).
+
+    python bench/load_test.py [--concurrency 8] [--requests 200]
+                              [--latency-ms 50] [--tokens-per-s 200] [--snapshot]
+                              [--out bench/results/load.json]
+                              [--baseline bench/results/load-<commit>.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from _util import ROOT, read_csv
+from stubs import OllamaStub, install_stubs
+
+API_KEY = os.getenv("API_KEY", "supersecreto")
+ENDPOINTS = ("recommend", "recommend_llm", "vector_search")
+
+
+def percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def request_factory(rng: random.Random) -> Dict[str, Callable[[], Tuple[str, str, Dict[str, Any]]]]:
+    lex = read_csv("niche_lexicon_pack.csv")
+    pairs = sorted({(r["niche"], r["region"]) for r in lex})
+    titles = [r["title"] for r in read_csv("youtube_merged_clean.csv") if r.get("title")]
+
+    def metrics() -> Dict[str, Any]:
+        niche, region = rng.choice(pairs)
+        return {
+            "platform": rng.choice(["youtube", "shorts", "tiktok", "instagram"]),
+            "niche": niche, "region": region,
+            "impressions": rng.randint(1000, 200000), "reach": rng.randint(500, 150000),
+            "clicks": rng.randint(10, 5000), "followers": rng.randint(100, 100000),
+            "likes": rng.randint(10, 10000), "shares": rng.randint(0, 500),
+            "saves": rng.randint(0, 800), "comments": rng.randint(0, 600),
+            "specialties": rng.sample(["detailing", "recetas", "rutinas", "branding", "webxr", "ahorro"], 2),
+            "top_k": 8,
+        }
+
+    return {
+        "recommend": lambda: ("POST", "/recommend", {"json": metrics()}),
+        "recommend_llm": lambda: ("POST", "/recommend/llm", {"json": metrics()}),
+        "vector_search": lambda: ("GET", "/debug/vector-search", {"params": {"q": rng.choice(titles)[:60], "k": 5}}),
+    }
+
+
+async def drive(client, make_request, total: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, kw = make_request()
+            t0 = time.perf_counter()
+            resp = await client.request(method, url, headers={"x-api-key": API_KEY}, **kw)
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat),
+        "errors": errors,
+        "rps": len(lat) / wall if wall else 0.0,
+        "p50_ms": percentile(lat, 50) * 1000,
+        "p95_ms": percentile(lat, 95) * 1000,
+        "p99_ms": percentile(lat, 99) * 1000,
+        "mean_ms": (sum(lat) / len(lat) * 1000) if lat else 0.0,
+    }
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+
+    stub = OllamaStub(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s).start()
+    if args.snapshot:
+        # Lecturas desde un snapshot local exportado del driver falso (sin "Neo4j" por request)
+        import tempfile
+
+        os.environ["GRAPH_SNAPSHOT_PATH"] = tempfile.mkdtemp(prefix="scriptify-snap-")
+    driver = install_stubs(stub, query_delay_ms=args.db_latency_ms)
+    if args.snapshot:
+        from services.snapshot import export_snapshot
+
+        export_snapshot(driver.session())
+    import main  # noqa: E402  (debe importarse tras instalar los stubs)
+
+    rng = random.Random(args.seed)
+    factories = request_factory(rng)
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for name in args.endpoints.split(","):
+            # calentamiento: primeras llamadas (imports diferidos, cachés frías) fuera de la medida
+            await drive(client, factories[name], total=min(args.concurrency, 4), concurrency=1)
+            results[name] = await drive(client, factories[name], total=args.requests, concurrency=args.concurrency)
+    stub.stop()
+    return {
+        "commit": git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "model_calls": dict(stub.calls),
+        "endpoints": results,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200, help="requests medidos por endpoint")
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="latencia fija del stub de Ollama")
+    ap.add_argument("--tokens-per-s", type=float, default=200.0, help="velocidad de generación del stub")
+    ap.add_argument("--db-latency-ms", type=float, default=2.0, help="latencia por query del driver falso")
+    ap.add_argument("--snapshot", action="store_true", help="sirve lecturas desde GRAPH_SNAPSHOT_PATH (services/snapshot.py)")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--out", default=str(ROOT / "bench" / "results" / "load.json"))
+    ap.add_argument("--baseline", default=None, help="JSON de una corrida anterior para comparar")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+
+    print(f"commit {report['commit']} | concurrencia {args.concurrency} | stub {args.latency_ms:.0f}ms + {args.tokens_per_s:.0f} tok/s")
+    print(f"{'endpoint':<15} | {'req':>5} | {'err':>4} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for name, r in report["endpoints"].items():
+        print(f"{name:<15} | {r['requests']:>5} | {r['errors']:>4} | {r['rps']:8.1f} | "
+              f"{r['p50_ms']:8.1f} | {r['p95_ms']:8.1f} | {r['p99_ms']:8.1f}")
+
+    if args.baseline:
+        base = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print(f"vs {base.get('commit')} ({args.baseline}):")
+        for name, r in report["endpoints"].items():
+            b = base.get("endpoints", {}).get(name)
+            if not b:
+                continue
+            deltas = [f"{m} {100.0 * (r[m] - b[m]) / b[m]:+6.1f}%" for m in ("rps", "p50_ms", "p95_ms", "p99_ms") if b.get(m)]
+            print(f"  {name:<15} | " + " | ".join(deltas))
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"resultado -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+# bench/stubs.py
+"""
+Dobles deterministas para medir la API sin Neo4j ni un modelo real:
+
+  - OllamaStub: servidor HTTP local que imita /api/chat, /api/generate,
+    /api/embeddings, /api/embed y /api/tags con latencia y velocidad de
+    tokens configurables.
+  - FakeDriver: driver Neo4j en memoria (examples/trends desde los CSV del
+    proyecto) que responde a las queries de graph_examples y embeddings_neo4j.
+
+Uso típico (antes de importar `main`):
+
+    stub = OllamaStub(latency_ms=50, tokens_per_s=200).start()
+    install_stubs(stub)          # fija OLLAMA_HOST e instala FakeDriver
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from _util import read_csv
+
+EMBED_DIM = int(os.getenv("EMBED_DIM", "768"))
+
+
+# ----------------------------
+# Embeddings deterministas (hash de trigramas -> vector normalizado)
+# ----------------------------
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> List[float]:
+    vec = [0.0] * dim
+    t = f"  {(text or '').lower()}  "
+    for i in range(len(t) - 2):
+        h = int.from_bytes(hashlib.blake2b(t[i:i + 3].encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+# ----------------------------
+# Respuesta de chat determinista y válida para _validate_and_fix
+# ----------------------------
+
+def _field(prompt: str, label: str) -> str:
+    # "- Nicho: x" (prompt principal) o "Nicho: x | Plataforma: ..." (crítica)
+    m = re.search(rf"(?:^|- |\| ){label}: ([^|\n]*)", prompt, re.M)
+    return m.group(1).strip() if m else ""
+
+
+def fake_recommendation(prompt: str) -> Dict[str, Any]:
+    niche = _field(prompt, "Nicho") or "tu nicho"
+    specialties = [s.strip() for s in _field(prompt, "Especialidades").split(",") if s.strip() and s.strip() != "—"]
+    glossary = [g.strip() for g in _field(prompt, "Glosario del nicho").split(",") if g.strip()] or [niche]
+    spec = specialties[0] if specialties else niche
+    patterns = ["Antes y después: {}", "Errores que arruinan tu {}", "En 3 pasos: {} sin complicarte",
+                "Mitos vs realidad sobre {}", "Comparativa real de {}", "Qué haría un pro con {}",
+                "Checklist antes de empezar con {}", "Caso real: {} de cero a listo",
+                "Lo que nadie cuenta de {}", "Reto de una semana con {}", "Guía honesta de {} para hoy"]
+    ideas = [p.format(glossary[i % len(glossary)]) for i, p in enumerate(patterns)]
+    return {
+        "recommendation": f"Muestra un resultado visible de {spec} en tu próximo video.",
+        "reason": ("Poca gente entra y se van pronto; el propósito es atraer. Como una vitrina bien iluminada.\n"
+                   f"- Abre con el resultado final de {spec}\n- Cuenta un solo paso por video\n"
+                   "- Cierra con una pregunta concreta\n- Repite el formato que mejor funcione"),
+        "ideas": ideas,
+        "hashtags_for_ideas": [[f"#{re.sub(r'[^a-z0-9]', '', glossary[i % len(glossary)].lower())}"] for i in range(len(ideas))],
+    }
+
+
+_EXTRA_PATTERNS = ["Cómo empezar con {} desde cero", "Tres errores de novato con {}", "Lo que cambió mi {} este año",
+                   "Pruebo {} durante siete días", "Preguntas frecuentes sobre {}", "El truco más simple para {}",
+                   "Qué comprar primero para {}", "Así organizo mi {} cada semana", "Respondo dudas reales de {}",
+                   "Lo básico de {} explicado fácil", "Mi rutina de {} paso a paso", "Qué evitar al probar {}"]
+
+
+def fake_field(prompt: str, field: str) -> Dict[str, Any]:
+    """Respuesta a un prompt de reparación de un solo campo (solo esa clave)."""
+    base = fake_recommendation(prompt)
+    if field == "ideas":
+        m = re.search(r"Escribe (\d+) títulos", prompt)
+        glossary = [g.strip() for g in _field(prompt, "Glosario del nicho").split(",") if g.strip()] \
+            or [_field(prompt, "Nicho") or "tu nicho"]
+        n = int(m.group(1)) if m else 4
+        return {"ideas": [p.format(glossary[i % len(glossary)]) for i, p in enumerate(_EXTRA_PATTERNS[:n])]}
+    if field == "hashtags_for_ideas":
+        m = re.search(r"- Títulos: (.*)", prompt)   # separados por " | ": no vale _field
+        titles = [t.strip() for t in (m.group(1) if m else "").split(" | ") if t.strip()]
+        rows = []
+        for t in titles:
+            words = [re.sub(r"[^a-z0-9]", "", w) for w in re.findall(r"\w{5,}", t.lower())]
+            rows.append([f"#{w}" for w in words[-2:] if w])
+        return {"hashtags_for_ideas": rows}
+    return {field: base.get(field)}
+
+
+def damage(payload: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    """Estropea un campo como suele fallar el modelo: bullets, especialidad, nº de ideas o hashtags."""
+    if "hashtags_for_ideas" in payload and "ideas" not in payload:
+        payload["hashtags_for_ideas"] = payload["hashtags_for_ideas"][:-1]
+        return payload
+    kind = rng.choice([k for k in ("reason", "recommendation", "ideas") if k in payload])
+    if kind == "reason":
+        payload["reason"] = payload["reason"].rsplit("\n", 1)[0]            # 3 bullets
+    elif kind == "recommendation":
+        payload["recommendation"] = "Muestra un resultado visible en tu próximo video."
+    else:
+        payload["ideas"] = payload["ideas"][:7 if "recommendation" in payload else 1]
+        if "hashtags_for_ideas" in payload:
+            payload["hashtags_for_ideas"] = payload["hashtags_for_ideas"][:7]
+    return payload
+
+
+# ----------------------------
+# Servidor Ollama falso
+# ----------------------------
+
+class OllamaStub:
+    def __init__(self, latency_ms: float = 50.0, tokens_per_s: float = 200.0, host: str = "127.0.0.1", port: int = 0,
+                 tail_prob: float = 0.0, tail_factor: float = 1.0, seed: int = 7, defect_prob: float = 0.0,
+                 model_speed: Optional[Dict[str, float]] = None, model_defects: Optional[Dict[str, float]] = None):
+        self.latency_ms = latency_ms
+        self.tokens_per_s = tokens_per_s
+        # cola lenta: con probabilidad tail_prob una generación tarda tail_factor veces más
+        self.tail_prob = tail_prob
+        self.tail_factor = tail_factor
+        self._rng = random.Random(seed)
+        # con probabilidad defect_prob el borrador completo sale con un campo inválido
+        self.defect_prob = defect_prob
+        # por modelo: x veces más rápido que el de referencia y prob. de estropear cualquier respuesta
+        self.model_speed: Dict[str, float] = dict(model_speed or {})
+        self.model_defects: Dict[str, float] = dict(model_defects or {})
+        self.models: Dict[str, int] = defaultdict(int)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.cancelled = 0          # generaciones en streaming cortadas por el cliente
+        self.tokens_generated = 0   # tokens (estimados) realmente emitidos
+        self.prompt_tokens = 0      # tokens (estimados) de prompt evaluados
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OllamaStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _generation_delay(self, text: str, model: Optional[str] = None) -> float:
+        tokens = max(1, len(text) // 4)
+        delay = self.latency_ms / 1000.0 + (tokens / self.tokens_per_s if self.tokens_per_s > 0 else 0.0)
+        delay /= self.model_speed.get(model or "", 1.0)
+        with self._lock:
+            slow = self.tail_prob > 0 and self._rng.random() < self.tail_prob
+        return delay * (self.tail_factor if slow else 1.0)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):  # silencio en stdout
+                pass
+
+            def _send(self, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, req: Dict[str, Any], text: str, delay: float, usage: Dict[str, Any]) -> None:
+                """NDJSON en trozos de ~8 tokens; si el cliente cierra, se deja de generar."""
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                pieces = [text[i:i + 32] for i in range(0, len(text), 32)] or [""]
+                step = delay / len(pieces)
+                try:
+                    for i, piece in enumerate(pieces):
+                        time.sleep(step)
+                        last = i == len(pieces) - 1
+                        chunk = {"model": req.get("model"), "response": piece, "done": last, **(usage if last else {})}
+                        self.wfile.write(json.dumps(chunk).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                        with stub._lock:
+                            stub.tokens_generated += len(piece) // 4
+                except (BrokenPipeError, ConnectionResetError):
+                    with stub._lock:
+                        stub.cancelled += 1
+                    self.close_connection = True
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.calls[self.path] += 1
+                self._send({"models": [{"model": "stub", "name": "stub"}]})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                req = json.loads(raw or b"{}")
+                with stub._lock:
+                    stub.calls[self.path] += 1
+                if self.path in ("/api/embeddings", "/api/embed"):
+                    inp = req.get("input", req.get("prompt", ""))
+                    time.sleep(stub.latency_ms / 1000.0 / 10)
+                    if isinstance(inp, list):
+                        self._send({"embeddings": [fake_embedding(t) for t in inp]})
+                    else:
+                        self._send({"embedding": fake_embedding(inp)})
+                    return
+                if self.path == "/api/chat":
+                    prompt = "\n".join(m.get("content", "") for m in req.get("messages", []))
+                else:
+                    prompt = req.get("prompt", "")
+                model = req.get("model") or ""
+                only = re.search(r'Devuelve SOLO JSON con la clave "(\w+)"', prompt)
+                payload = fake_field(prompt, only.group(1)) if only else fake_recommendation(prompt)
+                with stub._lock:
+                    stub.models[model] += 1
+                    p = stub.model_defects.get(model, 0.0)
+                    if not only and "Repara el JSON" not in prompt:
+                        p = max(p, stub.defect_prob)
+                    broken = p > 0 and stub._rng.random() < p
+                if broken:
+                    payload = damage(payload, stub._rng)
+                text = json.dumps(payload, ensure_ascii=False)
+                usage = {"prompt_eval_count": len(prompt) // 4, "eval_count": len(text) // 4, "done": True}
+                with stub._lock:
+                    stub.prompt_tokens += len(prompt) // 4
+                if req.get("stream") and self.path == "/api/generate":
+                    self._stream(req, text, stub._generation_delay(text, model), usage)
+                    return
+                time.sleep(stub._generation_delay(text, model))
+                with stub._lock:
+                    stub.tokens_generated += len(text) // 4
+                if self.path == "/api/chat":
+                    self._send({"model": req.get("model"), "message": {"role": "assistant", "content": text}, **usage})
+                else:
+                    self._send({"model": req.get("model"), "response": text, **usage})
+
+        return Handler
+
+
+# ----------------------------
+# Driver Neo4j falso (solo lectura, datos de los CSV)
+# ----------------------------
+
+class FakeRecord(dict):
+    def data(self) -> Dict[str, Any]:
+        return dict(self)
+
+
+class FakeResult:
+    def __init__(self, records: List[FakeRecord]):
+        self._records = records
+
+    def __iter__(self) -> Iterator[FakeRecord]:
+        return iter(self._records)
+
+    def single(self) -> Optional[FakeRecord]:
+        return self._records[0] if self._records else None
+
+    def data(self) -> List[Dict[str, Any]]:
+        return [r.data() for r in self._records]
+
+
+class FakeGraph:
+    """Modelo de lectura en memoria indexado por (nicho, región)."""
+
+    def __init__(self):
+        self.examples: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self.videos: List[Dict[str, Any]] = []
+        for r in read_csv("youtube_merged_clean.csv"):
+            if not r.get("title"):
+                continue
+            ex = {
+                "videoId": r["videoId"],
+                "url": f"https://youtu.be/{r['videoId']}",
+                "title": r["title"],
+                "publishedAt": r.get("publishedAt"),
+                "hashtags_for_examples": [f"#{t.strip().replace(' ', '')}" for t in (r.get("tags") or "").split(",")[:3] if t.strip()],
+            }
+            self.examples[((r.get("niche") or "").lower(), (r.get("region") or "GL").upper())].append(ex)
+            self.videos.append({**ex, "engagement_rate": float(r.get("engagement_rate") or 0.0),
+                                "seconds": float(r.get("seconds") or 0.0)})
+        self.matrix = np.array([fake_embedding(v["title"]) for v in self.videos], dtype=np.float32)
+        for rows in self.examples.values():
+            rows.sort(key=lambda e: e.get("publishedAt") or "", reverse=True)
+        self.trends: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        for r in read_csv("trends_keywords_merged_clean.csv"):
+            self.trends[((r.get("niche") or "").lower(), (r.get("region") or "GL").upper())].append({
+                "keyword": (r.get("keyword") or "").lower(), "score": float(r.get("score") or 0.0),
+                "score_norm": float(r.get("score_norm") or 0.0), "timeframe": r.get("timeframe"), "source": r.get("source"),
+            })
+
+        self._lexeme_nn: Optional[Dict[str, Dict[str, Tuple[List[str], List[float]]]]] = None
+
+    def lexeme_nn(self, k: int = 8, min_sim: float = 0.3) -> Dict[str, Dict[str, Tuple[List[str], List[float]]]]:
+        """Lo que deja scripts/embed_graph.build_neighbors: vecinos por lexema del nicho."""
+        if self._lexeme_nn is None:
+            lex: Dict[str, set] = defaultdict(set)
+            for r in read_csv("niche_lexicon_pack.csv"):
+                lex[(r.get("niche") or "").lower()].update(
+                    t.strip().lower() for t in (r.get("top_keywords") or "").split("|") if t.strip())
+            out: Dict[str, Dict[str, Tuple[List[str], List[float]]]] = {}
+            for niche, terms in lex.items():
+                if not terms:
+                    continue
+                pool = sorted(terms | {t["keyword"] for (n, _), rows in self.trends.items() if n == niche for t in rows})
+                m = np.array([fake_embedding(t) for t in pool], dtype=np.float32)
+                pos = {t: i for i, t in enumerate(pool)}
+                sims = m[[pos[t] for t in sorted(terms)]] @ m.T
+                out[niche] = {}
+                for row, t in zip(sims, sorted(terms)):
+                    order = [j for j in np.argsort(-row)[:k + 1] if pool[j] != t and row[j] >= min_sim][:k]
+                    out[niche][t] = ([pool[j] for j in order], [float(row[j]) for j in order])
+            self._lexeme_nn = out
+        return self._lexeme_nn
+
+    def context(self, niche: str, region: str, top_k: int, top_trends: int) -> FakeRecord:
+        ex = self.examples.get((niche, region)) or self.examples.get((niche, "GL")) or []
+        tr = self.trends.get((niche, region)) or []
+        return FakeRecord(examples=ex[:top_k], trends=tr[:top_trends])
+
+    def vector_query(self, vec: List[float], limit: int) -> List[FakeRecord]:
+        scores = self.matrix @ np.asarray(vec, dtype=np.float32)
+        top = np.argsort(-scores)[:limit]
+        return [FakeRecord(videoId=self.videos[i]["videoId"], title=self.videos[i]["title"],
+                           engagement_rate=self.videos[i]["engagement_rate"], seconds=self.videos[i]["seconds"],
+                           publishedAt=self.videos[i]["publishedAt"], score=float(scores[i] + 1) / 2) for i in top]
+
+
+class FakeSession:
+    def __init__(self, graph: FakeGraph, query_delay_s: float):
+        self.graph = graph
+        self.query_delay_s = query_delay_s
+
+    def __enter__(self) -> "FakeSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+    def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, **params: Any) -> FakeResult:
+        params = {**(parameters or {}), **params}
+        if self.query_delay_s:
+            time.sleep(self.query_delay_s)
+        if "UNWIND $items" in query and "hashtags_for_examples" in query:
+            recs = []
+            for it in params.get("items") or []:
+                ctx = self.graph.context(it["niche"], it["region"], int(it["top_k"]), int(params.get("top_trends", 12)))
+                if ctx["examples"] or ctx["trends"]:
+                    recs.append(FakeRecord(niche=it["niche"], region=it["region"], **ctx))
+            return FakeResult(recs)
+        if "hashtags_for_examples" in query:
+            return FakeResult([self.graph.context(params.get("niche", ""), params.get("region", "GL"),
+                                                  int(params.get("top_k", 15)), int(params.get("top_trends", 12)))])
+        # Export del snapshot (services/snapshot.py): nichos por id, TrendKeyword por
+        # nicho/región (de ahí salen los pares de contexto) y videos con embedding
+        if "RETURN n.id AS niche, n.top_keywords" in query:
+            niches = sorted({n for n, _ in self.graph.examples} | {n for n, _ in self.graph.trends})
+            return FakeResult([FakeRecord(niche=n, top_keywords=[], top_tags=[], vocab=[]) for n in niches])
+        if "t.keyword AS keyword, t.score AS score" in query:
+            rows = [FakeRecord(niche=n, region=r, **t) for (n, r), ts in self.graph.trends.items() for t in ts]
+            return FakeResult(sorted(rows, key=lambda t: -(t["score_norm"] or 0.0)))
+        if "v.embedding AS embedding" in query:
+            return FakeResult([FakeRecord(videoId=v["videoId"], title=v["title"], engagement_rate=v["engagement_rate"],
+                                          seconds=v["seconds"], publishedAt=v["publishedAt"],
+                                          embedding=self.graph.matrix[i].tolist())
+                               for i, v in enumerate(self.graph.videos)])
+        if "l.nn_terms AS terms" in query:
+            nn = self.graph.lexeme_nn()
+            niches = [params["niche"]] if "niche" in params else list(nn)
+            return FakeResult([FakeRecord(niche=n, text=t, terms=v[0], scores=v[1])
+                               for n in niches for t, v in (nn.get(n) or {}).items()])
+        if "db.index.vector.queryNodes" in query:
+            return FakeResult(self.graph.vector_query(params.get("vec") or [], int(params.get("k", 5))))
+        return FakeResult([])
+
+
+class FakeDriver:
+    def __init__(self, graph: Optional[FakeGraph] = None, query_delay_ms: float = 2.0):
+        self.graph = graph or FakeGraph()
+        self.query_delay_s = query_delay_ms / 1000.0
+
+    def session(self, **_: Any) -> FakeSession:
+        return FakeSession(self.graph, self.query_delay_s)
+
+    def close(self) -> None:
+        return None
+
+
+def install_stubs(stub: OllamaStub, query_delay_ms: float = 2.0) -> FakeDriver:
+    """Apunta la API al stub de Ollama y al driver falso. Llamar ANTES de importar `main`."""
+    os.environ["OLLAMA_HOST"] = stub.url
+    # Almacén compartido aislado por corrida (no reutilizar cachés de otra ejecución)
+    os.environ.setdefault("SHARED_DIR", tempfile.mkdtemp(prefix="scriptify-bench-"))
+    from services import neo4j_client
+
+    driver = FakeDriver(query_delay_ms=query_delay_ms)
+    neo4j_client._DRIVER = driver  # type: ignore[assignment]
+    return driver
@@ -0,0 +1,78 @@
+# scripts/audit_query_plans.py
+"""
+Auditoría de planes: ejecuta EXPLAIN sobre cada query de producción de la API
+(services.graph_schema.production_queries) y falla (exit 1) si algún plan contiene
+NodeByLabelScan / AllNodesScan fuera de las queries marcadas como allow_scan.
+
+Contra un Neo4j local (p.ej. el de infra/docker-compose.yml):
+
+    NEO4J_URI=bolt://localhost:7687 NEO4J_PASSWORD=... \
+        python scripts/audit_query_plans.py --ensure-schema
+
+Contra un contenedor efímero (requiere `pip install testcontainers` y Docker):
+
+    python scripts/audit_query_plans.py --testcontainer
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+
+def _start_container(image: str):
+    try:
+        from testcontainers.neo4j import Neo4jContainer  # type: ignore
+    except ImportError:
+        raise SystemExit("--testcontainer requiere `pip install testcontainers`")
+    # APOC: _PAYLOAD_QUERY usa apoc.text.split / apoc.coll.toSet
+    c = Neo4jContainer(image).with_env("NEO4J_PLUGINS", '["apoc"]')
+    c.start()
+    os.environ["NEO4J_URI"] = c.get_connection_url()
+    os.environ["NEO4J_USER"] = "neo4j"
+    os.environ["NEO4J_PASSWORD"] = c.password
+    return c
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ensure-schema", action="store_true", help="crea índices/constraints antes de auditar")
+    ap.add_argument("--testcontainer", action="store_true", help="levanta un Neo4j efímero con testcontainers")
+    ap.add_argument("--image", default="neo4j:5")
+    ap.add_argument("--json", dest="json_out", default=None, help="guarda el informe en JSON")
+    args = ap.parse_args()
+
+    container = _start_container(args.image) if args.testcontainer else None
+    try:
+        # Import tras fijar NEO4J_* (el driver se crea bajo demanda)
+        from services.graph_schema import audit_plans, ensure_schema
+        from services.neo4j_client import close_driver
+
+        if args.ensure_schema or container is not None:
+            ensure_schema()
+        report = audit_plans()
+        close_driver()
+    finally:
+        if container is not None:
+            container.stop()
+
+    failed = [r for r in report if not r["ok"]]
+    for r in report:
+        status = "OK  " if r["ok"] else "FAIL"
+        note = " (scan permitido)" if r.get("allow_scan") and r["scans"] else ""
+        print(f"[{status}] {r['name']}{note}")
+        for s in r["scans"]:
+            print(f"         {s}")
+        if r.get("error"):
+            print(f"         {r['error']}")
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    print(f"{len(report) - len(failed)}/{len(report)} queries sin recorridos por etiqueta")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
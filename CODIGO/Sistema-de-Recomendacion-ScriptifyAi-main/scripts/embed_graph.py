@@ -3,12 +3,15 @@ import os
 import time
 import json
 import requests
+import numpy as np
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 
-DIM = 768  # nomic-embed-text
+DIM = int(os.getenv("EMBED_DIM", "768"))  # nomic-embed-text
 BATCH = 40
 SLEEP = (0.2, 0.6)
+NN_K = int(os.getenv("LEXEME_NN_K", "8"))              # vecinos guardados por lexema
+NN_MIN = float(os.getenv("LEXEME_NN_MIN_SIM", "0.5"))  # coseno mínimo para guardar un vecino
 
 def get_driver():
     load_dotenv()
@@ -20,7 +23,11 @@ def get_driver():
 def embed(texts):
     base = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     model = os.getenv("EMBED_MODEL", "nomic-embed-text")
-    resp = requests.post(f"{base}/api/embeddings", json={"model": model, "input": texts}, timeout=120)
+    # /api/embed acepta la lista completa; /api/embeddings (antiguo) solo un `prompt`
+    resp = requests.post(f"{base}/api/embed", json={"model": model, "input": texts}, timeout=120)
+    if resp.status_code == 404:
+        return [requests.post(f"{base}/api/embeddings", json={"model": model, "prompt": t}, timeout=120)
+                .json().get("embedding") or [] for t in texts]
     resp.raise_for_status()
     data = resp.json()
     # Ollama devuelve {"embeddings":[...]} o {"data":[{"embedding":[...]}...]}
@@ -28,59 +35,93 @@ def embed(texts):
         return data["embeddings"]
     if "data" in data:
         return [d["embedding"] for d in data["data"]]
-    raise RuntimeError(f"Formato inesperado embeddings: {data}")
+    raise RuntimeError(f"Formato inesperado embeddings: {json.dumps(data)[:200]}")
 
-SCHEMA = [
-    # Vector index para Video
-    f"""
-    CREATE VECTOR INDEX video_embedding_index
-    IF NOT EXISTS FOR (v:Video) ON (v.embedding)
-    OPTIONS {{
-      indexConfig: {{
-        `vector.dimensions`: {DIM},
-        `vector.similarity_function`: 'cosine'
-      }}
-    }}
-    """,
-    # Vector index para Keyword
-    f"""
-    CREATE VECTOR INDEX keyword_embedding_index
-    IF NOT EXISTS FOR (k:Keyword) ON (k.embedding)
+def _vector_index(name, label, prop="embedding"):
+    return f"""
+    CREATE VECTOR INDEX {name}
+    IF NOT EXISTS FOR (x:{label}) ON (x.{prop})
     OPTIONS {{
       indexConfig: {{
         `vector.dimensions`: {DIM},
         `vector.similarity_function`: 'cosine'
       }}
     }}
-    """,
+    """
+
+SCHEMA = [
+    _vector_index("video_embedding_index", "Video"),
+    # Nodos que crea el ETL (scripts/neo4j_etl.py): TrendKeyword.keyword y Lexeme.text
+    _vector_index("trend_keyword_embedding_index", "TrendKeyword"),
+    _vector_index("lexeme_embedding_index", "Lexeme"),
 ]
 
+# Video se crea con MERGE por `id` (constraint video_id); videoId no siempre existe
 Q_SELECT_V = """
 MATCH (v:Video)
 WHERE v.embedding IS NULL
-RETURN v.videoId AS id, coalesce(v.title,'') + ' | ' + coalesce(v.niche,'') + ' | ' + coalesce(v.region,'') AS text
+RETURN v.id AS id, coalesce(v.title,'') + ' | ' + coalesce(v.niche,'') + ' | ' + coalesce(v.region,'') AS text
 LIMIT $lim
 """
 
 Q_UPDATE_V = """
 UNWIND $rows AS row
-MATCH (v:Video {videoId: row.id})
+MATCH (v:Video {id: row.id})
 SET v.embedding = row.vec
 """
 
-Q_SELECT_K = """
-MATCH (k:Keyword)
-WHERE k.embedding IS NULL
-RETURN k.id AS id, coalesce(k.text,'') + ' | ' + coalesce(k.niche,'') + ' | ' + coalesce(k.region,'') AS text
+# Keywords y lexemas: solo el texto, para que los vecinos sean por significado
+Q_SELECT_T = """
+MATCH (k:TrendKeyword)
+WHERE k.embedding IS NULL AND k.keyword IS NOT NULL
+RETURN k.id AS id, k.keyword AS text
 LIMIT $lim
 """
 
-Q_UPDATE_K = """
+Q_UPDATE_T = """
 UNWIND $rows AS row
-MATCH (k:Keyword {id: row.id})
+MATCH (k:TrendKeyword {id: row.id})
 SET k.embedding = row.vec
 """
 
+Q_SELECT_L = """
+MATCH (l:Lexeme)
+WHERE l.embedding IS NULL AND l.text IS NOT NULL
+RETURN l.id AS id, l.text AS text
+LIMIT $lim
+"""
+
+Q_UPDATE_L = """
+UNWIND $rows AS row
+MATCH (l:Lexeme {id: row.id})
+SET l.embedding = row.vec
+"""
+
+# ---- Tabla de vecinos por lexema (dentro de su nicho) ----
+Q_NN_NICHES = """
+MATCH (n:Niche)<-[:IN_NICHE]-(l:Lexeme)
+WHERE l.embedding IS NOT NULL
+RETURN DISTINCT n.id AS niche
+"""
+
+Q_NN_LEXEMES = """
+MATCH (:Niche {id:$niche})<-[:IN_NICHE]-(l:Lexeme)
+WHERE l.embedding IS NOT NULL
+RETURN l.id AS id, l.text AS text, l.embedding AS emb
+"""
+
+Q_NN_TRENDS = """
+MATCH (:Niche {id:$niche})<-[:IN_NICHE]-(k:TrendKeyword)
+WHERE k.embedding IS NOT NULL
+RETURN k.keyword AS text, k.embedding AS emb
+"""
+
+Q_NN_UPDATE = """
+UNWIND $rows AS row
+MATCH (l:Lexeme {id: row.id})
+SET l.nn_terms = row.terms, l.nn_scores = row.scores
+"""
+
 def create_indexes(session):
     for q in SCHEMA:
         session.run(q)
@@ -93,18 +134,66 @@ def process_label(session, select_q, update_q, label):
         texts = [r["text"] for r in res]
         ids = [r["id"] for r in res]
         vecs = embed(texts)
-        rows = [{"id": i, "vec": v} for i, v in zip(ids, vecs)]
+        rows = [{"id": i, "vec": v} for i, v in zip(ids, vecs) if v and len(v) == DIM]
+        if not rows:
+            # el modelo no devuelve vectores válidos: no volver a pedir el mismo lote
+            print(f"[{label}] lote sin embeddings válidos, se detiene")
+            break
         session.run(update_q, rows=rows)
         total += len(rows)
         time.sleep(0.3)
     print(f"[{label}] Embeddings generados: {total}")
+    return total
+
+def _unit(vecs):
+    m = np.asarray(vecs, dtype=np.float32)
+    n = np.linalg.norm(m, axis=1, keepdims=True)
+    n[n == 0] = 1.0
+    return m / n
+
+def build_neighbors(session, k=NN_K, min_sim=NN_MIN):
+    """
+    Para cada lexema, sus k términos más cercanos (coseno) entre los lexemas y
+    TrendKeywords de su nicho -> l.nn_terms / l.nn_scores. Es lo que lee
+    services/term_expansion.py por request (sin llamar al modelo).
+    """
+    total = 0
+    for niche in [r["niche"] for r in session.run(Q_NN_NICHES)]:
+        lex = [r for r in session.run(Q_NN_LEXEMES, niche=niche) if r["emb"] and len(r["emb"]) == DIM]
+        if not lex:
+            continue
+        pool_text, pool_vecs, seen = [], [], set()
+        for r in list(lex) + [r for r in session.run(Q_NN_TRENDS, niche=niche)]:
+            if r["text"] and r["text"] not in seen and r["emb"] and len(r["emb"]) == DIM:
+                seen.add(r["text"])
+                pool_text.append(r["text"])
+                pool_vecs.append(r["emb"])
+        sims = _unit([r["emb"] for r in lex]) @ _unit(pool_vecs).T
+        rows = []
+        for i, r in enumerate(lex):
+            order = np.argsort(-sims[i])
+            terms, scores = [], []
+            for j in order:
+                if len(terms) >= k or sims[i, j] < min_sim:
+                    break
+                if pool_text[j] == r["text"]:
+                    continue
+                terms.append(pool_text[j])
+                scores.append(round(float(sims[i, j]), 4))
+            rows.append({"id": r["id"], "terms": terms, "scores": scores})
+        session.run(Q_NN_UPDATE, rows=rows)
+        total += len(rows)
+    print(f"[Lexeme NN] vecinos calculados: {total}")
+    return total
 
 def main():
     drv = get_driver()
     with drv.session() as s:
         create_indexes(s)
         process_label(s, Q_SELECT_V, Q_UPDATE_V, "Video")
-        process_label(s, Q_SELECT_K, Q_UPDATE_K, "Keyword")
+        process_label(s, Q_SELECT_T, Q_UPDATE_T, "TrendKeyword")
+        process_label(s, Q_SELECT_L, Q_UPDATE_L, "Lexeme")
+        build_neighbors(s)
     drv.close()
     print("[DONE] Embeddings listos.")
 
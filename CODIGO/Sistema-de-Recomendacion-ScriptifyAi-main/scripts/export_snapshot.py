@@ -0,0 +1,37 @@
+# scripts/export_snapshot.py
+"""
+Exporta el modelo de lectura de la API (contextos por nicho/región, top de
+ejemplos, trends, léxico y embeddings) a un snapshot local y lo publica de forma
+atómica como GRAPH_SNAPSHOT_PATH/current (ver app/services/snapshot.py).
+
+    NEO4J_URI=bolt://localhost:7687 NEO4J_PASSWORD=... \
+        python scripts/export_snapshot.py --out app/var/snapshot
+
+Las réplicas con GRAPH_SNAPSHOT_PATH apuntando a ese directorio (volumen
+compartido o copia sincronizada) detectan el swap en SNAPSHOT_CHECK_S segundos.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default=os.getenv("GRAPH_SNAPSHOT_PATH") or str(APP_DIR / "var" / "snapshot"))
+    args = ap.parse_args()
+
+    from services.neo4j_client import close_driver
+    from services.snapshot import export_snapshot
+
+    res = export_snapshot(path=args.out, progress=lambda i, n, step: print(f"[snapshot] {i + 1}/{n} {step}"))
+    close_driver()
+    print(json.dumps(res, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
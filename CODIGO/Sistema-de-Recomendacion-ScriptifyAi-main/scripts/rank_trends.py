@@ -0,0 +1,176 @@
+# scripts/rank_trends.py
+"""
+Ranking de tendencias post-ETL: puntuación con decaimiento temporal y mezcla
+región/global, calculada vectorizada en pandas, y top-K materializado por
+(nicho, región) en nodos (:TrendRanking {niche, region}) con listas paralelas
+(keywords, scores, score_norms, timeframes, sources).
+
+La lectura (graph_examples._PAYLOAD_QUERY, data_access.top_trends_by_niche) pasa
+a ser un lookup indexado por request en lugar de ordenar/contar en cada llamada.
+
+    python scripts/rank_trends.py --trends "data/DATASETS USADOS/trends_keywords_merged_clean.csv"
+    python scripts/rank_trends.py --trends ... --dry-run --show fitness:ES
+"""
+import argparse
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+
+TOP_K = int(os.getenv("TRENDS_TOP_K", "12"))
+HALF_LIFE_DAYS = float(os.getenv("TRENDS_HALF_LIFE_DAYS", "30"))
+REGION_WEIGHT = float(os.getenv("TRENDS_REGION_WEIGHT", "0.7"))
+GLOBAL_REGION = "GL"
+
+# Unidades de los timeframes de Google Trends ("now 7-d", "today 3-m", "today 5-y", "now 4-H")
+_UNIT_DAYS = {"H": 1.0 / 24.0, "d": 1.0, "m": 30.0, "y": 365.0}
+
+# ======== Ranking (vectorizado) ========
+
+def timeframe_days(tf: pd.Series) -> pd.Series:
+    """Longitud de la ventana en días; 'all' y desconocidos -> 5 años."""
+    parts = tf.astype(str).str.extract(r"(\d+)-([Hdmy])")
+    n = pd.to_numeric(parts[0], errors="coerce")
+    unit = parts[1].map(_UNIT_DAYS)
+    return (n * unit).fillna(5 * 365.0)
+
+
+def rank_trends(df: pd.DataFrame, top_k: int = TOP_K, half_life_days: float = HALF_LIFE_DAYS,
+                region_weight: float = REGION_WEIGHT) -> pd.DataFrame:
+    """
+    Devuelve una fila por (niche, region, keyword) del top-K con:
+      score      = w * local + (1 - w) * global    (región GL = solo global)
+      local      = Σ sigmoid(score_norm) * 0.5 ** (edad_media / half_life)   en esa región
+      global     = media de `local` del keyword en todas las regiones del nicho
+    La edad media de una ventana "últimos N días" es N/2.
+    """
+    d = df.rename(columns={c: c.lower() for c in df.columns}).copy()
+    d = d[d["niche"].notna() & d["keyword"].notna()]
+    d["niche"] = d["niche"].astype(str).str.strip().str.lower()
+    d["region"] = d["region"].fillna(GLOBAL_REGION).astype(str).str.strip().str.upper().replace("", GLOBAL_REGION)
+    d["keyword"] = d["keyword"].astype(str).str.strip().str.lower()
+    d["timeframe"] = d["timeframe"].fillna("").astype(str).str.strip()
+
+    # score_norm es un z-score (puede ser negativo): sigmoid -> (0, 1) antes de decaer.
+    # Sin score_norm usamos el percentil del score bruto dentro de su nicho.
+    z = pd.to_numeric(d.get("score_norm"), errors="coerce")
+    raw_pct = pd.to_numeric(d.get("score"), errors="coerce").groupby(d["niche"]).rank(pct=True)
+    strength = (1.0 / (1.0 + np.exp(-z))).fillna(raw_pct).fillna(0.0)
+    decay = np.power(0.5, (timeframe_days(d["timeframe"]) / 2.0) / max(half_life_days, 1e-6))
+    d["decayed"] = strength * decay
+
+    # Mejor fila por keyword (para timeframe/source/score_norm de referencia)
+    d = d.sort_values("decayed", ascending=False)
+    keys = ["niche", "region", "keyword"]
+    local = d.groupby(keys, sort=False).agg(
+        local=("decayed", "sum"),
+        score_norm=("score_norm", "first"),
+        timeframe=("timeframe", "first"),
+        source=("source", "first"),
+    ).reset_index()
+
+    glob = local.groupby(["niche", "keyword"], sort=False)["local"].mean().rename("global").reset_index()
+    regional = local.merge(glob, on=["niche", "keyword"], how="left")
+    regional["score"] = region_weight * regional["local"] + (1.0 - region_weight) * regional["global"]
+
+    # Ranking GL: solo el componente global (si el CSV no traía ya una región GL)
+    best = local.sort_values("local", ascending=False).drop_duplicates(["niche", "keyword"])
+    gl = glob.merge(best[["niche", "keyword", "score_norm", "timeframe", "source"]], on=["niche", "keyword"])
+    gl = gl.assign(region=GLOBAL_REGION, score=gl["global"])
+    have_gl = set(regional.loc[regional["region"] == GLOBAL_REGION, "niche"])
+    gl = gl[~gl["niche"].isin(have_gl)]
+
+    cols = ["niche", "region", "keyword", "score", "score_norm", "timeframe", "source"]
+    out = pd.concat([regional[cols], gl[cols]], ignore_index=True)
+    out = out.sort_values(["niche", "region", "score", "keyword"], ascending=[True, True, False, True])
+    return out.groupby(["niche", "region"], sort=False).head(top_k).reset_index(drop=True)
+
+
+def to_rankings(top: pd.DataFrame) -> List[Dict[str, Any]]:
+    """DataFrame del top-K -> una fila por (niche, region) con listas paralelas."""
+    top = top.assign(score_norm=top["score_norm"].astype(float).fillna(0.0),
+                     timeframe=top["timeframe"].fillna(""), source=top["source"].fillna(""))
+    grouped = top.groupby(["niche", "region"], sort=False).agg(list).reset_index()
+    return [
+        {
+            "niche": r.niche, "region": r.region,
+            "keywords": list(r.keyword), "scores": [round(float(x), 6) for x in r.score],
+            "score_norms": [float(x) for x in r.score_norm],
+            "timeframes": list(r.timeframe), "sources": list(r.source),
+        }
+        for r in grouped.itertuples(index=False)
+    ]
+
+# ======== Materialización en Neo4j ========
+
+Q_MATERIALIZE = """
+UNWIND $rows AS row
+MERGE (tr:TrendRanking {niche: row.niche, region: row.region})
+SET tr.keywords    = row.keywords,
+    tr.scores      = row.scores,
+    tr.score_norms = row.score_norms,
+    tr.timeframes  = row.timeframes,
+    tr.sources     = row.sources,
+    tr.updated_at  = $now
+"""
+
+# Rankings de una ejecución anterior que ya no aparecen
+Q_PRUNE = """
+MATCH (tr:TrendRanking)
+WHERE tr.updated_at < $now
+DETACH DELETE tr
+"""
+
+Q_INDEX = "CREATE INDEX trend_ranking_niche_region IF NOT EXISTS FOR (tr:TrendRanking) ON (tr.niche, tr.region)"
+
+
+def materialize(session, path: str, top_k: int = TOP_K, half_life_days: float = HALF_LIFE_DAYS,
+                region_weight: float = REGION_WEIGHT, batch: int = 500) -> Dict[str, Any]:
+    rows = to_rankings(rank_trends(pd.read_csv(path), top_k, half_life_days, region_weight))
+    now = time.time()
+    session.run(Q_INDEX).consume()
+    for i in range(0, len(rows), batch):
+        session.run(Q_MATERIALIZE, rows=rows[i:i + batch], now=now).consume()
+    session.run(Q_PRUNE, now=now).consume()
+    print(f"[rank_trends] OK -> {len(rows)} rankings (top {top_k}, half-life {half_life_days}d, w={region_weight})")
+    return {"rankings": len(rows), "top_k": top_k}
+
+# ======== Main ========
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Ranking de tendencias -> (:TrendRanking) por nicho/región")
+    ap.add_argument("--trends", required=True, help="CSV trends_keywords_merged_clean.csv")
+    ap.add_argument("--top-k", type=int, default=TOP_K)
+    ap.add_argument("--half-life-days", type=float, default=HALF_LIFE_DAYS)
+    ap.add_argument("--region-weight", type=float, default=REGION_WEIGHT)
+    ap.add_argument("--dry-run", action="store_true", help="calcula sin escribir en Neo4j")
+    ap.add_argument("--show", default=None, help="nicho:REGION a imprimir (p.ej. fitness:ES)")
+    args = ap.parse_args(argv)
+
+    if args.dry_run:
+        t0 = time.perf_counter()
+        top = rank_trends(pd.read_csv(args.trends), args.top_k, args.half_life_days, args.region_weight)
+        n = top.groupby(["niche", "region"]).ngroups
+        print(f"[rank_trends] {n} rankings en {1000 * (time.perf_counter() - t0):.1f} ms")
+        if args.show:
+            niche, _, region = args.show.partition(":")
+            sel = top[(top["niche"] == niche.lower()) & (top["region"] == (region or GLOBAL_REGION).upper())]
+            print(sel.to_string(index=False))
+        return
+
+    from neo4j import GraphDatabase
+
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    with driver.session() as s:
+        materialize(s, args.trends, args.top_k, args.half_life_days, args.region_weight)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()